@@ -1,112 +1,181 @@
 import gradio as gr
 import os
 import json
+import queue
+import uuid
 from typing import List, Tuple
-from sdl_agents import AutoGenSystem
+from sdl_agents import AutoGenSystem, CaptureGroupChatManager, pdf_to_text
+from llms import init_text_splitter
+import keyword_index
+from utils.agent_pool import AutoGenSystemPool
+from utils.chat_workers import ChatWorkerPool, QueueFullError
+from utils.human_input import HumanInputBridge
+from utils.uploads import UploadStore
+from utils.history import SessionHistories, TranscriptStore
 import autogen
+import params
 os.environ["GRADIO_ANALYTICS_ENABLED"] = "False" # to avoid the timed out
 
-# GroupChatManager to capture messages
-class CaptureGroupChatManager(autogen.GroupChatManager):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.captured_messages = []
-        
-    def receive(self, message, sender, request_reply=None, silent=False):
-        # Capture the message
-        if not silent:
-            agent_name = getattr(sender, "name", "Unknown")
-            if isinstance(message, dict) and "content" in message:
-                content = message["content"]
-            else:
-                content = str(message)
-                
-            if content:  
-                self.captured_messages.append(f"{agent_name}: {content}")
-        
-        return super().receive(message, sender, request_reply, silent)
-
 # Initialize AutoGen system
 workdir = "polybot_screenshots_run"
 os.makedirs(workdir, exist_ok=True)
 polybot_file_path = 'n9_robot_operation_commands.py'
 llm_type = "gpt4o"  
 
-# Create the AutoGen system
-autogen_system = None 
-
-# Store conversation history
-conversation_history = []
-
-def ensure_autogen_system():
-    """Make sure the AutoGen system is initialized"""
-    global autogen_system
-    if autogen_system is None:
-        # Create the system only when needed (first message)
-        autogen_system = AutoGenSystem(
-            llm_type=llm_type,
-            workdir=workdir,
-            polybot_file_path=polybot_file_path
-        )
-        
-        # Set all agents to NEVER ask for human input
-        autogen_system.code_writer_agent.human_input_mode = "ALWAYS"
-        autogen_system.code_review_agent.human_input_mode = "NEVER"
-        autogen_system.scraper_agent.human_input_mode = "NEVER"
-        autogen_system.polybot_admin.human_input_mode = "ALWAYS"
-        
-        # Replace the manager with our capturing version
-        autogen_system.manager = CaptureGroupChatManager(
-            groupchat=autogen_system.groupchat, 
-            llm_config=autogen_system.llm_config
-        )
+# Store conversation history, per Gradio session. Memory holds a bounded tail,
+# older rows and idle sessions are spilled to an append-only SQLite transcript
+session_histories = SessionHistories(
+    max_sessions=params.history_max_sessions,
+    store=TranscriptStore(params.transcript_db),
+    max_items=params.history_max_rows,
+    max_chars=params.history_max_chars
+)
 
-def process_message(message: str, history: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
-        
-    print('autogen system initiallization')
-    ensure_autogen_system()
+# Human input bridges of the chats running in each session: session_hash -> {chat id -> bridge}
+human_input_bridges = {}
+
+def build_autogen_system():
+    """Create one fully configured AutoGen system for the pool"""
+    autogen_system = AutoGenSystem(
+        llm_type=llm_type,
+        workdir=workdir,
+        polybot_file_path=polybot_file_path,
+        inventory_db_path=params.inventory_db,
+        template_library_path=params.template_library,
+        template_threshold=params.template_threshold,
+        executor_pool_size=params.executor_pool_size
+    )
+    
+    # Set all agents to NEVER ask for human input
+    autogen_system.code_writer_agent.human_input_mode = "ALWAYS"
+    autogen_system.code_review_agent.human_input_mode = "NEVER"
+    autogen_system.scraper_agent.human_input_mode = "NEVER"
+    autogen_system.polybot_admin.human_input_mode = "ALWAYS"
+    
+    # Replace the manager with our capturing version
+    autogen_system.manager = CaptureGroupChatManager(
+        groupchat=autogen_system.groupchat, 
+        llm_config=autogen_system.llm_config
+    )
+    return autogen_system
+
+# Pool of warm AutoGen systems, filled before the UI starts taking requests
+autogen_pool = AutoGenSystemPool(build_autogen_system, size=params.app_pool_size)
+
+# Chats run on worker threads (one per pooled system), extra requests wait in a bounded queue
+chat_workers = ChatWorkerPool(autogen_pool, max_queue=params.app_max_queue)
+
+def process_message(message: str, history: List[Tuple[str, str]], request: gr.Request):
+    """Stream each agent message to the chatbot as soon as the group chat produces it"""
     
-    autogen_system.manager.captured_messages = []
+    # An agent of this session's running chat is waiting for the user: this message is the answer
+    bridge = next((bridge for bridge in list(human_input_bridges.get(request.session_hash, {}).values())
+                   if bridge.pending), None)
+    if bridge is not None:
+        bridge.resolve(message)
+        yield gr.update() # the running chat's own stream shows the reply
+        return
     
-    updated_history = history.copy() 
+    # The chatbot only shows the newest rows, older ones are paged in from the transcript
+    updated_history = history[-params.history_display_rows:]
+    n_previous = len(updated_history)
     updated_history.append((message, "Processing your request..."))
+    yield updated_history
+    
+    # Chatbot rows are pushed here by the worker thread running the chat
+    new_rows = queue.Queue()
+    n_agent_messages = 0
     
+    def on_human_input_response(agent_name, response, timed_out):
+        if timed_out:
+            new_rows.put((None, f"No reply within {params.human_input_timeout_s}s, {agent_name} continues with '{response}'"))
+        else:
+            new_rows.put((response, None))
+    
+    bridge = HumanInputBridge(
+        on_request=lambda agent_name, prompt: new_rows.put((None, f"{agent_name} is waiting for your input: {prompt}")),
+        on_response=on_human_input_response,
+        timeout=params.human_input_timeout_s,
+        defaults=params.human_input_defaults,
+    )
+    chat_id = uuid.uuid4().hex
+    human_input_bridges.setdefault(request.session_hash, {})[chat_id] = bridge
     
     try:
-        autogen_system.initiate_chat(message)
+        chat = chat_workers.submit(request.session_hash, message,
+                                   on_message=lambda name, content: new_rows.put((None, f"{name}: {content}")),
+                                   human_input=bridge)
+        
+        while not (chat.done() and new_rows.empty()):
+            try:
+                row = new_rows.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            
+            # Append a row per agent message; Gradio only sends the diff to the browser
+            if n_agent_messages == 0 and row[0] is None:
+                updated_history[-1] = (message, row[1])
+            else:
+                updated_history.append(row)
+            n_agent_messages += 1
+            yield updated_history
         
-        # Get the conversation output
-        response = "\n\n".join(autogen_system.manager.captured_messages)
-        # print('response', response)
-        if not response:
-            response = "The agents processed your request but didn't generate a visible response. Try another query or check console output."
+        chat.result() # re-raise errors from the chat
+        if n_agent_messages == 0:
+            updated_history[-1] = (message, "The agents processed your request but didn't generate a visible response. Try another query or check console output.")
             
+    except QueueFullError as e:
+        updated_history[-1] = (message, str(e))
     except Exception as e:
-        response = f"Error: {str(e)}"
+        updated_history.append((None, f"Error: {str(e)}"))
         print(f"Exception during chat: {e}")
+    finally:
+        session_bridges = human_input_bridges.get(request.session_hash, {})
+        session_bridges.pop(chat_id, None)
+        if not session_bridges:
+            human_input_bridges.pop(request.session_hash, None)
     
-    # Update the last message with the actual response
-    updated_history[-1] = (message, response)
-    
-    # Store in global history
-    conversation_history.append((message, response))
+    # Store in the session's history
+    session_histories.get(request.session_hash).extend(updated_history[n_previous:])
     
-    return updated_history
+    yield updated_history
 
-def clear_history():
+def clear_history(request: gr.Request):
     """Clear the conversation history"""
-    global conversation_history
-    conversation_history = []
+    session_histories.clear(request.session_hash)
     return []
 
+def load_history_page(page, request: gr.Request):
+    """One page of the session's history, page 1 being the newest rows"""
+    history = session_histories.get(request.session_hash)
+    n_pages = history.pages(params.history_page_size)
+    page = min(max(int(page or 1), 1), n_pages)
+    return history.page(page, params.history_page_size), f"Page {page} of {n_pages} ({history.total} rows)"
+
+def queue_status():
+    """Current load of the chat workers"""
+    return chat_workers.status()
+
+def warm_pdf(path):
+    """Extract and index an uploaded PDF in the background so the first scrape_pdf call is a cache hit"""
+    text = pdf_to_text(path)
+    chunks = init_text_splitter().split_text(text)
+    keyword_index.get_index().update(chunks, source=os.path.basename(path))
+    print(f"Indexed {os.path.basename(path)}: {len(chunks)} chunks")
+
+# Uploads are streamed into workdir and deduplicated by content hash
+upload_store = UploadStore(workdir, on_new_file=warm_pdf)
+
 def upload_pdf(file_path):
     """Handle PDF file upload"""
     # Save the uploaded PDF file
     if file_path is not None:
-        filename = os.path.basename(file_path.name)
-        save_path = os.path.join(workdir, filename)
-        with open(save_path, 'wb') as f:
-            f.write(file_path.read())
+        # type="filepath" gives the path of Gradio's temp copy, older versions a tempfile wrapper
+        src_path = file_path if isinstance(file_path, str) else file_path.name
+        save_path, sha, duplicate = upload_store.save(src_path)
+        filename = os.path.basename(save_path)
+        if duplicate:
+            return f"PDF uploaded: {filename} (same content as an earlier upload, reusing it)"
         return f"PDF uploaded: {filename}"
     return "No file uploaded"
 
@@ -141,11 +210,20 @@ with gr.Blocks(title="SDL Agent Chat") as demo:
                 type="filepath"
             )
             pdf_status = gr.Textbox(label="Upload Status", interactive=False)
+            server_status = gr.Textbox(label="Server Load", interactive=False)
+    
+    with gr.Accordion("Earlier messages", open=False):
+        with gr.Row():
+            history_page = gr.Number(value=1, label="Page (1 = newest)", precision=0, minimum=1)
+            load_page_btn = gr.Button("Load Page", variant="secondary")
+            history_page_status = gr.Textbox(show_label=False, interactive=False)
+        history_view = gr.Chatbot(height=400, show_label=False)
     
     submit_btn.click(
         process_message, 
         inputs=[msg, chatbot], 
-        outputs=[chatbot]
+        outputs=[chatbot],
+        concurrency_limit=None # admission control is done by chat_workers
     ).then(
         lambda: "", 
         None, 
@@ -157,6 +235,12 @@ with gr.Blocks(title="SDL Agent Chat") as demo:
         outputs=[chatbot]
     )
     
+    load_page_btn.click(
+        load_history_page,
+        inputs=[history_page],
+        outputs=[history_view, history_page_status]
+    )
+    
     pdf_upload.upload(
         upload_pdf,
         inputs=[pdf_upload],
@@ -166,15 +250,19 @@ with gr.Blocks(title="SDL Agent Chat") as demo:
     msg.submit(
         process_message, 
         inputs=[msg, chatbot], 
-        outputs=[chatbot]
+        outputs=[chatbot],
+        concurrency_limit=None # admission control is done by chat_workers
     ).then(
         lambda: "", 
         None, 
         msg
     )
+    
+    demo.load(queue_status, None, server_status, every=2)
 
 
 # # Launch the app
+autogen_pool.warm()
 demo.launch(share=False, debug=True)  
 # conversation_history = []
 # msg = "move the vial with PEDOT:PSS defined as polymer A to the clamp holder"
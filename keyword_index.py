@@ -0,0 +1,182 @@
+"""
+===========================
+Keyword Index
+===========================
+
+On-disk inverted index (token -> chunk -> positions) over the raw PDF text in
+`params.pdf_text_path`, used to answer `ner_hits` entity lookups with BM25
+scoring instead of scanning every chunk.
+"""
+import hashlib
+import math
+import os
+import pickle
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+import params
+
+TOKEN_RE = re.compile(r"\w+")
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+class KeywordIndex:
+    def __init__(self, index_dir: str = params.keyword_index_path):
+        """
+        Args:
+            index_dir (str): Folder where the index is persisted
+        """
+        self.index_fp = os.path.join(index_dir, 'keyword_index.pkl')
+        self.chunks = {}  # chunk_id -> text
+        self.chunk_source = {}  # chunk_id -> source name
+        self.chunk_ids = {}  # content hash -> chunk_id
+        self.doc_len = {}  # chunk_id -> number of tokens
+        self.postings = defaultdict(dict)  # token -> {chunk_id: [positions]}
+        self.next_id = 0
+        self.total_len = 0
+        self.load()
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def load(self):
+        if not os.path.exists(self.index_fp):
+            return
+        with open(self.index_fp, 'rb') as index_f:
+            state = pickle.load(index_f)
+        self.__dict__.update(state)
+        self.postings = defaultdict(dict, self.postings)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.index_fp), exist_ok=True)
+        state = {key: value for key, value in self.__dict__.items() if key != 'index_fp'}
+        state['postings'] = dict(self.postings)
+        tmp_fp = self.index_fp + '.tmp'
+        with open(tmp_fp, 'wb') as index_f:
+            pickle.dump(state, index_f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_fp, self.index_fp)  # never leave a half written index behind
+
+    def _add_chunk(self, text: str, source: str, content_hash: str):
+        chunk_id = self.next_id
+        self.next_id += 1
+        tokens = tokenize(text)
+        for position, token in enumerate(tokens):
+            self.postings[token].setdefault(chunk_id, []).append(position)
+        self.chunks[chunk_id] = text
+        self.chunk_source[chunk_id] = source
+        self.chunk_ids[content_hash] = chunk_id
+        self.doc_len[chunk_id] = len(tokens)
+        self.total_len += len(tokens)
+
+    def _remove_chunk(self, chunk_id: int, content_hash: str):
+        for token in set(tokenize(self.chunks[chunk_id])):
+            chunk_postings = self.postings[token]
+            chunk_postings.pop(chunk_id, None)
+            if not chunk_postings:
+                del self.postings[token]
+        self.total_len -= self.doc_len.pop(chunk_id)
+        del self.chunks[chunk_id], self.chunk_source[chunk_id], self.chunk_ids[content_hash]
+
+    def update(self, texts: Iterable[str], source: str) -> Tuple[int, int]:
+        """
+        Make the chunks indexed for `source` match `texts`, touching only what changed.
+
+        Args:
+            texts: The current chunks of the source
+            source (str): Name of the source the chunks come from
+
+        Returns:
+            tuple: (chunks added, chunks removed)
+        """
+        wanted = {}
+        for text in texts:
+            wanted[hashlib.sha1(f"{source}\0{text}".encode()).hexdigest()] = text
+
+        stale = [(chunk_id, content_hash) for content_hash, chunk_id in self.chunk_ids.items()
+                 if self.chunk_source[chunk_id] == source and content_hash not in wanted]
+        for chunk_id, content_hash in stale:
+            self._remove_chunk(chunk_id, content_hash)
+
+        added = 0
+        for content_hash, text in wanted.items():
+            if content_hash not in self.chunk_ids:
+                self._add_chunk(text, source, content_hash)
+                added += 1
+
+        if added or stale:
+            self.save()
+        return added, len(stale)
+
+    def _phrase_tf(self, tokens: List[str]) -> Dict[int, int]:
+        """Term frequency of a (possibly multi token) phrase per chunk."""
+        postings = [self.postings.get(token) for token in tokens]
+        if not tokens or any(p is None for p in postings):
+            return {}
+        if len(tokens) == 1:
+            return {chunk_id: len(positions) for chunk_id, positions in postings[0].items()}
+
+        tf = {}
+        candidates = set(postings[0]).intersection(*postings[1:])
+        for chunk_id in candidates:
+            following = [set(p[chunk_id]) for p in postings[1:]]
+            count = sum(1 for start in postings[0][chunk_id]
+                        if all(start + offset + 1 in positions for offset, positions in enumerate(following)))
+            if count:
+                tf[chunk_id] = count
+        return tf
+
+    def search(self, entities: Iterable[str], k: int = params.N_NER_hits) -> List[Tuple[str, float, List[str]]]:
+        """
+        BM25 ranked chunks containing any of the entities, each entity matched as a phrase.
+
+        Args:
+            entities: Entity strings, e.g. from `llms.ner_hits`
+            k (int): Number of chunks to return
+
+        Returns:
+            list: (chunk text, score, matched entities) best first
+        """
+        n_chunks = len(self.chunks)
+        if n_chunks == 0:
+            return []
+        avg_len = self.total_len / n_chunks
+
+        scores = defaultdict(float)
+        matched = defaultdict(list)
+        for entity in entities:
+            tf = self._phrase_tf(tokenize(entity))
+            if not tf:
+                continue
+            idf = math.log(1 + (n_chunks - len(tf) + 0.5) / (len(tf) + 0.5))
+            for chunk_id, freq in tf.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[chunk_id] / avg_len)
+                scores[chunk_id] += idf * freq * (BM25_K1 + 1) / (freq + norm)
+                matched[chunk_id].append(entity)
+
+        best = sorted(scores, key=scores.get, reverse=True)[:k]
+        return [(self.chunks[chunk_id], scores[chunk_id], matched[chunk_id]) for chunk_id in best]
+
+
+_index = None
+
+
+def get_index() -> KeywordIndex:
+    """Shared index, loaded from disk on first use."""
+    global _index
+    if _index is None:
+        _index = KeywordIndex()
+    return _index
+
+
+def index_pdf_text(pdf_fp: str = os.path.join(params.pdf_text_path, 'pdf.txt')) -> Tuple[int, int]:
+    """Chunk a raw text file the same way as the doc store and sync it into the index."""
+    import llms
+    with open(pdf_fp, 'r') as pdf_f:
+        texts = llms.init_text_splitter().split_text(pdf_f.read())
+    return get_index().update(texts, source=os.path.basename(pdf_fp))
@@ -2,12 +2,16 @@ from typing import List
 from pydantic import Extra
 from tqdm import tqdm
 import requests
-import datetime, os, shutil
+import os, shutil
+from concurrent.futures import ThreadPoolExecutor
 import params
 import time
+import keyword_index
+from utils.debug_log import get_trace_logger
 
 from langchain.callbacks.manager import CallbackManagerForLLMRun
 from langchain.llms.base import LLM
+from langchain.schema import Generation, LLMResult
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_chroma import Chroma
 from langchain.embeddings.base import Embeddings
@@ -20,53 +24,146 @@ class AnlLLM(LLM, extra=Extra.allow):
 
         self.debug = params.anl_llm_debug 
         self.debug_fp = params.anl_llm_debug_fp
+        if self.debug:
+            self.trace = get_trace_logger(self.debug_fp,
+                                          max_bytes=params.anl_llm_debug_max_bytes,
+                                          backup_count=params.anl_llm_debug_backups,
+                                          sample_rate=params.anl_llm_debug_sample_rate,
+                                          log_text=params.anl_llm_debug_log_text)
 
         self.temperature = 0.1
         self.top_p = 0.1
+        self.batch_supported = True # Set to False once the endpoint answers a batch with a single response
+        self.batch_retry_at = 0.0 # After a failed batch request, batching resumes at this time.monotonic()
         
         with open(params.anl_llm_url_path, 'r') as url_f:
             self.anl_url = url_f.read().strip()
 
+        print(f'Model = {params.anl_llm_model}')
+
     @property
     def _llm_type(self) -> str:
         return "ANL LLM API"
 
+    def _post(self, prompts: List[str], stop):
+        """
+        Send one request for a list of prompts. Returns the raw result, None when the request
+        itself failed (timeout, connection error), and the latency.
+        """
+        req_obj = {'user': params.anl_user, 
+                   'model': params.anl_llm_model, 
+                   'prompt': prompts, 
+                   'system': "",
+                   'stop': [] if stop is None else stop, 
+                   'temperature': self.temperature}
+                   #'top_p': self.top_p}
+        start = time.perf_counter()
+        try:
+            result = requests.post(self.anl_url, json=req_obj, timeout=params.anl_llm_timeout_s)
+        except requests.RequestException as e:
+            print(f"Request of {len(prompts)} prompts failed: {e}")
+            result = None
+        return result, time.perf_counter() - start
+
+    @staticmethod
+    def _response(result):
+        """The 'response' field of a successful result, None if the request failed or its body is not JSON."""
+        if result is None or not result.ok:
+            return None
+        try:
+            body = result.json()
+        except requests.RequestException:
+            print("error: the response is not JSON")
+            return None
+        return body.get('response') if isinstance(body, dict) else None
+
     def _call(
         self,
         prompt: str,
         stop = None,
         run_manager = None,
     ) -> str:
-        if self.debug:
-            with open(self.debug_fp, 'a+') as debug_f:
-                debug_f.write(f'\n\n{datetime.datetime.now()}\nPrompt:{prompt}')
+        result, latency = self._post([prompt], stop)
+        if result is not None and not result.ok:
+            print(f"error {result.status_code} ({result.reason})")
+        response = self._response(result)
 
-        if stop is None:
-            stop_param = []
-        else:
-            stop_param = stop
+        if self.debug:
+            self.trace.log_call(params.anl_llm_model, prompt, response, latency,
+                                status=None if result is None else result.status_code)
 
-        print(f'Model = {params.anl_llm_model}')
-        
-        req_obj = {'user': params.anl_user, 
-                   'model': params.anl_llm_model, 
-                   'prompt': [prompt], 
-                   'system': "",
-                   'stop': stop_param, 
-                   'temperature': self.temperature}
-                   #'top_p': self.top_p}
-        result = requests.post(self.anl_url, json=req_obj)
-        if not result.ok:
-            print(f"error {result.status_code} ({result.reason})")
-            return
+        return response
 
-        response = result.json()['response']
+    def _batches(self, prompts: List[str]):
+        """Pack prompt indices into batches bounded by count and total characters."""
+        batch, batch_chars = [], 0
+        for i, prompt in enumerate(prompts):
+            if batch and (len(batch) >= params.anl_llm_batch_size
+                          or batch_chars + len(prompt) > params.anl_llm_batch_max_chars):
+                yield batch
+                batch, batch_chars = [], 0
+            batch.append(i)
+            batch_chars += len(prompt)
+        if batch:
+            yield batch
+
+    def _call_batch(self, prompts: List[str], stop):
+        """One request for many prompts. Returns None if it failed or the server does not answer per prompt."""
+        result, latency = self._post(prompts, stop)
+        responses = self._response(result)
+        if responses is None:
+            # Possibly transient (overload, timeout): single calls for now, batching again after a cool-down
+            reason = "no answer" if result is None else f"error {result.status_code} ({result.reason})"
+            print(f"Batch of {len(prompts)} failed: {reason}")
+            self.batch_retry_at = time.monotonic() + params.anl_llm_batch_cooldown_s
+            return None
+        if not isinstance(responses, list) or len(responses) != len(prompts):
+            print(f"Batch of {len(prompts)} returned a single response, batching disabled for this endpoint")
+            self.batch_supported = False
+            return None
 
         if self.debug:
-            with open(self.debug_fp, 'a+') as debug_f:
-                debug_f.write(f'Response:{response}')
+            for prompt, response in zip(prompts, responses):
+                self.trace.log_call(params.anl_llm_model, prompt, response, latency,
+                                    status=result.status_code, batch_size=len(prompts))
+        return responses
+
+    def _call_with_retries(self, prompt: str, stop) -> str:
+        """Single call, retried with backoff. Raises instead of handing the agents an empty completion."""
+        for attempt in range(params.anl_llm_max_retries + 1):
+            if attempt:
+                time.sleep(params.anl_llm_retry_backoff_s * 2 ** (attempt - 1))
+            response = self._call(prompt, stop)
+            if response is not None:
+                return response
+        raise RuntimeError(f"ANL LLM request failed after {params.anl_llm_max_retries + 1} attempts")
+
+    def _generate(
+        self,
+        prompts: List[str],
+        stop = None,
+        run_manager = None,
+        **kwargs,
+    ) -> LLMResult:
+        responses = [None] * len(prompts)
+        pending = []
+        for batch in self._batches(prompts):
+            batch_responses = None
+            if len(batch) > 1 and self.batch_supported and time.monotonic() >= self.batch_retry_at:
+                batch_responses = self._call_batch([prompts[i] for i in batch], stop)
+            if batch_responses is None:
+                pending += batch
+            else:
+                for i, response in zip(batch, batch_responses):
+                    responses[i] = response
 
-        return response
+        # Fall back to concurrent single calls for whatever could not be batched
+        if pending:
+            with ThreadPoolExecutor(max_workers=params.anl_llm_max_concurrency) as pool:
+                for i, response in zip(pending, pool.map(lambda i: self._call_with_retries(prompts[i], stop), pending)):
+                    responses[i] = response
+
+        return LLMResult(generations=[[Generation(text=response)] for response in responses])
 
     @property
     def _identifying_params(self):
@@ -160,6 +257,10 @@ def write_list(all_texts):
             file.write(text.page_content + '\n')
     file.close()
 
+    # Keep the NER keyword index in sync, only changed chunks are re-indexed
+    added, removed = keyword_index.index_pdf_text(params.pdf_text_path+'/pdf.txt')
+    print (f"Keyword index updated: {added} chunks added, {removed} removed")
+
 """
 ===========================
 NER Functionality
@@ -0,0 +1,118 @@
+"""
+Offline simulator for the N9 robot scripts written by the agents.
+
+The `robotics` package in this folder implements the API used by
+n9_robot_operation_commands.py, loca.py and rack_status.py. run_script
+executes a generated script against it and reports the final state, the
+estimated run time and any physically impossible steps (violations).
+
+    from n9_sim import run_script
+    result = run_script("polybot_screenshots_run/move_vial_to_clamp.py")
+"""
+import importlib
+import os
+import sys
+import time
+import traceback
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+SIM_PATH = os.path.dirname(os.path.abspath(__file__))
+
+
+def activate():
+    """Make `import robotics` resolve to the simulator. Fails if the real runtime is already imported."""
+    robotics = sys.modules.get('robotics')
+    if robotics is not None and not os.path.abspath(robotics.__file__).startswith(SIM_PATH):
+        raise RuntimeError(f"The hardware robotics package is already imported from {robotics.__file__}")
+    if SIM_PATH not in sys.path:
+        sys.path.insert(0, SIM_PATH)
+    return importlib.import_module('robotics')
+
+
+@dataclass
+class SimResult:
+    ok: bool
+    error: str = None
+    elapsed_s: float = 0.0  # estimated time on the robot
+    travel_s: float = 0.0  # part of elapsed_s spent moving the arm
+    violations: List[str] = field(default_factory=list)
+    events: List[Tuple[float, str]] = field(default_factory=list)
+    state: dict = field(default_factory=dict)
+    steps: List[dict] = field(default_factory=list)  # moves and actions, see n9_sim.motion
+    wall_s: float = 0.0
+
+    def report(self) -> str:
+        status = "OK" if self.ok else "FAILED"
+        lines = [f"{status}: {len(self.events)} steps, ~{self.elapsed_s:.1f}s on the robot "
+                 f"({self.travel_s:.1f}s arm travel), simulated in {1000 * self.wall_s:.1f}ms"]
+        if self.error:
+            lines.append(f"error: {self.error}")
+        lines += [f"violation: {violation}" for violation in self.violations]
+        return "\n".join(lines)
+
+
+def reset():
+    """Fresh simulation state and rack inventory, keeping the (static) loca module."""
+    ro = activate()
+    ro.runtime.clear()
+    if 'loca' in sys.modules:
+        ro.runtime['loca'] = sys.modules['loca']
+    rack_status = sys.modules.get('rack_status')
+    if rack_status is None:
+        importlib.import_module('rack_status')
+    else:
+        importlib.reload(rack_status)
+    return ro
+
+
+def run_script(script, filename: str = None) -> SimResult:
+    """
+    Run a generated robot script on the simulator.
+
+    Args:
+        script (str): Path of the script, or its source code
+        filename (str): Name for tracebacks when `script` is source code
+
+    Returns:
+        SimResult: ok is False when the script raised or broke a physical rule
+    """
+    if os.path.exists(script):
+        filename = filename or script
+        with open(script, 'r') as script_f:
+            script = script_f.read()
+    filename = filename or '<generated script>'
+
+    start = time.perf_counter()
+    ro = reset()
+    error = None
+    try:
+        exec(compile(script, filename, 'exec'), {'__name__': '__main__', '__file__': filename})
+    except Exception as e:
+        script_frames = [frame for frame in traceback.extract_tb(e.__traceback__) if frame.filename == filename]
+        where = f" (line {script_frames[-1].lineno}: {script_frames[-1].line})" if script_frames else ""
+        error = f"{type(e).__name__}: {e}{where}"
+
+    sim = ro.system.simulation()
+    controller = sim.devices.get('controller')
+    state = {
+        'clamp_vial': sim.clamp_vial,
+        'coater_substrate': sim.coater_substrate,
+        'films': list(sim.films),
+        'gripper': controller.holding if controller else None,
+        'tool': controller.tool if controller else None,
+        'pipette': controller.pipette if controller else False,
+        'position': controller.position if controller else None,
+        'outputs': dict(controller.outputs) if controller else {},
+    }
+    return SimResult(
+        ok=error is None and not sim.violations,
+        error=error,
+        elapsed_s=sim.elapsed_s,
+        travel_s=sim.travel_s,
+        violations=list(sim.violations),
+        events=list(sim.events),
+        state=state,
+        steps=list(sim.steps),
+        wall_s=time.perf_counter() - start,
+    )
@@ -0,0 +1,44 @@
+"""
+Run generated robot scripts on the simulator.
+
+    python -m n9_sim polybot_screenshots_run/*.py
+    python -m n9_sim polybot_screenshots_run/move_vial_to_clamp.py --repeat 1000 --quiet
+    python -m n9_sim polybot_screenshots_run/*.py --optimize
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+from n9_sim import run_script
+from n9_sim.motion import MotionModel, optimize
+
+parser = argparse.ArgumentParser()
+parser.add_argument("scripts", nargs="+")
+parser.add_argument("--repeat", type=int, default=1, help="Run every script this many times to measure throughput")
+parser.add_argument("--quiet", action="store_true", help="Hide the scripts' own output")
+parser.add_argument("--events", action="store_true", help="Print the simulated steps")
+parser.add_argument("--optimize", action="store_true", help="Estimate the arm travel saved by safe paths and reordering")
+parser.add_argument("--clearance-z", type=float, default=0.0, help="z at which the arm clears every fixture")
+args = parser.parse_args()
+
+sys.path.insert(0, os.getcwd())  # loca.py and rack_status.py of the current folder
+start = time.perf_counter()
+runs = 0
+for script in args.scripts:
+    for _ in range(args.repeat):
+        with contextlib.redirect_stdout(io.StringIO()) if args.quiet else contextlib.nullcontext():
+            result = run_script(script)
+        runs += 1
+    print(f"== {script}")
+    print(result.report())
+    if args.events:
+        for at, event in result.events:
+            print(f"  {at:8.2f}s  {event}")
+    if args.optimize:
+        print(optimize(result.steps, MotionModel(clearance_z=args.clearance_z)).report())
+
+elapsed = time.perf_counter() - start
+print(f"{runs} runs in {elapsed:.2f}s ({3600 * runs / elapsed:.0f} runs/hour)")
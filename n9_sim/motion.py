@@ -0,0 +1,255 @@
+"""
+Motion cost model and travel optimizer for simulated robot scripts.
+
+The optimizer works on the structured trace of a simulator run (SimResult.steps):
+  - between two actions only the target matters, so detours such as returning to
+    [0, 0, 0, 0] are replaced by the minimal safe path: lift to the clearance height,
+    travel, lower (SequenceArray approach chains into a slot are kept as they are);
+  - the run is split into tasks at the points where the arm holds nothing, and tasks
+    that touch different resources (clamp, coater, rack slots, ...) are reordered to
+    shorten the travel between them. The arm's own state (gripper, tool, pipette) is a
+    shared resource too, so tasks that carry something keep their original order.
+"""
+from dataclasses import dataclass, field
+from typing import List
+
+import numpy as np
+
+from n9_sim import activate
+
+HOME = (0.0, 0.0, 0.0, 0.0)
+
+
+class MotionModel:
+    def __init__(self, max_vel=None, max_accel=None, clearance_z: float = 0.0):
+        """
+        Args:
+            max_vel: Per-axis velocity limits (counts/s), defaults to the simulator's
+            max_accel: Per-axis acceleration limits (counts/s^2), defaults to the simulator's
+            clearance_z (float): z at which the arm clears every fixture (smaller z is higher);
+                                 0 is fully up, use a measured value to shorten the lifts
+        """
+        self._system = activate().system
+        self.max_vel = np.asarray(self._system.MAX_VEL if max_vel is None else max_vel, dtype=float)
+        self.max_accel = np.asarray(self._system.MAX_ACCEL if max_accel is None else max_accel, dtype=float)
+        self.clearance_z = clearance_z
+
+    def move_time(self, start, end) -> float:
+        return self._system.move_time(start, end, self.max_vel, self.max_accel)
+
+    def path_time(self, start, points) -> float:
+        total, current = 0.0, start
+        for point in points:
+            total += self.move_time(current, point)
+            current = point
+        return total
+
+    def safe_path(self, start, end) -> list:
+        """Waypoints after `start` up to and including `end`, lifting to the clearance height to travel."""
+        start, end = tuple(start), tuple(end)
+        if np.allclose(start[:3], end[:3]) or start == end:
+            return [] if start == end else [end]
+        path = []
+        if start[3] > self.clearance_z:
+            path.append(start[:3] + (self.clearance_z,))
+        if end[3] > self.clearance_z:
+            path.append(end[:3] + (self.clearance_z,))
+        path.append(end)
+        return path
+
+
+@dataclass
+class Segment:
+    target: tuple  # arm position of the action, or the last position of the run
+    approach: list  # SequenceArray points leading into target, kept verbatim
+    actions: list  # trace steps performed at target
+    original_moves: list  # positions the script actually moved through
+
+    @property
+    def entry(self):
+        return self.approach[0] if self.approach else self.target
+
+
+@dataclass
+class Task:
+    segments: List[Segment] = field(default_factory=list)
+    device_actions: list = field(default_factory=list)
+    resources: set = field(default_factory=set)
+    carried: bool = False  # the arm held something during the task, tasks end once it is put down
+
+    @property
+    def entry(self):
+        return self.segments[0].entry if self.segments else None
+
+    @property
+    def exit(self):
+        return self.segments[-1].target if self.segments else None
+
+
+@dataclass
+class MotionPlan:
+    order: List[int]
+    points: list
+    naive_s: float
+    optimized_s: float
+    n_tasks: int
+
+    @property
+    def saved_s(self) -> float:
+        return self.naive_s - self.optimized_s
+
+    def report(self) -> str:
+        reordered = self.order != sorted(self.order)
+        return (f"Arm travel: {self.naive_s:.1f}s as written, {self.optimized_s:.1f}s optimized "
+                f"({self.saved_s:+.1f}s saved, {len(self.points)} moves, {self.n_tasks} tasks"
+                f"{', reordered ' + str(self.order) if reordered else ''})")
+
+
+def split_tasks(steps) -> List[Task]:
+    """
+    Group the trace into tasks that end where the arm has put down what it carried. The
+    moves after the last action form a final task without resources.
+    """
+    tasks, task, moves = [], Task(), []
+    for step in steps:
+        if step['kind'] == 'move':
+            moves.append(step)
+            continue
+        if step['resource'] is not None:
+            task.resources.add(step['resource'])
+        if step['position'] is None:  # coater blade, temperature: no arm involved
+            task.device_actions.append(step)
+            continue
+        target = step['position']
+        if moves or not task.segments or task.segments[-1].target != target:
+            task.segments.append(Segment(target, _approach(moves, target), [], [move['position'] for move in moves]))
+        task.segments[-1].actions.append(step)
+        moves = []
+        task.carried = task.carried or not step['idle']
+        if step['idle'] and task.carried:
+            tasks.append(task)
+            task = Task()
+    if moves:
+        task.segments.append(Segment(moves[-1]['position'], _approach(moves, moves[-1]['position']), [],
+                                     [move['position'] for move in moves]))
+    if task.segments or task.device_actions:
+        tasks.append(task)
+
+    # Tasks without arm moves run wherever the arm is, keep them with the next task
+    merged = []
+    for task in tasks:
+        if merged and not merged[-1].segments:
+            task.device_actions = merged[-1].device_actions + task.device_actions
+            task.resources |= merged[-1].resources
+            merged[-1] = task
+        else:
+            merged.append(task)
+    return merged
+
+
+def _approach(moves, target) -> list:
+    """The SequenceArray points the moves end with, if they end at target."""
+    if not moves or moves[-1]['group'] is None or moves[-1]['position'] != target:
+        return []
+    group = moves[-1]['group']
+    chain = []
+    for move in reversed(moves):
+        if move['group'] != group:
+            break
+        chain.append(move['position'])
+    return chain[::-1]
+
+
+def _task_points(model: MotionModel, start, task: Task, as_written: bool = False) -> list:
+    """
+    Points of `task` entered from `start`. A segment keeps the script's own moves when they
+    start from the same place and are faster than the safe path (the script's author
+    already knows they are safe); `as_written` says whether the first segment does.
+    """
+    points, current = [], start
+    for i, segment in enumerate(task.segments):
+        path = model.safe_path(current, segment.entry) + segment.approach[1:]
+        if (i > 0 or as_written) and segment.original_moves and \
+                model.path_time(current, segment.original_moves) < model.path_time(current, path):
+            path = segment.original_moves
+        points += path
+        current = segment.target
+    return points
+
+
+def optimize(steps, model: MotionModel = None, start=HOME, max_exact: int = 9) -> MotionPlan:
+    """
+    Plan the moves of a simulated run with minimal safe paths and the fastest task order
+    that keeps every pair of tasks sharing a resource, the arm's gripper and tools
+    included, in their original order.
+
+    Args:
+        steps (list): SimResult.steps of the run
+        model (MotionModel): Cost model, defaults to MotionModel()
+        start (tuple): Arm position before the run
+        max_exact (int): Largest number of tasks ordered exactly (Held-Karp), larger runs are ordered greedily
+    """
+    model = model or MotionModel()
+    tasks = split_tasks(steps)
+    naive_points = [step['position'] for step in steps if step['kind'] == 'move']
+    naive_s = model.path_time(start, naive_points)
+
+    n = len(tasks)
+    # task j must follow task i when they share a resource or both use the gripper or a tool, the final moves stay last
+    before = [{i for i in range(j) if tasks[i].resources & tasks[j].resources or not tasks[j].carried
+               or tasks[i].carried and tasks[j].carried}
+              for j in range(n)]
+    exits = [start] + [task.exit for task in tasks]  # exits[j] is where the script entered task j
+
+    def transition(previous, j):
+        # previous is the index of the task before j in the new order, -1 for the start
+        points = _task_points(model, exits[previous + 1], tasks[j], as_written=previous == j - 1)
+        return model.path_time(exits[previous + 1], points)
+
+    if n <= max_exact:
+        order = _held_karp(n, before, transition)
+    else:
+        order = _greedy(n, before, transition)
+
+    points, previous = [], -1
+    for j in order:
+        points += _task_points(model, exits[previous + 1], tasks[j], as_written=previous == j - 1)
+        previous = j
+    return MotionPlan(order, points, naive_s, model.path_time(start, points), n)
+
+
+def _held_karp(n, before, transition):
+    # best[(visited, last)] = (cost, order)
+    best = {}
+    for j in range(n):
+        if not before[j]:
+            best[(1 << j, j)] = (transition(-1, j), [j])
+    for size in range(1, n):
+        for (visited, last), (cost, order) in [item for item in best.items() if bin(item[0][0]).count('1') == size]:
+            for j in range(n):
+                if visited & (1 << j) or any(not visited & (1 << i) for i in before[j]):
+                    continue
+                key = (visited | (1 << j), j)
+                candidate = cost + transition(last, j)
+                if key not in best or candidate < best[key][0]:
+                    best[key] = (candidate, order + [j])
+    full = (1 << n) - 1
+    finals = [value for (visited, _), value in best.items() if visited == full]
+    return min(finals)[1] if finals else list(range(n))
+
+
+def _greedy(n, before, transition):
+    order, done, previous = [], set(), -1
+    while len(order) < n:
+        ready = [j for j in range(n) if j not in done and before[j] <= done]
+        j = min(ready, key=lambda j: (transition(previous, j), j))
+        order.append(j)
+        done.add(j)
+        previous = j
+    return order
+
+
+def optimize_script(script, model: MotionModel = None) -> MotionPlan:
+    """Simulate `script` (path or source) and plan its moves."""
+    from n9_sim import run_script
+    return optimize(run_script(script).steps, model)
@@ -0,0 +1,8 @@
+"""
+Offline stand-in for the N9 `robotics` runtime. Only the API used by
+n9_robot_operation_commands.py, loca.py and rack_status.py is provided.
+"""
+runtime = {}
+
+from . import system  # noqa: E402
+from . import procedure  # noqa: E402
@@ -0,0 +1,94 @@
+import numpy as np
+
+import robotics as ro
+from robotics.system import simulation
+
+# Approximate conversion of rack spacing (mm) to encoder counts on the elbow/shoulder axes.
+# The simulator checks the logic of a script, not the arm's geometry.
+COUNTS_PER_MM = 100.0
+PIPETTE_CHANGE_S = 8.0
+
+
+def rack_locator(nrow, ncol, row_spacing, col_spacing, ref=None, ref_index=(0, 0), pipette_tip=False,
+                 tool=None, tool_o=None, substrate_rack=False):
+    """
+    Positions of all slots of a rack, shape (nrow, ncol, 4), given the position `ref` of
+    the slot at `ref_index`.
+    """
+    ref = np.asarray(ref if ref is not None else [0, 0, 0, 0], dtype=float)
+    rows, cols = np.meshgrid(np.arange(nrow) - ref_index[0], np.arange(ncol) - ref_index[1], indexing='ij')
+    positions = np.repeat(np.repeat(ref[None, None, :], nrow, axis=0), ncol, axis=1)
+    positions[..., 1] += rows * row_spacing * COUNTS_PER_MM
+    positions[..., 2] += cols * col_spacing * COUNTS_PER_MM
+    return np.rint(positions)
+
+
+class SequenceArray:
+    def __init__(self, *steps):
+        """
+        A move through several positions, e.g. standby -> approach -> target. Each step is
+        a single position or a rack of positions; indexing selects a rack slot.
+        """
+        self.steps = [np.asarray(step, dtype=float) for step in steps]
+
+    @property
+    def shape(self):
+        racks = [step.shape[:-1] for step in self.steps if step.ndim > 1]
+        return racks[0] if racks else ()
+
+    @property
+    def final(self):
+        return self.steps[-1]
+
+    def positions(self):
+        """(n_steps, 4) array, only for sequences that are not racks."""
+        if self.shape:
+            raise TypeError("Index the rack slot first, e.g. seq[0, 0]")
+        return np.stack(self.steps)
+
+    def __getitem__(self, index):
+        return SequenceArray(*[step[index] if step.ndim > 1 else step for step in self.steps])
+
+    def __len__(self):
+        return len(self.steps)
+
+
+def loc_lookup(loca):
+    """Lookup of loca positions by name, resolving the loca aliases."""
+    def lookup(name):
+        return getattr(loca, loca.alias.get(name, name))
+    return lookup
+
+
+def find_rack_index(rack: str, label):
+    """(row, col) of the first slot in `rack` holding `label`."""
+    status = ro.runtime['rack_status'][rack]
+    matches = np.argwhere(status.map(lambda cell: isinstance(cell, type(label)) and cell == label).to_numpy())
+    if not len(matches):
+        raise ValueError(f"'{label}' is not in the {rack} rack")
+    return tuple(int(i) for i in matches[0])
+
+
+def new_pipette(c9):
+    """Take the next unused pipette tip from the pipette rack."""
+    sim = simulation()
+    if c9.pipette:
+        sim.violation("new_pipette called with a pipette already attached")
+    pipettes = ro.runtime['rack_status']['pipette']
+    free = np.argwhere(pipettes.to_numpy() == 1)
+    if not len(free):
+        sim.violation("No unused pipette tips left")
+        return
+    pipettes.iat[tuple(free[0])] = 0
+    c9.pipette, c9.pipette_ml, c9.pipette_content = True, 0.0, None
+    sim.log(f"new pipette from slot {free[0].tolist()}", PIPETTE_CHANGE_S)
+    c9._record("proc.new_pipette(c9)")
+
+
+def remove_pipette(c9):
+    sim = simulation()
+    if not c9.pipette:
+        sim.violation("remove_pipette called without a pipette")
+    c9.pipette, c9.pipette_ml, c9.pipette_content = False, 0.0, None
+    sim.log("pipette removed", PIPETTE_CHANGE_S)
+    c9._record("proc.remove_pipette(c9)")
@@ -0,0 +1,425 @@
+import numpy as np
+
+import robotics as ro
+
+AXES = ('gripper', 'elbow', 'shoulder', 'z')
+# Estimated per-axis limits of the N9 arm, in encoder counts
+MAX_VEL = np.array([20000.0, 20000.0, 20000.0, 15000.0])  # counts/s
+MAX_ACCEL = np.array([50000.0, 50000.0, 50000.0, 50000.0])  # counts/s^2
+
+OUTPUT_SWITCH_S = 0.3  # pneumatic valve settle time
+CAP_S_PER_REV = 1.0
+PUMP_ML_PER_S = 1.0
+
+# Slots of these loca arrays line up with ro.runtime['rack_status'][rack]
+RACKS = {
+    'vial_rack': 'vial',
+    'substrate_rack_seq': 'substrate',
+    'substrate_rack_PDMS_seq': 'substrate',
+    'pipette_rack': 'pipette',
+    'cooking_rack': 'cooking',
+}
+CLAMP = ('clamp',)
+PIPETTE_CLAMP = ('p_clamp', 'p_clamp_20ul')
+COATER_STAGE = ('s_coater',)
+PIPETTE_COATER = ('p_coater', 'pipette_coater', 'pipette_coater_one', 'pipette_coater_20uL')
+
+
+def is_free(cell) -> bool:
+    """Empty rack cell; pandas may turn a None written into a string column into NaN."""
+    return cell is None or (isinstance(cell, float) and np.isnan(cell))
+
+
+def move_time(start, end, vel=None, accel=None) -> float:
+    """
+    Seconds for a coordinated 4-axis move with trapezoidal velocity profiles; the
+    slowest axis sets the time.
+    """
+    distance = np.abs(np.asarray(end, dtype=float) - np.asarray(start, dtype=float))
+    vel = MAX_VEL if vel is None else np.minimum(MAX_VEL, vel)
+    accel = MAX_ACCEL if accel is None else np.minimum(MAX_ACCEL, accel)
+    ramp = vel ** 2 / accel  # distance needed to reach full speed and stop again
+    times = np.where(distance < ramp, 2 * np.sqrt(distance / accel), distance / vel + vel / accel)
+    return float(times.max())
+
+
+class Simulation:
+    def __init__(self):
+        """
+        Shared state of one simulated run: the clock, the event log, the vial/substrate
+        positions outside the racks and the rule violations found so far.
+        """
+        self.elapsed_s = 0.0
+        self.travel_s = 0.0
+        self.events = []
+        self.violations = []
+        self.devices = {}
+        self.clamp_vial = None  # label of the vial held by the clamp
+        self.coater_substrate = None  # label of the substrate on the coater stage
+        self.capped = {}  # vial label -> False once uncapped
+        self.films = []  # (substrate, solution, ml) deposited on the coater
+        self.steps = []  # structured trace of moves and actions, see record_move/record_action
+        self._groups = 0
+
+    def new_group(self) -> int:
+        """Id tying together the points of one multi-point move, e.g. a SequenceArray approach."""
+        self._groups += 1
+        return self._groups
+
+    def record_move(self, position, location, group=None):
+        self.steps.append({'kind': 'move', 'position': tuple(float(v) for v in position),
+                           'location': location, 'group': group})
+
+    def record_action(self, name: str, position=None, location=None, resource=None, idle=None):
+        """
+        An action at the arm's current position. `resource` is what the action occupies (a
+        location, the coater, ...), `idle` whether the arm holds nothing afterwards.
+        """
+        self.steps.append({'kind': 'action', 'name': name, 'position': None if position is None else tuple(float(v) for v in position),
+                           'location': location, 'resource': resource, 'idle': idle})
+
+    def log(self, event: str, duration_s: float = 0.0):
+        self.elapsed_s += duration_s
+        self.events.append((round(self.elapsed_s, 3), event))
+
+    def violation(self, message: str):
+        self.violations.append(message)
+        self.log(f"VIOLATION: {message}")
+
+    def rack(self, name: str):
+        return ro.runtime.get('rack_status', {}).get(name)
+
+    def locations(self):
+        """LocationIndex of the loca module, built once per loca.py version and memory-mapped."""
+        from utils.location_index import LocationIndex
+        loca = ro.runtime.get('loca')
+        if loca is None:
+            return None
+        if id(loca) not in _location_cache:
+            _location_cache[id(loca)] = LocationIndex.from_module(loca)
+        return _location_cache[id(loca)]
+
+    def locate(self, position):
+        """(loca name, slot index) of a position, or None when it is not a named location."""
+        locations = self.locations()
+        if position is None or locations is None:
+            return None
+        return locations.locate(position)
+
+
+_location_cache = {}  # id(loca module) -> LocationIndex
+
+
+def simulation() -> Simulation:
+    sim = ro.runtime.get('simulation')
+    if sim is None:
+        sim = ro.runtime['simulation'] = Simulation()
+    return sim
+
+
+def init(module: str):
+    """ro.system.init: one device per hardware module and run."""
+    devices = simulation().devices
+    if module not in devices:
+        if module not in HARDWARE:
+            raise ValueError(f"Unknown hardware module '{module}', available: {', '.join(HARDWARE)}")
+        devices[module] = HARDWARE[module](simulation())
+    return devices[module]
+
+
+class Controller:
+    def __init__(self, sim: Simulation):
+        """Simulated N9 controller: arm position, tools, air outputs, pumps and capper."""
+        self.sim = sim
+        self._position = np.zeros(4)
+        self._tool = None
+        self.outputs = {}
+        self.holding = None  # ('vial', label), ('clamped', label) gripping a clamped vial, ('cap', label)
+        self.substrate = None  # substrate held by the bernoulli tool
+        self.pipette = False
+        self.pipette_ml = 0.0
+        self.pipette_content = None
+
+    @property
+    def location(self):
+        return self.sim.locate(self._position)
+
+    @property
+    def position(self):
+        return list(self._position)
+
+    @position.setter
+    def position(self, target):
+        from robotics.procedure import SequenceArray
+        if isinstance(target, SequenceArray):
+            target = target.positions()
+        target = np.asarray(target, dtype=float)
+        points = target.reshape(-1, 4) if target.ndim > 1 else [target]
+        group = self.sim.new_group() if len(points) > 1 else None
+        for point in points:
+            self._move(point, group=group)
+
+    def _move(self, point, vel=None, accel=None, group=None):
+        if len(point) != 4:
+            raise ValueError(f"Positions have 4 axes, got {len(point)}")
+        if self.holding is not None and self.holding[0] == 'clamped' and not np.allclose(point, self._position):
+            self.sim.violation(f"Arm moved while gripping vial '{self.holding[1]}' held by the closed clamp")
+            self.holding = None
+        duration = move_time(self._position, point, vel, accel)
+        self.sim.travel_s += duration
+        self._position = np.asarray(point, dtype=float)
+        location = self.location
+        self.sim.log(f"move to {self._describe(location, point)}", duration)
+        self.sim.record_move(point, location, group)
+        if self._tool == 'substrate_tool' and self.outputs.get('bernoulli'):
+            held = self.substrate
+            self._bernoulli(True)  # arriving over a substrate with the vacuum on picks it up
+            if self.substrate != held:
+                self._record("substrate picked up")
+
+    @property
+    def idle(self) -> bool:
+        """Nothing in the gripper or on the arm, the arm can go anywhere next."""
+        return self.holding is None and self._tool is None and self.substrate is None and not self.pipette
+
+    def _record(self, name: str):
+        location = self.location
+        if location is None:
+            resource = None
+        elif location[0] in RACKS:
+            resource = (RACKS[location[0]], location[1])
+        else:
+            resource = 'coater' if 'coater' in location[0] else location[0]
+        self.sim.record_action(name, self.position, location, resource, self.idle)
+
+    @staticmethod
+    def _describe(location, point):
+        if location is None:
+            return str([int(round(v)) for v in point])
+        name, index = location
+        return f"{name}{list(index) if index else ''}"
+
+    def move_axis(self, axis, position, vel=None, accel=None):
+        axis = AXES.index(axis) if isinstance(axis, str) else int(axis)
+        point = self._position.copy()
+        point[axis] = position
+        limit_vel = None if vel is None else np.where(np.arange(4) == axis, vel, MAX_VEL)
+        limit_accel = None if accel is None else np.where(np.arange(4) == axis, accel, MAX_ACCEL)
+        self._move(point, limit_vel, limit_accel)
+
+    @property
+    def tool(self):
+        return self._tool
+
+    @tool.setter
+    def tool(self, tool):
+        if tool == self._tool:
+            return
+        if self._tool is not None and self.substrate is not None:
+            self.sim.violation(f"Dropped off '{self._tool}' while it still holds substrate '{self.substrate}'")
+            self.substrate = None
+        if tool is not None and self.holding is not None:
+            self.sim.violation(f"Picked up '{tool}' while the gripper holds {self.holding[0]} '{self.holding[1]}'")
+        self._tool = tool
+        self.sim.log(f"tool {'picked up: ' + tool if tool else 'dropped off'}", 2 * OUTPUT_SWITCH_S)
+        self._record(f"tool = {tool!r}")
+
+    def set_output(self, name: str, value: bool):
+        import loca
+        output = loca.alias.get(name, name)
+        if output not in loca.air_output:
+            raise KeyError(f"Unknown output '{name}'")
+        self.outputs[output] = bool(value)
+        self.sim.log(f"output {name} -> {value}", OUTPUT_SWITCH_S)
+        if output == 'gripper':
+            self._gripper(bool(value))
+        elif output == 'clamp':
+            self._clamp(bool(value))
+        elif output == 'bernoulli':
+            self._bernoulli(bool(value))
+        self._record(f"set_output({name!r}, {bool(value)})")
+
+    def _slot(self, rack: str):
+        """Slot index of `rack` the arm is at, or None."""
+        location = self.location
+        if location is not None and RACKS.get(location[0]) == rack:
+            return location[1]
+        return None
+
+    def _at(self, names) -> bool:
+        location = self.location
+        return location is not None and location[0] in names
+
+    def _gripper(self, close: bool):
+        vials = self.sim.rack('vial')
+        slot = self._slot('vial')
+        if close:
+            if self.holding is not None:
+                return
+            if slot is not None and vials is not None:
+                label = vials.iat[slot]
+                if isinstance(label, str):
+                    self.holding = ('vial', label)
+                    vials.iat[slot] = None
+            elif self._at(CLAMP) and self.sim.clamp_vial is not None:
+                if self.outputs.get('clamp'):
+                    self.holding = ('clamped', self.sim.clamp_vial)
+                else:
+                    self.holding = ('vial', self.sim.clamp_vial)
+                    self.sim.clamp_vial = None
+            return
+
+        holding, self.holding = self.holding, None
+        if holding is None or holding[0] == 'clamped':
+            return
+        kind, label = holding
+        if kind == 'cap':
+            self.sim.violation(f"Released the cap of '{label}' away from the vial")
+        elif self._at(CLAMP):
+            if self.sim.clamp_vial is not None:
+                self.sim.violation(f"Released '{label}' onto the clamp that already holds '{self.sim.clamp_vial}'")
+            elif not self.outputs.get('clamp'):
+                self.sim.violation(f"Released '{label}' into the open clamp, close the clamp first")
+            else:
+                self.sim.clamp_vial = label
+        elif slot is not None and vials is not None:
+            if not is_free(vials.iat[slot]):
+                self.sim.violation(f"Released '{label}' onto occupied vial slot {list(slot)}")
+            else:
+                vials.iat[slot] = label
+        else:
+            self.sim.violation(f"Released vial '{label}' away from the clamp and the vial rack")
+
+    def _clamp(self, close: bool):
+        if close:
+            if self.holding is not None and self.holding[0] == 'vial' and self._at(CLAMP):
+                # vial lowered into the clamp: now held by both until the gripper opens
+                self.sim.clamp_vial = self.holding[1]
+                self.holding = ('clamped', self.holding[1])
+            return
+        if self.holding is not None and self.holding[0] == 'clamped':
+            self.holding = ('vial', self.holding[1])
+            self.sim.clamp_vial = None
+        elif self.sim.clamp_vial is not None:
+            self.sim.log(f"vial '{self.sim.clamp_vial}' rests in the open clamp")
+
+    def _bernoulli(self, on: bool):
+        if self._tool != 'substrate_tool':
+            self.sim.violation("Switched the bernoulli vacuum without the substrate tool")
+            return
+        substrates = self.sim.rack('substrate')
+        slot = self._slot('substrate')
+        if on:
+            if self.substrate is not None:
+                return
+            if slot is not None and substrates is not None and isinstance(substrates.iat[slot], str):
+                self.substrate = substrates.iat[slot]
+                substrates.iat[slot] = None
+            elif self._at(COATER_STAGE) and self.sim.coater_substrate is not None:
+                if self.outputs.get('coater_stage_vacuum'):
+                    self.sim.violation("Picked up the substrate while the coater stage vacuum is on")
+                self.substrate, self.sim.coater_substrate = self.sim.coater_substrate, None
+            return
+
+        substrate, self.substrate = self.substrate, None
+        if substrate is None:
+            return
+        if self._at(COATER_STAGE):
+            if self.sim.coater_substrate is not None:
+                self.sim.violation(f"Placed '{substrate}' on the coater stage that already holds a substrate")
+            self.sim.coater_substrate = substrate
+        elif slot is not None and substrates is not None:
+            if not is_free(substrates.iat[slot]):
+                self.sim.violation(f"Placed '{substrate}' onto occupied substrate slot {list(slot)}")
+            substrates.iat[slot] = substrate
+        else:
+            self.sim.violation(f"Released substrate '{substrate}' away from the coater and the substrate rack")
+
+    def uncap(self, pitch=1.75, revs=3.0, vel=5000, accel=5000):
+        if self.holding is None or self.holding[0] != 'clamped':
+            self.sim.violation("uncap needs the gripper closed on a vial held by the closed clamp")
+        else:
+            label = self.holding[1]
+            self.sim.capped[label] = False
+            self.holding = ('cap', label)
+        self.sim.log("uncap", revs * CAP_S_PER_REV)
+        self._record("uncap")
+        return self.position
+
+    def cap(self, pitch=1.75, revs=3.0, torque_thresh=1000, vel=5000, accel=5000):
+        if self.holding is None or self.holding[0] != 'cap' or not self._at(CLAMP) \
+                or self.sim.clamp_vial != self.holding[1]:
+            self.sim.violation("cap needs the vial's cap in the gripper above the clamped vial")
+        else:
+            self.sim.capped[self.holding[1]] = True
+            self.holding = ('clamped', self.holding[1])
+        self.sim.log("cap", revs * CAP_S_PER_REV)
+        self._record("cap")
+
+    def aspirate_ml(self, pump, ml):
+        self.sim.log(f"aspirate {ml} mL", ml / PUMP_ML_PER_S)
+        self._record(f"aspirate_ml({pump}, {ml})")
+        if not self.pipette:
+            self.sim.violation("Aspirated without a pipette")
+            return
+        label = self.sim.clamp_vial
+        if not self._at(PIPETTE_CLAMP) or label is None:
+            self.sim.violation("Aspirated away from a vial in the clamp")
+            return
+        if self.sim.capped.get(label, True):
+            self.sim.violation(f"Aspirated from capped vial '{label}'")
+            return
+        self.pipette_ml += ml
+        self.pipette_content = label
+
+    def dispense_ml(self, pump, ml):
+        self.sim.log(f"dispense {ml} mL", ml / PUMP_ML_PER_S)
+        self._record(f"dispense_ml({pump}, {ml})")
+        if ml > self.pipette_ml + 1e-9:
+            self.sim.violation(f"Dispensed {ml} mL with only {self.pipette_ml:.3f} mL in the pipette")
+        self.pipette_ml = max(self.pipette_ml - ml, 0.0)
+        if self._at(PIPETTE_COATER):
+            if self.sim.coater_substrate is None:
+                self.sim.violation("Dispensed onto the empty coater stage")
+            else:
+                self.sim.films.append((self.sim.coater_substrate, self.pipette_content, ml))
+        elif not self._at(PIPETTE_CLAMP):
+            self.sim.violation(f"Dispensed at {self._describe(self.location, self._position)}")
+
+
+class Temperature:
+    def __init__(self, sim: Simulation):
+        self.sim = sim
+        self.setpoints = {}
+
+    def set_temp(self, channel, temperature):
+        self.setpoints[channel] = temperature
+        self.sim.log(f"temperature channel {channel} -> {temperature}")
+        self.sim.record_action(f"set_temp({channel}, {temperature})", resource='temperature')
+
+
+class Coater:
+    def __init__(self, sim: Simulation):
+        self.sim = sim
+        self._position = 0.0  # mm
+        self.velocity = 1.0  # mm/s
+
+    @property
+    def position(self):
+        return self._position
+
+    @position.setter
+    def position(self, position):
+        distance = abs(position - self._position)
+        if self.velocity <= 0:
+            raise ValueError("Coater velocity must be positive")
+        self._position = position
+        self.sim.log(f"coater blade -> {position} mm", distance / self.velocity)
+        self.sim.record_action(f"coater.position = {position}", resource='coater')
+
+
+HARDWARE = {
+    'controller': Controller,
+    'temperature': Temperature,
+    'coater': Coater,
+}
@@ -1,5 +1,23 @@
 #UI Params
 port = 2025
+app_pool_size = 2 #AutoGenSystem instances built at app startup, one per concurrent chat
+app_max_queue = 16 #Chats allowed to wait for a free worker before new ones are refused
+ws_host = "localhost" #WebSocket server for static/websocket-client.js
+ws_port = 8765
+ws_max_upload_mb = 50 #Largest PDF accepted by the WebSocket upload_pdf message
+human_input_timeout_s = 300 #How long a chat waits for the user before using the default answer
+human_input_defaults = {"admin": "exit", # ends the chat
+                        "code_writer_agent": ""} # empty lets the agent continue on its own
+history_max_rows = 200 #Chat rows kept in memory per session, older rows are spilled to the transcript
+history_max_chars = 200000 #Characters kept in memory per session
+history_max_sessions = 64 #Sessions kept in memory, idle ones are spilled to the transcript
+history_display_rows = 50 #Rows shown in the chatbot, older ones are paged in from the transcript
+history_page_size = 20
+transcript_db = 'transcripts.sqlite' #Append-only store for spilled chat history
+inventory_db = 'inventory.sqlite' #Rack inventory shared by all chats, reserved and consumed slots persist
+template_library = 'script_templates.json' #Scripts from successful chats, known tasks skip the LLM
+template_threshold = 0.9 #Prompt similarity needed to answer from a template of the same task (verb, object, source, destination)
+executor_pool_size = 1 #Warm workers per chat that run the generated code, with numpy, pandas, robotics and loca preloaded
 
 # Env settings -- used for local model (hf)
 set_visible_devices = True
@@ -18,11 +36,23 @@ seq_length = seq_lengths[model_name]
 # OpenAI params
 anl_llm_url_path = 'keys/ANL_LLM_URL'
 anl_llm_debug = True
-anl_llm_debug_fp = 'anl_outputs.log'
+anl_llm_debug_fp = 'anl_outputs.jsonl' # JSONL trace, written by a background thread
+anl_llm_debug_max_bytes = 50 * 1024 * 1024 # Rotate the trace file past this size
+anl_llm_debug_backups = 5 # Rotated trace files to keep
+anl_llm_debug_sample_rate = 1.0 # Fraction of calls to trace
+anl_llm_debug_log_text = False # Also trace full prompt/response text (hashes and sizes are always kept)
 anl_user = "avriza"
 # One of: gpt35, gpt35large, gpt4, gpt4large, gpt4turbo gpto1preview
 anl_llm_model = 'gpt4o' 
 
+anl_llm_batch_size = 16 # Max prompts packed into one request by AnlLLM._generate
+anl_llm_batch_max_chars = 200000 # Max total prompt characters per batched request
+anl_llm_max_concurrency = 8 # Parallel single calls when the endpoint rejects batches
+anl_llm_batch_cooldown_s = 60 # After a failed batch request, single calls only for this long
+anl_llm_max_retries = 2 # Retries of a failed single call before AnlLLM raises
+anl_llm_retry_backoff_s = 1.0 # Wait before the first retry, doubled for each further one
+anl_llm_timeout_s = 120 # Seconds an LLM request may take before it counts as failed
+
 anl_embed_url_path = 'keys/ANL_EMBED_URL'
 
 embedding_model_name =   "all-mpnet-base-v2" #Highest scoring all-round, does 2800 sentences/s
@@ -31,6 +61,7 @@ chunk_overlap = 128 #How much overlap between chunks
 
 #Embedding params
 base_path = 'embeds/' 
+embed_path = base_path + 'chroma' #Where the Chroma collection is persisted
 init_docs = False #Recompute embeddings?
 overwrite_embeddings = True #Overwrite embeddings if already exist? -- will raise val error of init_docs is True and this is not
 
@@ -40,6 +71,9 @@ similarity_cutoff = 1.4 #Ignore context hits greater than this distance away. Em
 N_NER_hits = 2 #How many NER hits to provide
 min_NER_length = 5 #Only consider entities > 5 characters
 
+#Retrieval params
+retrieval_budget_s = 2.0 #Latency budget for one hybrid (vector + NER) retrieval
+
 #List of folders to add to doc store
 doc_path_root = "DOC_STORE"
 doc_paths = ["%s/APS-Science-Highlight" %doc_path_root, 
@@ -50,6 +84,7 @@ doc_paths = ["%s/APS-Science-Highlight" %doc_path_root,
              "%s/CNM-Science-Highlight" %doc_path_root
             ]
 pdf_text_path = "%s/PDFs"  %doc_path_root#Store raw text from PDF for NER
+keyword_index_path = "%s/keyword_index" %doc_path_root #Inverted index over pdf_text_path for NER lookups
 
 #Spec Params
 spec_init = True
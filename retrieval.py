@@ -0,0 +1,193 @@
+"""
+===========================
+Hybrid Retrieval
+===========================
+
+Combines the Chroma vector store (`llms.init_facility_qa`) with NER keyword
+hits over the raw PDF text (`params.pdf_text_path`, see `keyword_index`).
+Both stages run concurrently inside a latency budget; the hits are merged,
+deduplicated and ranked with reciprocal rank fusion.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Dict, List
+
+import keyword_index
+import params
+
+RRF_K = 60  # Reciprocal rank fusion constant
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+
+class HybridRetriever:
+    def __init__(self, docsearch, pdf_text_path: str = params.pdf_text_path,
+                 n_hits: int = params.N_hits, n_ner_hits: int = params.N_NER_hits,
+                 similarity_cutoff: float = params.similarity_cutoff,
+                 budget_s: float = params.retrieval_budget_s):
+        """
+        Args:
+            docsearch: Chroma vector store returned by `llms.init_facility_qa`
+            pdf_text_path (str): Folder holding the raw PDF text (pdf.txt)
+            n_hits (int): Number of vector hits to request
+            n_ner_hits (int): Number of NER keyword hits to keep
+            similarity_cutoff (float): Drop vector hits further away than this distance
+            budget_s (float): Latency budget for one retrieval, in seconds
+        """
+        self.docsearch = docsearch
+        self.pdf_text_path = pdf_text_path
+        self.n_hits = n_hits
+        self.n_ner_hits = n_ner_hits
+        self.similarity_cutoff = similarity_cutoff
+        self.budget_s = budget_s
+
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="retrieval")
+        # Runs that missed the budget keep their worker until they finish, their stage is
+        # skipped meanwhile so later queries do not queue behind them
+        self._overdue = {}  # stage -> future
+        self._overdue_lock = threading.Lock()
+        self._pdf_mtime = None
+
+    def _sync_index(self):
+        """Re-index pdf.txt when it changed since the last lookup."""
+        pdf_fp = os.path.join(self.pdf_text_path, 'pdf.txt')
+        if not os.path.exists(pdf_fp):
+            return
+        mtime = os.path.getmtime(pdf_fp)
+        if mtime != self._pdf_mtime:
+            keyword_index.index_pdf_text(pdf_fp)
+            self._pdf_mtime = mtime
+
+    def _vector_hits(self, query: str) -> List[Dict[str, Any]]:
+        results = self.docsearch.similarity_search_with_score(query, k=self.n_hits)
+        return [{'text': doc.page_content, 'distance': float(distance)}
+                for doc, distance in results if distance <= self.similarity_cutoff]
+
+    def _ner_hits(self, query: str) -> List[Dict[str, Any]]:
+        import llms
+        entities = llms.ner_hits(query)
+        if not entities:
+            return []
+
+        self._sync_index()
+        return [{'text': text, 'entities': matched, 'ner_score': score}
+                for text, score, matched in keyword_index.get_index().search(entities, k=self.n_ner_hits)]
+
+    def _timed(self, stage, query, timings):
+        start = time.perf_counter()
+        try:
+            return stage(query)
+        finally:
+            timings[stage.__name__.strip('_')] = time.perf_counter() - start
+
+    def retrieve(self, query: str) -> Dict[str, Any]:
+        """
+        Run vector and NER search concurrently and merge the results.
+
+        Args:
+            query (str): The user question
+
+        Returns:
+            dict: 'hits' (ranked list of dicts), 'timings' (seconds per stage)
+                  and 'timed_out' (stages that missed the latency budget, or were
+                  skipped because an earlier run of theirs still has not finished)
+        """
+        start = time.perf_counter()
+        timings = {}
+        futures, timed_out = {}, []
+        with self._overdue_lock:
+            for stage, run in (('vector_hits', self._vector_hits), ('ner_hits', self._ner_hits)):
+                overdue = self._overdue.get(stage)
+                if overdue is not None and not overdue.done():
+                    timed_out.append(stage)
+                    continue
+                self._overdue.pop(stage, None)
+                futures[stage] = self._pool.submit(self._timed, run, query, timings)
+        done, _ = wait(futures.values(), timeout=self.budget_s)
+
+        ranked_lists = {}
+        for stage, future in futures.items():
+            if future not in done:
+                timed_out.append(stage)
+                with self._overdue_lock:
+                    self._overdue[stage] = future
+                continue
+            try:
+                ranked_lists[stage] = future.result()
+            except Exception as e:
+                print(f"Retrieval stage {stage} failed: {e}")
+                ranked_lists[stage] = []
+
+        merge_start = time.perf_counter()
+        hits = self._merge(ranked_lists)
+        timings['merge'] = time.perf_counter() - merge_start
+        timings['total'] = time.perf_counter() - start
+
+        return {'hits': hits, 'timings': timings, 'timed_out': timed_out}
+
+    def _merge(self, ranked_lists: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Deduplicate on normalized text and rank with reciprocal rank fusion."""
+        merged = {}
+        for stage, hits in ranked_lists.items():
+            source = stage.replace('_hits', '')
+            for rank, hit in enumerate(hits):
+                key = _normalize(hit['text'])
+                entry = merged.setdefault(key, {'text': hit['text'], 'sources': [], 'score': 0.0})
+                entry['sources'].append(source)
+                entry['score'] += 1.0 / (RRF_K + rank + 1)
+                for field in ('distance', 'entities'):
+                    if field in hit:
+                        entry[field] = hit[field]
+
+        # Drop hits whose text is fully contained in a better ranked hit
+        ranked = sorted(merged.values(), key=lambda hit: hit['score'], reverse=True)
+        kept = []
+        for hit in ranked:
+            key = _normalize(hit['text'])
+            if not any(key in _normalize(other['text']) for other in kept):
+                kept.append(hit)
+        return kept
+
+    @staticmethod
+    def format_context(result: Dict[str, Any]) -> str:
+        """Render retrieval hits as a context block for the agents."""
+        if not result['hits']:
+            return "No relevant context found."
+        blocks = []
+        for i, hit in enumerate(result['hits']):
+            blocks.append(f"[{i + 1}] ({'+'.join(hit['sources'])})\n{hit['text']}")
+        return "\n\n".join(blocks)
+
+
+_retriever = None
+
+
+def get_retriever() -> HybridRetriever:
+    """Lazily build the shared retriever on top of the persisted Chroma store."""
+    global _retriever
+    if _retriever is None:
+        import llms
+        embeddings = llms.ANLEmbeddingModel(params)
+        _retriever = HybridRetriever(llms.init_facility_qa(embeddings, params))
+    return _retriever
+
+
+def retrieve_context(query: str) -> str:
+    """
+    Retrieve ranked context for a query from the document store and the PDF text.
+
+    Args:
+        query (str): The question to find context for
+
+    Returns:
+        str: The ranked context hits
+    """
+    retriever = get_retriever()
+    result = retriever.retrieve(query)
+    timings = ", ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in result['timings'].items())
+    print(f"Retrieval timings: {timings}; timed out: {result['timed_out']}")
+    return retriever.format_context(result)
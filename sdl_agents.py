@@ -1,43 +1,37 @@
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import PyPDF2
 import autogen
 from autogen import (
     UserProxyAgent,
     AssistantAgent,
+    ChatResult,
     ConversableAgent,
     register_function,
 )
-from autogen.coding import LocalCommandLineCodeExecutor
+from autogen.coding import CodeBlock
 # from autogen.agentchat.contrib.capabilities.teachability import Teachability
 # import autogen_llm
 from utils.teachability_filtered import DedupTeachability
 from config.settings import OPENAI_API_KEY, anthropic_api_key
-from utils.system_messages import code_writer_system_message
+from utils.system_messages import code_writer_system_message, code_reviewer_system_message, polybot_reference
+from retrieval import retrieve_context
+from utils.capture_manager import CaptureGroupChatManager
+from utils.speaker_selection import RuleBasedSpeakerSelector
+from utils.context_compression import ContextCompression
+from utils.prompt_cache import get_prompt_cache_logger
+from utils.script_validator import CODE_BLOCK, ScriptValidator, StaticReview
+from utils.templates import TemplateLibrary, rack_status_vocabulary
+from utils.location_index import get_location_index
+from utils.inventory_store import get_inventory_store, load_rack_status
+from utils.warm_executor import WarmPoolCodeExecutor
+from utils.dry_run import DryRunCodeExecutor
+from utils.safety_rules import SafetyChecker
 import asyncio
+import json
 import time
 
 
-class CaptureGroupChatManager(autogen.GroupChatManager):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.captured_messages = []
-        
-    def receive(self, message, sender, request_reply=None, silent=False):
-        # Capture the message
-        if not silent:
-            agent_name = getattr(sender, "name", "Unknown")
-            if isinstance(message, dict) and "content" in message:
-                content = message["content"]
-            else:
-                content = str(message)
-                
-            if content:  
-                self.captured_messages.append(f"{agent_name}: {content}")
-        
-        return super().receive(message, sender, request_reply, silent)
-
- 
 def get_llm_config(llm_type: str) -> Dict[str, Any]:
     """
     Get LLM configuration based on the selected model type.    
@@ -46,6 +40,9 @@ def get_llm_config(llm_type: str) -> Dict[str, Any]:
     Returns:
         dict: LLM configuration dictionary
     """
+    # OpenAI caches prompt prefixes of 1024+ tokens automatically, there is nothing to switch on;
+    # it pays off because the writer/reviewer system messages start with the same static reference.
+    # Anthropic needs cache_control blocks, which autogen's AnthropicClient does not pass through yet.
     llm_configs = {
         'gpt4o-mini': {
             "model": "gpt-4o-mini",
@@ -77,6 +74,10 @@ def get_llm_config(llm_type: str) -> Dict[str, Any]:
     
     return llm_configs.get(llm_type, llm_configs['ArgoLLMs'])
 
+# Extracted PDF text, keyed on the file's inode, mtime and size so repeated
+# scrapes (and hard-linked duplicate uploads) skip the extraction
+_pdf_text_cache = {}
+
 def pdf_to_text(pdf_file: str) -> str:
     """
     Extract text from a PDF file.
@@ -87,12 +88,18 @@ def pdf_to_text(pdf_file: str) -> str:
     Returns:
         str: Extracted text from the PDF
     """
+    stat = os.stat(pdf_file)
+    cache_key = (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    if cache_key in _pdf_text_cache:
+        return _pdf_text_cache[cache_key]
+
     with open(pdf_file, 'rb') as file:
         pdf_reader = PyPDF2.PdfReader(file)
         text = ""
         for page_num in range(len(pdf_reader.pages)):
             page = pdf_reader.pages[page_num]
             text += page.extract_text()
+    _pdf_text_cache[cache_key] = text
     return text
 
 
@@ -106,6 +113,15 @@ def save_code(code: str, filepath: str) -> str:
     return f"Code saved successfully to {filepath}"
 
 
+def _inventory_label(label: str):
+    """Rack cell value of a label given by an agent: '1' and 'null' are the int and None cells."""
+    try:
+        value = json.loads(label)
+    except ValueError:
+        return label
+    return value if value is None or isinstance(value, (bool, int)) else label
+
+
 # Custom termination function to detect successful code execution
 def is_termination_msg(msg):
     """Determines if the conversation should terminate based on message content"""
@@ -121,7 +137,10 @@ def is_termination_msg(msg):
 
 
 class AutoGenSystem:
-    def __init__(self, llm_type: str, workdir: str, polybot_file_path: str):
+    def __init__(self, llm_type: str, workdir: str, polybot_file_path: str, loca_file_path: str = 'loca.py',
+                 inventory_db_path: str = None, rack_status_file_path: str = 'rack_status.py',
+                 template_library_path: str = None, template_threshold: float = 0.9,
+                 executor_pool_size: int = 1):
         """
         Initialize AutoGen system with specified LLM configuration.
         
@@ -129,6 +148,13 @@ class AutoGenSystem:
             llm_type (str): Type of LLM to use
             workdir (str): Working directory path
             polybot_file_path (str): Path to the polybot file
+            loca_file_path (str): Path to the location definitions used by the generated scripts
+            inventory_db_path (str): Optional persistent rack inventory shared by all chats
+            rack_status_file_path (str): Initial inventory for racks the store does not have yet
+            template_library_path (str): Optional library of scripts from successful chats, prompts
+                                         stating the same task as one of them are answered without LLM calls
+            template_threshold (float): Minimum prompt similarity for a template answer of the same task
+            executor_pool_size (int): Warm workers running the generated code
         """
         self.llm_type = llm_type
         self.llm_config = get_llm_config(llm_type)
@@ -138,24 +164,58 @@ class AutoGenSystem:
         with open(polybot_file_path, 'r') as polybot_file:
             self.polybot_file = ''.join(polybot_file.readlines())
         
-        # Initialize executor
-        self.executor = LocalCommandLineCodeExecutor(
+        # Initialize executor, its workers import numpy, pandas, robotics and loca once instead of per code block.
+        # They only start with the first code block it runs, pooled systems that run no code cost no processes
+        self.executor = WarmPoolCodeExecutor(
             timeout=120,
             work_dir=workdir,
+            pool_size=executor_pool_size,
         )
 
+        # Positions and rack shapes of loca.py, precomputed once and memory-mapped
+        self.location_index = get_location_index(loca_file_path)
+
+        # Local ast check of generated scripts against the operations file, loca.py and the physical
+        # rules of the tool, gripper, clamp and vial, in milliseconds and without running the script
+        self.script_validator = ScriptValidator(polybot_file_path, loca_file_path, self.location_index,
+                                                SafetyChecker(loca_file_path))
+
+        # Persistent rack inventory shared by all chats. The agents only read it: this system runs
+        # no code, so it cannot tell when a script used its slots and reserves none per chat
+        self.inventory = None
+        if inventory_db_path is not None:
+            self.inventory = get_inventory_store(inventory_db_path, seed=load_rack_status(rack_status_file_path))
+
+        # Known tasks are answered from validated scripts, filled with the prompt's labels and indices.
+        # A script is only learned after it ran cleanly on the simulator, in a worker process: the
+        # simulator swaps `robotics` and rack_status in the process that runs it
+        self.templates = None
+        self.template_check = None
+        if template_library_path is not None:
+            self.templates = TemplateLibrary(template_library_path, vocabulary=rack_status_vocabulary(rack_status_file_path),
+                                             threshold=template_threshold, validator=self.script_validator,
+                                             locations=self.location_index.names)
+            self.template_check = DryRunCodeExecutor(timeout=60, work_dir=workdir)
+
+        # Counts provider-cached prompt tokens, the static reference prefix should mostly hit the cache
+        self.prompt_cache = get_prompt_cache_logger()
+
         self._setup_agents()
         self._setup_group_chat()
         self._setup_teachability() # enable this to add teachability
+        self._setup_context_compression()
         print("POLYBOT ADMIN TYPE:", type(self.polybot_admin))
         print("CODE WRITER TYPE:", type(self.code_writer_agent))
         
     def _setup_agents(self):
         """Set up all required agents with the specified LLM configuration."""
+        # The large static operations reference goes first and is identical for the writer and
+        # the reviewer, so repeated calls reuse the provider's prompt cache for it
+        polybot_prefix = polybot_reference(self.polybot_file)
 
         self.code_writer_agent = ConversableAgent(
             name="code_writer_agent",
-            system_message=code_writer_system_message + self.polybot_file,
+            system_message=polybot_prefix + code_writer_system_message,
             llm_config=self.llm_config,
             code_execution_config=False,
             # human_input_mode="AUTO",
@@ -164,9 +224,7 @@ class AutoGenSystem:
         # Code review agent
         self.code_review_agent = ConversableAgent(
             name="code_reviewer_agent",
-            system_message=f"Your task is to review the code provided by the code writer agent and provide feedback on necessary corrections. "
-                           "Ensure that all required libraries are imported, and only the existing, approved operation functions are used."
-                           "The only allowed libraries and operating functions are provided in the  {self.polybot_file}",
+            system_message=polybot_prefix + code_reviewer_system_message,
             llm_config=self.llm_config,
             code_execution_config=False,
             human_input_mode="NEVER",
@@ -207,6 +265,44 @@ class AutoGenSystem:
             description="Scrape PDF files and return the content.",
         )
 
+        # Register the hybrid (vector + NER) retrieval over the document store
+        register_function(
+            retrieve_context,
+            caller=self.scraper_agent,
+            executor=self.polybot_admin,
+            name="retrieve_context",
+            description="Retrieve ranked context for a question from the document store and the scraped PDF text.",
+        )
+
+        # Register the location lookup over the precomputed loca index
+        def get_location(name: str, row: Optional[int] = None, col: Optional[int] = None) -> str:
+            return self.location_index.describe(name, row, col)
+
+        register_function(
+            get_location,
+            caller=self.code_writer_agent,
+            executor=self.polybot_admin,
+            name="get_location",
+            description="Position of a loca location, or of slot [row, col] of a loca rack, and the shape of racks.",
+        )
+
+        if self.inventory is not None:
+            # Register the inventory lookup over the shared store
+            def check_inventory(rack: str, label: str) -> str:
+                rack_inventory = self.inventory.inventory()[rack]
+                label = _inventory_label(label)
+                return f"{rack_inventory.count(label)} slots of the {rack} rack hold {label!r}, " \
+                       f"first ones: {rack_inventory.slots(label, 5).tolist()}"
+
+            register_function(
+                check_inventory,
+                caller=self.code_writer_agent,
+                executor=self.polybot_admin,
+                name="check_inventory",
+                description="Count and first free slots holding a label in a rack (vial, substrate, pipette, cooking). "
+                            "Labels: a solution name, 'new' for substrates, '1' for unused pipette tips, 'null' for free space.",
+            )
+
         # Register the save code function
         # register_function(
         # save_code,
@@ -219,10 +315,19 @@ class AutoGenSystem:
         
     def _setup_group_chat(self):
         """Set up group chat and manager."""
+        # Fixed transitions pick most speakers without an LLM call, 'auto' decides the rest
+        self.speaker_selector = RuleBasedSpeakerSelector(
+            admin=self.polybot_admin,
+            writer=self.code_writer_agent,
+            reviewer=self.code_review_agent,
+            scraper=self.scraper_agent,
+            code_check=lambda content: self.script_validator.validate_message(content).ok,
+        )
         self.groupchat = autogen.GroupChat(
             agents=[self.polybot_admin, self.code_writer_agent, self.code_review_agent, self.scraper_agent],
             messages=[],
             max_round=20,
+            speaker_selection_method=self.speaker_selector,
             # select_speaker_auto_model_client_cls=autogen_llm.ArgoModelClient,
             select_speaker_auto_llm_config=self.llm_config
         )
@@ -255,6 +360,53 @@ class AutoGenSystem:
         
         # self.teachability.analyzer.register_model_client(autogen_llm.ArgoModelClient)
     
+    def _setup_context_compression(self):
+        """Compress the chat history each LLM agent resends: superseded code, old tool outputs and old turns."""
+        self.context_compression = ContextCompression(model=self.llm_config["model"])
+        for agent in [self.code_writer_agent, self.code_review_agent, self.scraper_agent]:
+            self.context_compression.add_to_agent(agent)
+
+        # The LLM reviewer only runs when the static check fails, and gets its findings with the code
+        StaticReview(self.script_validator).add_to_agent(self.code_review_agent)
+
+    def _template_answer(self, prompt: str):
+        """ChatResult with the filled template script when the prompt matches a known task, else None."""
+        found = self.templates.match(prompt) if self.templates is not None else None
+        if found is None:
+            return None
+        self.groupchat.reset()
+        self.manager.reset()
+        content = f"```python\n{found.code}```"
+        messages = [(self.polybot_admin, {"content": prompt, "role": "user", "name": self.polybot_admin.name}),
+                    (self.code_writer_agent, {"content": content, "role": "user", "name": self.code_writer_agent.name})]
+        for sender, message in messages:
+            self.groupchat.append(message, sender)
+            if hasattr(self.manager, "capture"):
+                self.manager.capture(message, sender)
+        print(f"Answered from the script template '{found.template.intent}' (similarity {found.score:.2f}), no LLM calls")
+        no_cost = {"total_cost": 0}
+        return ChatResult(chat_history=[message for _, message in messages], summary=content,
+                          cost={"usage_including_cached_inference": no_cost, "usage_excluding_cached_inference": no_cost},
+                          human_input=[])
+
+    def _learn_template(self, prompt: str):
+        """Keep the chat's final script as a template when it validates and runs cleanly on the simulator."""
+        if self.templates is None:
+            return
+        for message in reversed(self.groupchat.messages):
+            content = message.get("content")
+            if message.get("name") != self.code_writer_agent.name or not isinstance(content, str) or "```" not in content:
+                continue
+            if not self.script_validator.validate_message(content).ok:
+                return
+            code = [code for lang, code in CODE_BLOCK.findall(content) if lang.lower() in ("python", "py", "")]
+            if not code:
+                return
+            dry_run = self.template_check.execute_code_blocks([CodeBlock(code=code[0], language="python")])
+            if dry_run.exit_code == 0:
+                self.templates.add(prompt, code[0])
+            return
+
     def initiate_chat(self, prompt: str) -> Any:
         """
         Initiate a chat with the specified prompt.
@@ -265,17 +417,37 @@ class AutoGenSystem:
         Returns:
             Any: Chat result
         """
-        return self.polybot_admin.initiate_chat(
+        answer = self._template_answer(prompt)
+        if answer is not None:
+            return answer
+        self.speaker_selector.reset_stats()
+        self.context_compression.reset_stats()
+        result = self.polybot_admin.initiate_chat(
             self.manager,
             message=prompt,
 
         )
+        self._learn_template(prompt)
+        print(self.speaker_selector.report())
+        print(self.context_compression.report())
+        if self.prompt_cache is not None:
+            print(self.prompt_cache.report())
+        return result
     async def a_initiate_chat(self, message: str):
+        if self._template_answer(message) is not None:
+            return
+        self.speaker_selector.reset_stats()
+        self.context_compression.reset_stats()
         await self.polybot_admin.a_initiate_chat(
             recipient=self.manager,  # or any agent you want to start the chat
             message=message,
             clear_history=True
         )
+        await asyncio.to_thread(self._learn_template, message)
+        print(self.speaker_selector.report())
+        print(self.context_compression.report())
+        if self.prompt_cache is not None:
+            print(self.prompt_cache.report())
 
 # Usage example:
 if __name__ == "__main__":
@@ -8,7 +8,9 @@ from autogen import (
     ConversableAgent,
     register_function,
 )
-from autogen.coding import LocalCommandLineCodeExecutor
+from utils.warm_executor import WarmPoolCodeExecutor
+from utils.dry_run import DryRunCodeExecutor
+from utils.safety_rules import SafetyChecker
 # from autogen.agentchat.contrib.capabilities.teachability import Teachability
 # import autogen_llm
 from utils.teachability_filtered import DedupTeachability
@@ -111,7 +113,7 @@ class TerminatingUserProxyAgent(UserProxyAgent):
         return False
 
 class AutoGenSystem:
-    def __init__(self, llm_type: str, workdir: str, polybot_file_path: str):
+    def __init__(self, llm_type: str, workdir: str, polybot_file_path: str, execution_mode: str = 'gated'):
         """
         Initialize AutoGen system with specified LLM configuration.
         
@@ -119,6 +121,8 @@ class AutoGenSystem:
             llm_type (str): Type of LLM to use
             workdir (str): Working directory path
             polybot_file_path (str): Path to the polybot file
+            execution_mode (str): 'dry_run' runs the code only on the simulator, 'gated' on the robot once
+                                  its dry run passed, 'real' on the robot directly
         """
         self.llm_type = llm_type
         self.llm_config = get_llm_config(llm_type)
@@ -128,11 +132,24 @@ class AutoGenSystem:
         with open(polybot_file_path, 'r') as polybot_file:
             self.polybot_file = ''.join(polybot_file.readlines())
         
-        # Initialize executor
-        self.executor = LocalCommandLineCodeExecutor(
-            timeout=120,
-            work_dir=workdir,
-        )
+        # Initialize executor, the agents get the simulator's trace back within seconds in the dry run modes
+        if execution_mode not in ('dry_run', 'gated', 'real'):
+            raise ValueError(f"Unknown execution mode '{execution_mode}', use 'dry_run', 'gated' or 'real'")
+        self.executor = None
+        if execution_mode != 'dry_run':
+            # the physical rules gate every run on the robot, read with the loca.py the scripts import:
+            # the one in the workdir, else the repository's
+            loca_file_path = os.path.join(workdir, 'loca.py')
+            if not os.path.exists(loca_file_path):
+                loca_file_path = 'loca.py'
+            self.executor = WarmPoolCodeExecutor(
+                timeout=120,
+                work_dir=workdir,
+                gate=SafetyChecker(loca_file_path, strict=True).check,
+            )
+        if execution_mode != 'real':
+            self.executor = DryRunCodeExecutor(work_dir=workdir, real_executor=self.executor)
+        self.executor.start()  # this system runs code: warm the workers while the agents write the first block
 
         self._setup_agents()
         self._setup_group_chat()
@@ -0,0 +1,34 @@
+"""
+The motion optimizer must never reorder tasks that use the arm's gripper or tools.
+
+From the repository root:
+    python -m pytest tests/test_motion.py
+"""
+from n9_sim import run_script
+from n9_sim.motion import optimize, split_tasks
+
+VIAL_TO_CLAMP_THEN_TOOL = """
+import loca
+import robotics as ro
+from robotics import procedure as proc
+
+c9 = ro.system.init('controller')
+c9.position = loca.vial_rack[proc.find_rack_index('vial', 'polymer_A')]
+c9.set_output('gripper', True)
+c9.position = loca.clamp
+c9.set_output('clamp', True)
+c9.set_output('gripper', False)
+c9.position = [0, 0, 0, 0]
+c9.tool = 'substrate_tool'
+c9.position = [2000, 2000, 0, 0]
+"""
+
+
+def test_tool_pick_up_stays_after_vial_transfer():
+    steps = run_script(VIAL_TO_CLAMP_THEN_TOOL).steps
+    tasks = split_tasks(steps)
+    # the tool pick-up shares no rack or fixture with the vial transfer, only the arm
+    assert [task.resources for task in tasks] == [{'clamp', ('vial', (1, 2))}, set()]
+    plan = optimize(steps)
+    assert plan.order == [0, 1]
+    assert plan.saved_s >= 0
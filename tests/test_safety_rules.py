@@ -0,0 +1,50 @@
+"""
+The safety check gates real runs, so it must fail closed on scripts it cannot follow.
+
+From the repository root:
+    python -m pytest tests/test_safety_rules.py
+"""
+import pytest
+
+from utils.safety_rules import SafetyChecker
+
+HEAD = """import loca
+import robotics as ro
+from robotics import procedure as proc
+c9 = ro.system.init('controller')
+"""
+
+
+@pytest.fixture(scope="module")
+def gate():
+    return SafetyChecker("loca.py", strict=True)
+
+
+@pytest.mark.parametrize("body", [
+    "arm = c9\narm.aspirate_ml(0, 0.2)\n",
+    "def go(robot):\n    robot.aspirate_ml(0, 0.2)\ngo(c9)\n",
+    "for i in range(2):\n    proc.new_pipette(c9)\n",
+    "x = 1\nif x:\n    pass\nelse:\n    c9.aspirate_ml(0, 0.2)\n",
+])
+def test_violations_behind_aliases_helpers_loops_and_branches(gate, body):
+    result = gate.check(HEAD + body)
+    assert not result.ok
+    assert all("cannot follow" not in violation for violation in result.violations)
+
+
+@pytest.mark.parametrize("body", [
+    "robots = [c9]\nrobots[0].aspirate_ml(0, 0.2)\n",
+    "import helpers\nhelpers.run(c9)\n",
+])
+def test_unresolved_robot_calls_fail_the_gate(gate, body):
+    assert not gate.check(HEAD + body).ok
+    assert SafetyChecker("loca.py").check(HEAD + body).unchecked
+
+
+def test_repeated_safe_loop_passes(gate):
+    assert gate.check(HEAD + "for i in range(3):\n    proc.new_pipette(c9)\n    proc.remove_pipette(c9)\n").ok
+
+
+def test_example_script_passes(gate):
+    with open("polybot_screenshots_run/move_vial_to_clamp.py", "r") as script_f:
+        assert gate.check(script_f.read()).ok
@@ -0,0 +1,45 @@
+"""
+Template answers must only be given for the exact task a template was learned from.
+
+From the repository root:
+    python -m pytest tests/test_templates.py
+"""
+import pytest
+
+from utils.script_validator import ScriptValidator
+from utils.templates import TemplateLibrary, rack_status_vocabulary
+
+LEARNED_FROM = "move the vial with polymer A to the clamp"
+
+
+@pytest.fixture(scope="module")
+def library(tmp_path_factory):
+    library = TemplateLibrary(str(tmp_path_factory.mktemp("templates") / "script_templates.json"),
+                              vocabulary=rack_status_vocabulary(), validator=ScriptValidator())
+    with open("polybot_screenshots_run/move_vial_to_clamp.py", "r") as script_f:
+        assert library.add(LEARNED_FROM, script_f.read()) is not None
+    return library
+
+
+@pytest.mark.parametrize("prompt", [
+    "Move the vial with polymer A to the clamp.",
+    "Write the code to move the vial with NaCl to the clamp.",
+])
+def test_same_task_is_answered(library, prompt):
+    found = library.match(prompt)
+    assert found is not None
+    assert "loca.clamp" in found.code
+
+
+@pytest.mark.parametrize("prompt", [
+    "move the vial with polymer A to the coater.",
+    "move the vial with polymer A away from the clamp.",
+    "move the vial with polymer A from the clamp to the vial rack.",
+    "return the vial with polymer A to the clamp.",
+    "move the substrate to the clamp.",
+    "don't move the vial with polymer A to the clamp, move it to the coater.",
+    "move the vial with polymer A to the clamp and uncap it.",
+    "move the vial with polymer A.",
+])
+def test_near_misses_fall_through_to_the_agents(library, prompt):
+    assert library.match(prompt) is None
@@ -0,0 +1,95 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+
+class AutoGenSystemPool:
+    def __init__(self, factory, size: int = 2):
+        """
+        Pool of pre-built AutoGenSystem instances, checked out per session.
+
+        Args:
+            factory: Callable returning a new, fully configured AutoGenSystem
+            size (int): Number of instances kept in the pool
+        """
+        self.factory = factory
+        self.size = size
+        self._idle = queue.Queue()
+        self._leases = {}  # session_id -> system, None while the checkout waits for one
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+
+    def warm(self):
+        """Build all instances up front so no request pays for agent/teachability startup."""
+        for i in range(self.size - self._idle.qsize() - len(self._leases)):
+            start = time.perf_counter()
+            self._idle.put(self.factory())
+            print(f"AutoGen system {i + 1}/{self.size} ready in {time.perf_counter() - start:.1f}s")
+
+    @property
+    def available(self) -> int:
+        return self._idle.qsize()
+
+    def checkout(self, session_id: str, timeout: float = None):
+        """
+        Lease an instance to a session. A session holds at most one instance: a second checkout
+        waits until the first lease is released. Raises queue.Empty after `timeout` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._released:
+            if not self._released.wait_for(lambda: session_id not in self._leases, timeout=timeout):
+                raise queue.Empty
+            self._leases[session_id] = None  # reserved while waiting for an idle instance
+        try:
+            system = self._idle.get(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+        except BaseException:
+            with self._released:
+                del self._leases[session_id]
+                self._released.notify_all()
+            raise
+        with self._lock:
+            self._leases[session_id] = system
+        return system
+
+    def release(self, session_id: str):
+        """
+        Reset the session's instance and return it to the pool. An instance that fails to reset
+        is dropped and replaced by a new one, so the pool keeps its size.
+        """
+        with self._lock:
+            if self._leases.get(session_id) is None:
+                return
+            system = self._leases[session_id]
+        try:
+            self.reset(system)
+        except Exception as e:
+            print(f"Could not reset the AutoGen system of session {session_id}, replacing it: {e}")
+            system = None
+        finally:
+            with self._released:
+                del self._leases[session_id]
+                self._released.notify_all()
+        if system is None:
+            try:
+                system = self.factory()
+            except Exception as e:
+                print(f"Could not build a replacement AutoGen system, the pool is one short until warm(): {e}")
+                return
+        self._idle.put(system)
+
+    @contextmanager
+    def session(self, session_id: str, timeout: float = None):
+        system = self.checkout(session_id, timeout=timeout)
+        try:
+            yield system
+        finally:
+            self.release(session_id)
+
+    @staticmethod
+    def reset(system):
+        """Clear all per-conversation state so the next session starts clean."""
+        system.groupchat.reset()
+        system.manager.reset()
+        for agent in system.groupchat.agents:
+            agent.reset()
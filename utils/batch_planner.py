@@ -0,0 +1,346 @@
+"""
+Batch planner for film campaigns: expands a parameter grid (solutions x temperatures x
+coating velocities x volumes) into one robot script.
+
+    planner = BatchPlanner(Inventory.from_rack_status(ro.runtime['rack_status']))
+    plan = planner.plan(planner.expand_grid(['RFU_40mg/ml', 'RFU_60mg/ml'], temperatures=[40, 60]))
+    print(plan.report())
+    save_code(plan.script, 'polybot_screenshots_run/campaign.py')
+
+From the repository root:
+    python -m utils.batch_planner --solutions RFU_40mg/ml RFU_60mg/ml --temperatures 40 60 --out campaign.py
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import math
+from dataclasses import dataclass, field
+from typing import List
+
+from utils.inventory import Inventory
+
+UNCAP_ARGS = "pitch=1.75, revs=3.0, vel=5000, accel=5000"
+CAP_ARGS = "pitch=1.75, revs=3.0, torque_thresh=1000, vel=5000, accel=5000"
+
+
+@dataclass
+class FilmSpec:
+    solution: str  # vial label in the vial rack
+    temperature: float  # coater temperature (C)
+    velocity: float = 1.0  # blade velocity (mm/s)
+    volume_ml: float = 0.2
+    replicate: int = 0
+
+    @property
+    def label(self) -> str:
+        """What the substrate slot holds once the film is back in the rack."""
+        return f"film:{self.solution}@{self.temperature:g}C/{self.velocity:g}mm/s#{self.replicate}"
+
+
+@dataclass
+class PlannedFilm:
+    spec: FilmSpec
+    substrate: tuple  # (row, col) in the substrate rack, the film goes back there
+    vial: tuple  # (row, col) of the solution in the vial rack
+
+
+@dataclass
+class BatchPlan:
+    films: List[PlannedFilm]
+    script: str
+    robot_s: float = 0.0  # simulated robot time
+    heating_wait_s: float = 0.0  # time coating would wait for the coater to reach its setpoint
+    violations: List[str] = field(default_factory=list)
+    error: str = None
+
+    @property
+    def total_s(self) -> float:
+        return self.robot_s + self.heating_wait_s
+
+    def report(self) -> str:
+        vials = len({film.spec.solution for film in self.films})
+        temperatures = len({film.spec.temperature for film in self.films})
+        lines = [f"{len(self.films)} films from {vials} solutions at {temperatures} temperatures: "
+                 f"~{self.total_s / 60:.1f} min ({self.robot_s:.0f}s robot, {self.heating_wait_s:.0f}s heating wait)"]
+        if self.error:
+            lines.append(f"error: {self.error}")
+        lines += [f"violation: {violation}" for violation in self.violations]
+        return "\n".join(lines)
+
+
+class BatchPlanner:
+    def __init__(self, inventory: Inventory = None, store=None, owner: str = None, channel: int = 1,
+                 blade_start: float = 45, blade_end: float = 75, ambient_c: float = 25.0,
+                 heat_rate_c_per_s: float = 0.5, cool_rate_c_per_s: float = 0.1):
+        """
+        Plans many films as one script:
+          - films are ordered by rising temperature, so the coater mostly heats (fast) rather
+            than cools (slow), and by solution within a temperature, so a vial stays in the
+            clamp for all its films;
+          - the next temperature is set as soon as the last film of the current one is coated,
+            so the coater heats while the arm returns the film and prepares the next one;
+          - one tool pick-up returns the coated film and brings the next substrate;
+          - a film is only coated once the coater can have reached its temperature, the
+            script waits for the part of the ramp the arm work does not hide.
+
+        The script takes the next unused pipette tip with proc.new_pipette(c9). With an
+        inventory the plan checks that enough are left, with a store it reserves as many
+        tips as films so concurrent plans cannot count on the same ones.
+
+        Args:
+            inventory (Inventory): Rack inventory the slots are taken from (a copy is used)
+            store (InventoryStore): Alternatively, the shared store, slots are reserved for `owner`
+                                    and recorded with record() once the script ran
+            owner (str): Reservation owner in the store
+            channel (int): Temperature controller channel of the coater
+            blade_start, blade_end (float): Coater blade travel (mm)
+            ambient_c (float): Coater temperature before the first set_temp
+            heat_rate_c_per_s, cool_rate_c_per_s (float): Coater ramp rates, for the estimate
+        """
+        if (inventory is None) == (store is None):
+            raise ValueError("Pass either an inventory or an inventory store")
+        self.inventory = inventory
+        self.store = store
+        self.owner = owner
+        self.channel = channel
+        self.blade_start = blade_start
+        self.blade_end = blade_end
+        self.ambient_c = ambient_c
+        self.heat_rate_c_per_s = heat_rate_c_per_s
+        self.cool_rate_c_per_s = cool_rate_c_per_s
+
+    @staticmethod
+    def expand_grid(solutions, temperatures, velocities=(1.0,), volumes_ml=(0.2,), replicates: int = 1) -> List[FilmSpec]:
+        return [FilmSpec(solution, temperature, velocity, volume, replicate)
+                for solution, temperature, velocity, volume, replicate
+                in itertools.product(solutions, temperatures, velocities, volumes_ml, range(replicates))]
+
+    @staticmethod
+    def order(films: List[FilmSpec]) -> List[FilmSpec]:
+        return sorted(films, key=lambda film: (film.temperature, film.solution, film.velocity, film.volume_ml,
+                                               film.replicate))
+
+    def allocate(self, films: List[FilmSpec]) -> List[PlannedFilm]:
+        """Substrates and vials for the (ordered) films. Raises ValueError when the racks run short."""
+        n = len(films)
+        solutions = list(dict.fromkeys(film.solution for film in films))
+        if self.store is not None:
+            try:
+                substrates = self.store.reserve(self.owner, 'substrate', Inventory.NEW_SUBSTRATE, n)
+                vials = {solution: self.store.reserve(self.owner, 'vial', solution, 1)[0] for solution in solutions}
+                self.store.reserve(self.owner, 'pipette', Inventory.UNUSED_PIPETTE, n)
+            except ValueError:
+                self.store.release(self.owner)  # all or nothing
+                raise
+        else:
+            tips = self.inventory['pipette'].count(Inventory.UNUSED_PIPETTE)
+            if tips < n:
+                raise ValueError(f"Only {tips} unused pipette tips left, {n} needed")
+            racks = self.inventory.to_rack_status()  # plan on a copy
+            inventory = Inventory.from_rack_status(racks)
+            substrates = inventory['substrate'].take(Inventory.NEW_SUBSTRATE, n, replacement='planned')
+            vials = {}
+            for solution in solutions:
+                slot = inventory['vial'].find(solution)
+                if slot is None:
+                    raise ValueError(f"'{solution}' is not in the vial rack")
+                vials[solution] = slot
+        return [PlannedFilm(film, tuple(int(i) for i in substrate), tuple(int(i) for i in vials[film.solution]))
+                for film, substrate in zip(films, substrates)]
+
+    def record(self, plan: 'BatchPlan', ran: bool):
+        """
+        Store mode: settle the plan's reservations once its script ran (or will not run). After a
+        run the substrate slots hold the films' labels, the reserved tips are used and the vials
+        stay in place; otherwise all is given back.
+        """
+        if self.store is None:
+            raise ValueError("Only plans made from an inventory store are recorded")
+        if not ran:
+            self.store.release(self.owner)
+            return
+        for film in plan.films:
+            self.store.consume(self.owner, 'substrate', [film.substrate], film.spec.label)
+        self.store.settle(self.owner, used=True)
+
+    def _ramp_s(self, start_c: float, end_c: float) -> float:
+        rate = self.heat_rate_c_per_s if end_c > start_c else self.cool_rate_c_per_s
+        return abs(end_c - start_c) / rate
+
+    def _full_ramps(self, planned: List[PlannedFilm]) -> List[float]:
+        """Waits before each film when no arm work hides the ramp, as if coating started right after set_temp."""
+        waits, current = [], self.ambient_c
+        for film in planned:
+            waits.append(self._ramp_s(current, film.spec.temperature))
+            current = film.spec.temperature
+        return waits
+
+    def generate(self, planned: List[PlannedFilm], waits: List[float] = None) -> str:
+        """
+        Args:
+            planned (List[PlannedFilm]): Allocated films, in order
+            waits (List[float]): Seconds to wait before coating each film, for the coater to reach its
+                                 temperature; by default the whole ramp, estimate() shortens them to
+                                 what the arm work does not hide
+        """
+        waits = self._full_ramps(planned) if waits is None else waits
+        lines = ["import time"] if any(wait > 0 for wait in waits) else []
+        lines += [
+            "import loca",
+            "import robotics as ro",
+            "from robotics import procedure as proc",
+            "import rack_status",
+            "",
+            "c9 = ro.system.init('controller')",
+            "t8 = ro.system.init('temperature')",
+            "coater = ro.system.init('coater')",
+            "",
+        ]
+        if planned:
+            lines.append(f"t8.set_temp({self.channel}, {planned[0].spec.temperature:g})")
+        clamped = None  # solution whose vial is in the clamp
+        on_stage = None  # film on the coater stage
+        for i, film in enumerate(planned):
+            spec = film.spec
+            lines += ["", f"# film {i + 1}/{len(planned)}: {spec.solution}, {spec.temperature:g} C, "
+                          f"{spec.velocity:g} mm/s, {spec.volume_ml:g} mL"]
+            # one tool session: coated film back to the rack, next substrate onto the stage
+            lines.append("c9.tool = 'substrate_tool'")
+            if on_stage is not None:
+                lines += self._film_to_rack(on_stage)
+            lines += [
+                f"c9.position = loca.substrate_rack_seq[{film.substrate[0]}, {film.substrate[1]}]",
+                "c9.set_output('substrate_tool', True)",
+                "c9.position = loca.s_coater",
+                "c9.set_output('substrate_tool', False)",
+                "c9.set_output('coater_stage_vacuum', True)",
+                "c9.tool = None",
+            ]
+            on_stage = film
+
+            if clamped is not None and clamped.spec.solution != spec.solution:
+                lines += self._vial_to_rack(clamped)
+                clamped = None
+            if clamped is None:
+                lines += [
+                    f"c9.position = loca.vial_rack[{film.vial[0]}, {film.vial[1]}]",
+                    "c9.set_output('gripper', True)",
+                    "c9.move_axis('z', 0)",
+                    "c9.set_output('clamp', False)",
+                    "c9.position = loca.clamp",
+                    "c9.set_output('clamp', True)",
+                ]
+                clamped = film
+            else:
+                lines += ["c9.position = loca.clamp", "c9.set_output('gripper', True)"]
+            lines += [
+                f"uncap_position = c9.uncap({UNCAP_ARGS})",
+                "c9.move_axis('z', 0)",
+                "proc.new_pipette(c9)",
+                "c9.position = loca.p_clamp",
+                f"c9.aspirate_ml(0, {spec.volume_ml:g})",
+                "c9.position = loca.pipette_coater_one",
+                f"c9.dispense_ml(0, {spec.volume_ml:g})",
+                f"coater.position = {self.blade_start:g}",
+                f"coater.velocity = {spec.velocity:g}",
+            ]
+            if waits[i] > 0:
+                lines.append(f"time.sleep({math.ceil(waits[i])})  # the coater reaches {spec.temperature:g} C")
+            lines.append(f"coater.position = {self.blade_end:g}")
+            following = planned[i + 1] if i + 1 < len(planned) else None
+            if following is not None and following.spec.temperature != spec.temperature:
+                # heat for the next group while the arm finishes this film and prepares the next
+                lines.append(f"t8.set_temp({self.channel}, {following.spec.temperature:g})")
+            lines += [
+                "proc.remove_pipette(c9)",
+                "c9.position = uncap_position",
+                f"c9.cap({CAP_ARGS})",
+                "c9.set_output('gripper', False)",
+            ]
+
+        if on_stage is not None:
+            lines += ["", "# last film back to the rack, vial back to its slot",
+                      "c9.tool = 'substrate_tool'"] + self._film_to_rack(on_stage) + ["c9.tool = None"]
+        if clamped is not None:
+            lines += self._vial_to_rack(clamped)
+        lines.append("c9.position = [0, 0, 0, 0]")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _film_to_rack(film: PlannedFilm) -> list:
+        return [
+            "c9.set_output('coater_stage_vacuum', False)",
+            "c9.position = loca.s_coater",
+            "c9.set_output('substrate_tool', True)",
+            f"c9.position = loca.substrate_rack_seq[{film.substrate[0]}, {film.substrate[1]}]",
+            "c9.set_output('substrate_tool', False)",
+        ]
+
+    @staticmethod
+    def _vial_to_rack(film: PlannedFilm) -> list:
+        return [
+            "c9.position = loca.clamp",
+            "c9.set_output('gripper', True)",
+            "c9.set_output('clamp', False)",
+            "c9.move_axis('z', 0)",
+            f"c9.position = loca.vial_rack[{film.vial[0]}, {film.vial[1]}]",
+            "c9.set_output('gripper', False)",
+        ]
+
+    def estimate(self, plan: BatchPlan) -> BatchPlan:
+        """
+        Run the plan without waits on the offline simulator, then regenerate its script with
+        only the heating waits the arm work does not hide.
+        """
+        from n9_sim import run_script
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = run_script(self.generate(plan.films, waits=[0.0] * len(plan.films)), filename='<batch plan>')
+        plan.robot_s, plan.violations, plan.error = result.elapsed_s, result.violations, result.error
+
+        current, target, set_at, previous_at = self.ambient_c, None, 0.0, 0.0
+        waits = []
+        for at, event in result.events:
+            if event.startswith(f"temperature channel {self.channel} -> "):
+                target, set_at = float(event.rsplit(' ', 1)[1]), at
+            elif event == f"coater blade -> {self.blade_end:g} mm":
+                wait = 0.0
+                if target is not None:
+                    wait = max(0.0, self._ramp_s(current, target) - (previous_at - set_at))
+                    current, target = target, None
+                waits.append(wait)
+            previous_at = at
+        if len(waits) == len(plan.films):  # else the run failed part way, keep the full ramps
+            plan.script = self.generate(plan.films, waits)
+            plan.heating_wait_s = sum(math.ceil(wait) for wait in waits if wait > 0)
+        else:
+            plan.heating_wait_s = sum(math.ceil(wait) for wait in self._full_ramps(plan.films) if wait > 0)
+        return plan
+
+    def plan(self, films: List[FilmSpec], estimate: bool = True) -> BatchPlan:
+        planned = self.allocate(self.order(films))
+        plan = BatchPlan(planned, self.generate(planned))
+        return self.estimate(plan) if estimate else plan
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--solutions", nargs="+", required=True, help="Vial labels in rack_status")
+    parser.add_argument("--temperatures", nargs="+", type=float, required=True)
+    parser.add_argument("--velocities", nargs="+", type=float, default=[1.0])
+    parser.add_argument("--volumes", nargs="+", type=float, default=[0.2])
+    parser.add_argument("--replicates", type=int, default=1)
+    parser.add_argument("--out", help="Write the script to this file")
+    args = parser.parse_args()
+
+    from n9_sim import activate
+    ro = activate()  # rack_status.py imports robotics
+    import rack_status  # noqa: F401
+
+    planner = BatchPlanner(Inventory.from_rack_status(ro.runtime['rack_status']))
+    plan = planner.plan(planner.expand_grid(args.solutions, args.temperatures, args.velocities, args.volumes,
+                                            args.replicates))
+    if args.out:
+        with open(args.out, 'w') as out_f:
+            out_f.write(plan.script)
+    print(plan.report())
@@ -0,0 +1,52 @@
+import autogen
+
+from utils.history import BoundedHistory
+
+
+class CaptureGroupChatManager(autogen.GroupChatManager):
+    def __init__(self, *args, max_captured: int = 200, max_captured_chars: int = 500000, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Only the newest messages are kept, listeners still see every message as it arrives
+        self.captured_messages = BoundedHistory(max_items=max_captured, max_chars=max_captured_chars)
+        self._listeners = []
+
+    def reset(self):
+        super().reset()
+        self.captured_messages.clear()
+
+    def subscribe(self, callback):
+        """
+        Call `callback(agent_name, content)` for every message as soon as it is received.
+
+        Returns:
+            Callable: removes the callback again
+        """
+        self._listeners.append(callback)
+        return lambda: self._listeners.remove(callback)
+        
+    def capture(self, message, sender):
+        """Record a message that did not go through the group chat, e.g. an answer from a script template."""
+        self._capture(message, sender, silent=False)
+
+    def _capture(self, message, sender, silent):
+        # Capture the message
+        if not silent:
+            agent_name = getattr(sender, "name", "Unknown")
+            if isinstance(message, dict) and "content" in message:
+                content = message["content"]
+            else:
+                content = str(message)
+                
+            if content:  
+                self.captured_messages.append(f"{agent_name}: {content}")
+                for callback in list(self._listeners):
+                    callback(agent_name, content)
+
+    def receive(self, message, sender, request_reply=None, silent=False):
+        self._capture(message, sender, silent)
+        return super().receive(message, sender, request_reply, silent)
+
+    async def a_receive(self, message, sender, request_reply=None, silent=False):
+        # Group chats started with a_initiate_chat deliver messages here instead of receive
+        self._capture(message, sender, silent)
+        return await super().a_receive(message, sender, request_reply, silent)
@@ -0,0 +1,53 @@
+"""
+Load test for the app's chat worker pool using the mock LLM (no API keys needed).
+
+Run from the repository root:
+    python -m utils.chat_load_test --chats 32 --latency 0.2
+"""
+import argparse
+import os
+import time
+from concurrent.futures import wait
+from contextlib import redirect_stdout
+
+from utils.agent_pool import AutoGenSystemPool
+from utils.chat_workers import ChatWorkerPool
+from utils.mock_llm import MockAutoGenSystem
+
+
+def run_load(n_workers: int, n_chats: int, latency: float) -> float:
+    """Submit `n_chats` concurrent chats and return the throughput in chats/s."""
+    system_pool = AutoGenSystemPool(lambda: MockAutoGenSystem(latency=latency), size=n_workers)
+    system_pool.warm()
+    workers = ChatWorkerPool(system_pool, max_queue=n_chats)
+
+    start = time.perf_counter()
+    futures = [workers.submit(f"session-{i}", f"Move the vial with polymer A to the clamp ({i})")
+               for i in range(n_chats)]
+    status = workers.status()
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):  # silence the agents' console output
+        wait(futures)
+    elapsed = time.perf_counter() - start
+    print(f"  after submit: {status}")
+
+    failed = [f for f in futures if f.exception() is not None]
+    if failed:
+        print(f"  {len(failed)} chats failed, first error: {failed[0].exception()}")
+    return n_chats / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock LLM latency per call (s)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    results = {}
+    for n_workers in args.workers:
+        print(f"workers={n_workers}")
+        results[n_workers] = run_load(n_workers, args.chats, args.latency)
+
+    print("\nworkers  chats/s  speedup")
+    for n_workers, throughput in results.items():
+        print(f"{n_workers:>7}  {throughput:7.2f}  {throughput / results[args.workers[0]]:6.2f}x")
@@ -0,0 +1,91 @@
+import queue
+import threading
+from concurrent.futures import Future
+
+from utils.agent_pool import AutoGenSystemPool
+
+
+class QueueFullError(Exception):
+    """Raised when a chat is submitted while the queue is at capacity."""
+
+
+class ChatWorkerPool:
+    def __init__(self, system_pool: AutoGenSystemPool, max_queue: int = 16):
+        """
+        Runs group chats on worker threads, one worker per pooled AutoGen system.
+
+        Args:
+            system_pool (AutoGenSystemPool): Pool the workers check systems out of
+            max_queue (int): Chats allowed to wait for a worker before new ones are refused
+        """
+        self.system_pool = system_pool
+        self.max_queue = max_queue
+        self._jobs = queue.Queue()
+        self._lock = threading.Lock()
+        self.active = 0
+
+        self._workers = [threading.Thread(target=self._work, name=f"chat-worker-{i}", daemon=True)
+                         for i in range(system_pool.size)]
+        for worker in self._workers:
+            worker.start()
+
+    @property
+    def queue_depth(self) -> int:
+        """Chats waiting for a free worker."""
+        return self._jobs.qsize()
+
+    def status(self) -> str:
+        return f"{self.active}/{len(self._workers)} workers busy, {self.queue_depth} queued"
+
+    def submit(self, session_id: str, message: str, on_message=None, human_input=None) -> Future:
+        """
+        Queue a chat for a session.
+
+        Args:
+            session_id (str): Session the chat belongs to
+            message (str): The user prompt
+            on_message: Optional `callback(agent_name, content)` called from the worker
+                        thread for every agent message as it is produced
+            human_input (HumanInputBridge): Optional bridge answering the agents' human input
+                        requests from the UI instead of the server console
+
+        Returns:
+            Future: resolves to the list of captured agent messages
+
+        Raises:
+            QueueFullError: when `max_queue` chats are already waiting
+        """
+        with self._lock:  # admission control
+            if self._jobs.qsize() >= self.max_queue:
+                raise QueueFullError(f"Server busy: {self.status()}. Please retry shortly.")
+            future = Future()
+            self._jobs.put((session_id, message, on_message, human_input, future))
+        return future
+
+    def _work(self):
+        while True:
+            session_id, message, on_message, human_input, future = self._jobs.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            with self._lock:
+                self.active += 1
+            try:
+                with self.system_pool.session(session_id) as system:
+                    unsubscribe = detach_human_input = None
+                    if on_message is not None and hasattr(system.manager, 'subscribe'):
+                        unsubscribe = system.manager.subscribe(on_message)
+                    if human_input is not None:
+                        detach_human_input = human_input.attach([system.polybot_admin, system.code_writer_agent])
+                    try:
+                        system.initiate_chat(message)
+                    finally:
+                        if unsubscribe is not None:
+                            unsubscribe()
+                        if detach_human_input is not None:
+                            detach_human_input()
+                    future.set_result(list(system.manager.captured_messages))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self.active -= 1
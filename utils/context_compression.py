@@ -0,0 +1,167 @@
+import re
+
+from autogen.agentchat.contrib.capabilities.transform_messages import TransformMessages
+from autogen.token_count_utils import count_token
+
+CODE_BLOCK = re.compile(r"```(\w*)\n(.*?)```", re.DOTALL)
+FILENAME = re.compile(r"^\s*#\s*filename:\s*(\S+)", re.MULTILINE)
+
+_tokenizer_available = True
+
+
+def message_tokens(messages, model: str = "gpt-4o") -> int:
+    """Token count of `messages`, approximated as 4 characters per token when tiktoken can not be loaded."""
+    global _tokenizer_available
+    if _tokenizer_available:
+        try:
+            return count_token(messages, model)
+        except Exception:
+            _tokenizer_available = False  # encodings are downloaded on first use, offline hosts fall back
+    return sum(len(str(message.get("content") or "")) + len(str(message.get("tool_calls") or "")) for message in messages) // 4
+
+
+def _shorten(text: str, max_chars: int, note: str) -> str:
+    if len(text) <= max_chars:
+        return text
+    head = max_chars * 3 // 4
+    tail = max_chars - head
+    return f"{text[:head]}\n[... {note}: {len(text) - max_chars} characters omitted ...]\n{text[-tail:]}"
+
+
+class SupersededCodeRemover:
+    """
+    Replaces code blocks that a later message rewrote (same `# filename:`, or for unnamed
+    blocks a later block from the same agent) with a one line placeholder. The writer
+    always resends the full script, so only the newest version matters.
+    """
+    def apply_transform(self, messages: list[dict]) -> list[dict]:
+        latest = {}  # block key -> index of the newest message containing it
+        for i, message in enumerate(messages):
+            for key in self._block_keys(message):
+                latest[key] = i
+
+        for i, message in enumerate(messages):
+            content = message.get("content")
+            if not isinstance(content, str) or "```" not in content:
+                continue
+
+            def replace(match, i=i, message=message):
+                key = self._key(match, message)
+                if latest.get(key, i) > i:
+                    return f"```{match.group(1)}\n# [superseded by a later version of {key[1]}]\n```"
+                return match.group(0)
+
+            message["content"] = CODE_BLOCK.sub(replace, content)
+        return messages
+
+    def _block_keys(self, message):
+        content = message.get("content")
+        if not isinstance(content, str):
+            return []
+        return [self._key(match, message) for match in CODE_BLOCK.finditer(content)]
+
+    @staticmethod
+    def _key(match, message):
+        filename = FILENAME.search(match.group(2))
+        if filename:
+            return ("file", filename.group(1))
+        return ("agent", f"{message.get('name', 'unnamed')} code")
+
+    def get_logs(self, pre_transform_messages: list[dict], post_transform_messages: list[dict]) -> tuple[str, bool]:
+        removed = sum(pre.get("content") != post.get("content")
+                      for pre, post in zip(pre_transform_messages, post_transform_messages))
+        return f"Removed superseded code from {removed} messages.", removed > 0
+
+
+class ToolOutputTruncator:
+    """
+    Shortens tool results (e.g. the full text returned by scrape_pdf) once they are no
+    longer among the last `keep_recent` messages. The agent that asked for the tool has
+    already used the result by then.
+    """
+    def __init__(self, max_chars: int = 2000, keep_recent: int = 2):
+        self.max_chars = max_chars
+        self.keep_recent = keep_recent
+
+    def apply_transform(self, messages: list[dict]) -> list[dict]:
+        for message in messages[:max(len(messages) - self.keep_recent, 0)]:
+            if not (message.get("tool_responses") or message.get("role") in ("tool", "function")):
+                continue
+            for response in message.get("tool_responses") or []:
+                if isinstance(response.get("content"), str):
+                    response["content"] = _shorten(response["content"], self.max_chars, "tool output truncated")
+            if isinstance(message.get("content"), str):
+                message["content"] = _shorten(message["content"], self.max_chars, "tool output truncated")
+        return messages
+
+    def get_logs(self, pre_transform_messages: list[dict], post_transform_messages: list[dict]) -> tuple[str, bool]:
+        truncated = sum(pre.get("content") != post.get("content")
+                        for pre, post in zip(pre_transform_messages, post_transform_messages))
+        return f"Truncated {truncated} tool outputs.", truncated > 0
+
+
+class OldTurnSummarizer:
+    """
+    Keeps the task (first message) and the last `keep_recent` messages verbatim and cuts
+    older turns down to their beginning and end, which is where the agents state their
+    plan and conclusion. Messages carrying tool calls are left alone so calls and results stay paired.
+    """
+    def __init__(self, keep_recent: int = 6, max_chars: int = 600):
+        self.keep_recent = keep_recent
+        self.max_chars = max_chars
+
+    def apply_transform(self, messages: list[dict]) -> list[dict]:
+        for message in messages[1:max(len(messages) - self.keep_recent, 1)]:
+            if message.get("tool_calls") or message.get("function_call"):
+                continue
+            if isinstance(message.get("content"), str):
+                message["content"] = _shorten(message["content"], self.max_chars, "older turn shortened")
+        return messages
+
+    def get_logs(self, pre_transform_messages: list[dict], post_transform_messages: list[dict]) -> tuple[str, bool]:
+        shortened = sum(pre.get("content") != post.get("content")
+                        for pre, post in zip(pre_transform_messages, post_transform_messages))
+        return f"Shortened {shortened} older turns.", shortened > 0
+
+
+class ContextCompression(TransformMessages):
+    def __init__(self, transforms=None, model: str = "gpt-4o", verbose: bool = False):
+        """
+        TransformMessages capability that compresses an agent's chat history before each
+        LLM call and keeps a per-call record of the token savings.
+
+        Args:
+            transforms: Message transforms to apply, defaults to removing superseded code,
+                        truncating old tool outputs and shortening old turns (in that order)
+            model (str): Model name used for token counting
+            verbose (bool): Print the log of every transform
+        """
+        if transforms is None:
+            transforms = [SupersededCodeRemover(), ToolOutputTruncator(), OldTurnSummarizer()]
+        super().__init__(transforms=transforms, verbose=verbose)
+        self.model = model
+        self.rounds = []  # (agent name, tokens before, tokens after)
+
+    def add_to_agent(self, agent):
+        agent.register_hook(hookable_method="process_all_messages_before_reply",
+                            hook=lambda messages: self._compress(agent.name, messages))
+
+    def _compress(self, agent_name: str, messages: list[dict]) -> list[dict]:
+        if not messages:
+            return messages
+        compressed = self._transform_messages(messages)  # works on a deep copy, the stored history is untouched
+        before, after = message_tokens(messages, self.model), message_tokens(compressed, self.model)
+        self.rounds.append((agent_name, before, after))
+        if before > after:
+            print(f"Context compression for {agent_name}: {before} -> {after} tokens ({100 * (before - after) / before:.0f}% saved)")
+        return compressed
+
+    def reset_stats(self):
+        self.rounds = []
+
+    def report(self) -> str:
+        before = sum(round_[1] for round_ in self.rounds)
+        after = sum(round_[2] for round_ in self.rounds)
+        saved = 100 * (before - after) / before if before else 0
+        return (f"Context compression: {len(self.rounds)} LLM calls, {before} -> {after} history tokens "
+                f"({before - after} saved, {saved:.0f}%)")
@@ -0,0 +1,107 @@
+"""JSONL trace of LLM calls, written by a background thread with size-based rotation and sampling."""
+import atexit
+import datetime
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """Queue the raw record; formatting and JSON encoding happen on the listener thread."""
+
+    dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:  # never block the caller on a slow disk
+            self.dropped += 1
+
+
+class _JsonlFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(record.msg, ensure_ascii=False, default=str)
+
+
+class TraceLogger:
+    def __init__(self, fp: str, max_bytes: int = 50 * 1024 * 1024, backup_count: int = 5,
+                 sample_rate: float = 1.0, log_text: bool = False, max_queue: int = 10000):
+        """
+        Buffered JSONL trace writer. Records are queued by the caller and written,
+        rotated and flushed by a background thread.
+
+        Args:
+            fp (str): Path of the JSONL file
+            max_bytes (int): Rotate the file once it grows past this size
+            backup_count (int): Number of rotated files to keep (fp.1, fp.2, ...)
+            sample_rate (float): Fraction of records to keep, between 0 and 1
+            log_text (bool): Also store the full prompt and response text
+            max_queue (int): Records buffered before new ones are dropped
+        """
+        self.sample_rate = sample_rate
+        self.log_text = log_text
+
+        file_handler = RotatingFileHandler(fp, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        file_handler.setFormatter(_JsonlFormatter())
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._logger = logging.getLogger(f"trace.{fp}")
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        self._handler = _DeferredQueueHandler(self._queue)
+        self._logger.handlers = [self._handler]
+
+        self._listener = QueueListener(self._queue, file_handler)
+        self._listener.start()
+        atexit.register(self.close)
+
+    def log_call(self, model: str, prompt: str, response, latency_s: float, **fields):
+        """Record one LLM call. Cheap enough to call on every request."""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+
+        record = {
+            'timestamp': datetime.datetime.now().isoformat(),
+            'model': model,
+            'prompt_sha1': hashlib.sha1(prompt.encode('utf-8')).hexdigest(),
+            'prompt_chars': len(prompt),
+            'response_chars': len(response) if response is not None else None,
+            'latency_s': round(latency_s, 4),
+            **fields,
+        }
+        if self.log_text:
+            record['prompt'] = prompt
+            record['response'] = response
+        self._logger.info(record)
+
+    @property
+    def dropped(self) -> int:
+        return self._handler.dropped
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.stop()  # drains the queue before returning
+            self._listener = None
+
+
+# One TraceLogger per file: every writer of a file shares its queue, thread and rotating handler
+_loggers = {}
+_loggers_lock = threading.Lock()
+
+
+def get_trace_logger(fp: str, **kwargs) -> TraceLogger:
+    """The TraceLogger of `fp`, created with `kwargs` on first use (see TraceLogger)."""
+    key = os.path.abspath(fp)
+    with _loggers_lock:
+        trace = _loggers.get(key)
+        if trace is None or trace._listener is None:
+            trace = _loggers[key] = TraceLogger(fp, **kwargs)
+        return trace
@@ -0,0 +1,153 @@
+"""
+Dry-run execution of the agents' code blocks on the offline simulator (n9_sim). The
+executor answers with a structured trace of what the robot would do (moves, outputs,
+volumes, films, final state and rule violations) instead of driving the hardware, so the
+writer and reviewer can iterate in seconds. With a real executor it becomes a gate: code
+only reaches the robot after its dry run passed.
+
+    executor = DryRunCodeExecutor(work_dir='coding_scripts', real_executor=WarmPoolCodeExecutor(...))
+    UserProxyAgent(..., code_execution_config={"executor": executor})
+"""
+import re
+from typing import List
+
+from autogen.code_utils import PYTHON_VARIANTS
+from autogen.coding import CodeBlock
+from autogen.coding.base import CommandLineCodeResult
+
+from utils.warm_executor import WarmPoolCodeExecutor
+
+DRY_RUN_PRELOAD = ('numpy', 'pandas', 'n9_sim', 'n9_sim.motion', 'robotics', 'robotics.procedure', 'loca', 'rack_status')
+OUTPUT = re.compile(r"set_output\('(\w+)', (True|False)\)")
+PUMP = re.compile(r"(aspirate|dispense)_ml\(.*, ([-+\d.eE]+)\)")
+
+
+def _location(location, position) -> str:
+    if location is None:
+        return str([int(round(v)) for v in position])
+    name, index = location
+    return f"{name}{list(index) if index else ''}"
+
+
+def summarize(result) -> dict:
+    """Structured trace of a n9_sim.SimResult."""
+    moves, outputs, tools = [], [], []
+    volumes = {'aspirated_ml': 0.0, 'dispensed_ml': 0.0}
+    steps = result.steps
+    for i, step in enumerate(steps):
+        if step['kind'] == 'move':
+            group = step['group']
+            if group is not None and i + 1 < len(steps) and steps[i + 1].get('group') == group:
+                continue  # only the end point of a SequenceArray approach
+            moves.append(_location(step['location'], step['position']))
+            continue
+        name = step['name']
+        where = _location(step['location'], step['position']) if step['position'] is not None else None
+        output = OUTPUT.fullmatch(name)
+        pump = PUMP.fullmatch(name)
+        if output:
+            outputs.append({'output': output.group(1), 'on': output.group(2) == 'True', 'at': where})
+        elif pump:
+            volumes[f"{pump.group(1)}d_ml"] += float(pump.group(2))
+        elif name.startswith('tool = '):
+            tools.append({'tool': name[len('tool = '):].strip("'"), 'at': where})
+    return {
+        'ok': result.ok,
+        'error': result.error,
+        'violations': list(result.violations),
+        'elapsed_s': round(result.elapsed_s, 1),
+        'travel_s': round(result.travel_s, 1),
+        'moves': moves,
+        'outputs': outputs,
+        'tools': tools,
+        'volumes': {name: round(ml, 4) for name, ml in volumes.items()},
+        'films': [{'substrate': substrate, 'solution': solution, 'ml': ml}
+                  for substrate, solution, ml in result.state.get('films', [])],
+        'state': result.state,
+    }
+
+
+def format_trace(result, max_events: int = 60) -> str:
+    """What the agents see: verdict, problems first, then what the robot would have done."""
+    trace = summarize(result)
+    state = trace['state']
+    lines = [f"DRY RUN {'PASSED' if trace['ok'] else 'FAILED'} on the simulator, no hardware was moved: "
+             f"{len(result.events)} steps, ~{trace['elapsed_s']}s on the robot ({trace['travel_s']}s arm travel)"]
+    if trace['error']:
+        lines.append(f"error: {trace['error']}")
+    lines += [f"violation: {violation}" for violation in trace['violations']]
+    lines.append(f"moves ({len(trace['moves'])}): {' -> '.join(trace['moves']) or 'none'}")
+    toggled = [f"{item['output']} {'on' if item['on'] else 'off'}" + (f" at {item['at']}" if item['at'] else "")
+               for item in trace['outputs']]
+    lines.append(f"outputs: {', '.join(toggled) or 'none'}")
+    lines.append(f"volumes: aspirated {trace['volumes']['aspirated_ml']} mL, dispensed {trace['volumes']['dispensed_ml']} mL")
+    if trace['films']:
+        lines.append("films: " + ", ".join(f"{film['solution']} {film['ml']} mL on substrate '{film['substrate']}'"
+                                           for film in trace['films']))
+    lines.append(f"final state: clamp holds {state.get('clamp_vial')!r}, coater stage holds {state.get('coater_substrate')!r}, "
+                 f"gripper holds {state.get('gripper')!r}, tool {state.get('tool')!r}, pipette {'on' if state.get('pipette') else 'off'}")
+    events = result.events if len(result.events) <= max_events else result.events[-max_events:]
+    if events:
+        lines.append("trace:" if events is result.events else f"trace (last {max_events} steps):")
+        lines += [f"  {at:8.2f}s  {event}" for at, event in events]
+    return "\n".join(lines)
+
+
+def _activate_simulator():
+    """Worker initializer: `import robotics` resolves to the simulator, never the hardware package."""
+    from n9_sim import activate
+    activate()
+
+
+def simulate(script_fp: str) -> int:
+    """Worker runner: the script on the simulator, its own output followed by the trace."""
+    from n9_sim import run_script
+    result = run_script(script_fp)
+    print(format_trace(result))
+    return 0 if result.ok else 1
+
+
+class DryRunCodeExecutor(WarmPoolCodeExecutor):
+    def __init__(self, timeout: int = 60, work_dir='.', pool_size: int = 1, real_executor=None, **kwargs):
+        """
+        Code executor that runs Python code blocks on the simulator, in warm workers (see
+        WarmPoolCodeExecutor). Other languages are refused, they cannot be dry-run.
+
+        Args:
+            timeout (int): Seconds a dry run may take
+            work_dir: Where the code blocks are written, with the loca.py and rack_status.py they import
+            pool_size (int): Dry runs that can run at the same time
+            real_executor: Executor for the robot, code reaches it only after its dry run passed;
+                           None to only dry-run
+        """
+        kwargs.setdefault('preload', DRY_RUN_PRELOAD)
+        super().__init__(timeout=timeout, work_dir=work_dir, pool_size=pool_size,
+                         initializer=_activate_simulator, runner=simulate, **kwargs)
+        self.real_executor = real_executor
+
+    def execute_code_blocks(self, code_blocks: List[CodeBlock]) -> CommandLineCodeResult:
+        other = sorted({block.language for block in code_blocks if block.language.lower() not in PYTHON_VARIANTS})
+        if other:
+            return CommandLineCodeResult(exit_code=1, output=f"Not run: {', '.join(other)} code cannot be dry-run, "
+                                                             "write the whole task as one Python script")
+        dry_run = super().execute_code_blocks(code_blocks)
+        if dry_run.exit_code != 0 or self.real_executor is None:
+            return dry_run
+        real = self.real_executor.execute_code_blocks(code_blocks)
+        return CommandLineCodeResult(exit_code=real.exit_code, output=f"{dry_run.output}\nReal run:\n{real.output}",
+                                     code_file=real.code_file)
+
+    def start(self):
+        super().start()
+        if self.real_executor is not None:
+            self.real_executor.start()
+
+    def restart(self):
+        super().restart()
+        if self.real_executor is not None:
+            self.real_executor.restart()
+
+    def close(self):
+        super().close()
+        if self.real_executor is not None:
+            self.real_executor.close()
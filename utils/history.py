@@ -0,0 +1,221 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+def _size(item) -> int:
+    """Approximate in-memory size of a history item, in characters."""
+    if item is None:
+        return 0
+    if isinstance(item, str):
+        return len(item)
+    if isinstance(item, (list, tuple)):
+        return sum(_size(part) for part in item)
+    return len(str(item))
+
+
+class TranscriptStore:
+    def __init__(self, db_path: str):
+        """
+        Append-only SQLite transcript of history items spilled out of memory, with the
+        offset each cleared session's history starts at.
+
+        Args:
+            db_path (str): SQLite file, created if missing
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS transcript ("
+                               "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                               "session TEXT NOT NULL, item TEXT NOT NULL, created REAL NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS transcript_session ON transcript (session, id)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS cleared (session TEXT PRIMARY KEY, start INTEGER NOT NULL)")
+
+    def append(self, session: str, items):
+        now = time.time()
+        rows = [(session, json.dumps(item), now) for item in items]
+        if rows:
+            with self._lock, self._conn:
+                self._conn.executemany("INSERT INTO transcript (session, item, created) VALUES (?, ?, ?)", rows)
+
+    def count(self, session: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM transcript WHERE session = ?", (session,)).fetchone()[0]
+
+    def read(self, session: str, offset: int, limit: int) -> list:
+        """Items `offset` to `offset + limit` of the session, oldest first."""
+        if limit <= 0:
+            return []
+        with self._lock:
+            rows = self._conn.execute("SELECT item FROM transcript WHERE session = ? ORDER BY id LIMIT ? OFFSET ?",
+                                      (session, limit, offset)).fetchall()
+        return [json.loads(item) for item, in rows]
+
+    def start(self, session: str) -> int:
+        """Stored items of the session before this index were cleared."""
+        with self._lock:
+            row = self._conn.execute("SELECT start FROM cleared WHERE session = ?", (session,)).fetchone()
+        return row[0] if row else 0
+
+    def set_start(self, session: str, start: int):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO cleared (session, start) VALUES (?, ?)", (session, start))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class BoundedHistory:
+    def __init__(self, max_items: int = 200, max_chars: int = 200000, store: TranscriptStore = None, key: str = None,
+                 start: int = None):
+        """
+        Ring buffer of history items capped by count and total size. Items pushed out
+        of memory are spilled to `store` under `key`, or dropped when there is no store.
+
+        Args:
+            max_items (int): Items kept in memory
+            max_chars (int): Total characters kept in memory, the newest item is always kept
+            store (TranscriptStore): Optional transcript the oldest items are spilled to
+            key (str): Session key in the store
+            start (int): Stored items before this index were cleared and are not paged, by default
+                         where the store says the session was last cleared
+        """
+        self.max_items = max_items
+        self.max_chars = max_chars
+        self.store = store
+        self.key = key
+        self._items = deque()
+        self._chars = 0
+        self._lock = threading.RLock()
+        self._spilled = store.count(key) if store is not None else 0
+        self._start = start if start is not None else store.start(key) if store is not None else 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._items))
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    @property
+    def total(self) -> int:
+        """Items in the history, in memory and spilled."""
+        return self._spilled - self._start + len(self._items)
+
+    def append(self, item):
+        with self._lock:
+            self._items.append(item)
+            self._chars += _size(item)
+            self._trim()
+
+    def extend(self, items):
+        with self._lock:
+            for item in items:
+                self._items.append(item)
+                self._chars += _size(item)
+            self._trim()
+
+    def replace_last(self, item):
+        """Swap the newest item, e.g. a chat row that keeps growing while the agents talk."""
+        with self._lock:
+            self._chars += _size(item) - _size(self._items[-1])
+            self._items[-1] = item
+            self._trim()
+
+    def _trim(self):
+        evicted = []
+        while len(self._items) > 1 and (len(self._items) > self.max_items or self._chars > self.max_chars):
+            item = self._items.popleft()
+            self._chars -= _size(item)
+            evicted.append(item)
+        self._spill(evicted)
+
+    def _spill(self, items):
+        if items and self.store is not None:
+            self.store.append(self.key, items)
+            self._spilled += len(items)
+
+    def spill_all(self):
+        """Move everything to the store, e.g. when the session goes idle."""
+        with self._lock:
+            items = list(self._items)
+            self._items.clear()
+            self._chars = 0
+            self._spill(items)
+
+    def clear(self) -> int:
+        """
+        Empty the history. Spilled items stay in the append-only store but are no longer paged,
+        the store keeps where the history now starts.
+
+        Returns:
+            int: the new `start`
+        """
+        with self._lock:
+            self.spill_all()
+            self._start = self._spilled
+            if self.store is not None:
+                self.store.set_start(self.key, self._start)
+            return self._start
+
+    def page(self, page: int = 1, page_size: int = 20) -> list:
+        """
+        Items of one page, oldest first. Page 1 holds the newest `page_size` items.
+        """
+        with self._lock:
+            total = self.total
+            end = max(total - (page - 1) * page_size, 0)
+            start = max(end - page_size, 0)
+            n_spilled = self._spilled - self._start
+            items = []
+            if start < n_spilled and self.store is not None:
+                items = self.store.read(self.key, self._start + start, min(end, n_spilled) - start)
+            items += list(self._items)[max(start - n_spilled, 0):max(end - n_spilled, 0)]
+        return items
+
+    def pages(self, page_size: int = 20) -> int:
+        return max((self.total + page_size - 1) // page_size, 1)
+
+
+class SessionHistories:
+    def __init__(self, max_sessions: int = 64, store: TranscriptStore = None, **history_kwargs):
+        """
+        Per-session BoundedHistory objects. Only the `max_sessions` most recently used
+        sessions stay in memory, the others are spilled to `store` and reloaded lazily.
+
+        Args:
+            max_sessions (int): Sessions kept in memory
+            store (TranscriptStore): Transcript shared by all sessions
+            history_kwargs: max_items/max_chars for each session's BoundedHistory
+        """
+        self.max_sessions = max_sessions
+        self.store = store
+        self.history_kwargs = history_kwargs
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session: str) -> BoundedHistory:
+        with self._lock:
+            history = self._sessions.get(session)
+            if history is None:
+                history = BoundedHistory(store=self.store, key=session, **self.history_kwargs)
+                self._sessions[session] = history
+            self._sessions.move_to_end(session)
+            evicted = []
+            while len(self._sessions) > self.max_sessions:
+                evicted.append(self._sessions.popitem(last=False)[1])
+        for old in evicted:
+            old.spill_all()
+        return history
+
+    def clear(self, session: str):
+        self.get(session).clear()
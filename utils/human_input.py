@@ -0,0 +1,130 @@
+import asyncio
+import concurrent.futures
+import inspect
+import threading
+
+
+class HumanInputBridge:
+    def __init__(self, on_request, on_response=None, timeout: float = 300, defaults: dict = None):
+        """
+        Routes the agents' human input requests to a UI instead of input() on the server console.
+
+        Async chats (a_initiate_chat) suspend on an asyncio future, so a waiting chat
+        holds no thread. Sync chats (initiate_chat) block their own worker thread on a
+        concurrent future. Either way the answer comes from `resolve`.
+
+        Args:
+            on_request: `callback(agent_name, prompt)` showing the request to the user, may be async
+            on_response: Optional `callback(agent_name, response, timed_out)`, may be async
+            timeout (float): Seconds to wait for the user before answering with the default
+            defaults (dict): Default answer per agent name on timeout, '' lets the agent auto-reply
+        """
+        self.on_request = on_request
+        self.on_response = on_response
+        self.timeout = timeout
+        self.defaults = defaults or {}
+        self._pending = None  # (agent_name, prompt, future, loop)
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> bool:
+        return self._pending is not None
+
+    @property
+    def pending_prompt(self):
+        pending = self._pending
+        return None if pending is None else pending[1]
+
+    def attach(self, agents):
+        """
+        Route human input of `agents` through the bridge.
+
+        Returns:
+            Callable: restores the agents' own input handling
+        """
+        for agent in agents:
+            agent.get_human_input = lambda prompt, name=agent.name: self.get_human_input(name, prompt)
+            agent.a_get_human_input = lambda prompt, name=agent.name: self.a_get_human_input(name, prompt)
+
+        def detach():
+            for agent in agents:
+                vars(agent).pop('get_human_input', None)
+                vars(agent).pop('a_get_human_input', None)
+            self.cancel()
+        return detach
+
+    def resolve(self, response: str) -> bool:
+        """Answer the pending request. Safe to call from any thread. Returns False if nothing was pending."""
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is None:
+            return False
+        _, _, future, loop = pending
+        if loop is None:
+            if not future.done():
+                future.set_result(response)
+        else:
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(response))
+        return True
+
+    def cancel(self):
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is not None:
+            _, _, future, loop = pending
+            if loop is None:
+                future.cancel()
+            else:
+                loop.call_soon_threadsafe(future.cancel)
+
+    async def a_get_human_input(self, agent_name: str, prompt: str) -> str:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            self._pending = (agent_name, prompt, future, loop)
+        await self._notify(self.on_request, agent_name, prompt)
+
+        timed_out = False
+        try:
+            response = await asyncio.wait_for(future, timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self._clear(future)
+            response, timed_out = self.defaults.get(agent_name, ""), True
+
+        await self._notify(self.on_response, agent_name, response, timed_out)
+        return response
+
+    def get_human_input(self, agent_name: str, prompt: str) -> str:
+        future = concurrent.futures.Future()
+        with self._lock:
+            self._pending = (agent_name, prompt, future, None)
+        self._notify_sync(self.on_request, agent_name, prompt)
+
+        timed_out = False
+        try:
+            response = future.result(timeout=self.timeout)
+        except concurrent.futures.TimeoutError:
+            self._clear(future)
+            response, timed_out = self.defaults.get(agent_name, ""), True
+
+        self._notify_sync(self.on_response, agent_name, response, timed_out)
+        return response
+
+    def _clear(self, future):
+        with self._lock:
+            if self._pending is not None and self._pending[2] is future:
+                self._pending = None
+
+    @staticmethod
+    async def _notify(callback, *args):
+        if callback is not None:
+            result = callback(*args)
+            if inspect.isawaitable(result):
+                await result
+
+    @staticmethod
+    def _notify_sync(callback, *args):
+        if callback is not None:
+            result = callback(*args)
+            if inspect.isawaitable(result):
+                raise TypeError("Async callbacks need an async chat (a_initiate_chat)")
@@ -0,0 +1,221 @@
+"""
+Array-backed rack inventory. Each rack of ro.runtime['rack_status'] becomes an integer
+code array with a label -> slots index, so lookups and batch queries do not scan the
+DataFrames cell by cell.
+
+Benchmark against the DataFrame scans, from the repository root:
+    python -m utils.inventory --experiments 48 --repeat 200
+"""
+import argparse
+import bisect
+import time
+
+import numpy as np
+import pandas as pd
+
+FREE = 0  # None: free space
+DO_NOT_USE = 1  # False: keep empty
+
+
+def _key(value):
+    """Hashable key that keeps False, 0 and NaN (a free cell after a pandas round trip) apart."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return type(value).__name__, value
+
+
+class RackInventory:
+    def __init__(self, cells):
+        """
+        Inventory of one rack.
+
+        Args:
+            cells: 2D cells as in rack_status, None for free space, False for do not use,
+                   anything else is a label ('new', a solution name, 1 for an unused pipette tip, ...)
+        """
+        cells = np.asarray(cells, dtype=object)
+        self.shape = cells.shape
+        self.values = [None, False]  # code -> cell value
+        self._codes_of = {_key(None): FREE, _key(False): DO_NOT_USE}
+        self.codes = np.empty(cells.size, dtype=np.int32)
+        for i, value in enumerate(cells.ravel().tolist()):
+            self.codes[i] = self._code(value)
+        order = np.argsort(self.codes, kind='stable')
+        bounds = np.flatnonzero(np.diff(self.codes[order])) + 1
+        # code -> flat slot indices in row-major order, the first one is what find_rack_index returns
+        self._slots = {int(self.codes[group[0]]): group.tolist() for group in np.split(order, bounds) if len(group)}
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> 'RackInventory':
+        return cls(df.to_numpy(dtype=object))
+
+    def _code(self, value) -> int:
+        key = _key(value)
+        code = self._codes_of.get(key)
+        if code is None:
+            code = self._codes_of[key] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def _index(self, flat) -> tuple:
+        return tuple(int(i) for i in np.unravel_index(flat, self.shape))
+
+    def count(self, label) -> int:
+        code = self._codes_of.get(_key(label))
+        return len(self._slots.get(code, ())) if code is not None else 0
+
+    def find(self, label):
+        """(row, col) of the first slot holding `label`, or None."""
+        slots = self.flat_slots(label, 1)
+        return self._index(slots[0]) if len(slots) else None
+
+    def flat_slots(self, label, n: int = None) -> np.ndarray:
+        """Flat indices of the first `n` (all when None) slots holding `label`, in row-major order."""
+        code = self._codes_of.get(_key(label))
+        slots = self._slots.get(code, []) if code is not None else []
+        return np.asarray(slots[:n] if n is not None else slots, dtype=np.int64)
+
+    def slots(self, label, n: int = None) -> np.ndarray:
+        """(k, 2) array of (row, col) of the first `n` slots holding `label`."""
+        return np.stack(np.unravel_index(self.flat_slots(label, n), self.shape), axis=-1)
+
+    def free_slots(self, n: int = None) -> np.ndarray:
+        return self.slots(None, n)
+
+    def get(self, index):
+        return self.values[self.codes[np.ravel_multi_index(index, self.shape)]]
+
+    def set(self, index, value):
+        """Put `value` in slot(s) `index`, a (row, col) pair or a (k, 2) array of them."""
+        flats = np.atleast_1d(np.ravel_multi_index(tuple(np.asarray(index).T), self.shape))
+        code = self._code(value)
+        for flat in flats.tolist():
+            old = int(self.codes[flat])
+            if old == code:
+                continue
+            slots = self._slots[old]
+            del slots[bisect.bisect_left(slots, flat)]
+            bisect.insort(self._slots.setdefault(code, []), flat)
+            self.codes[flat] = code
+
+    def take(self, label, n: int, replacement=None) -> np.ndarray:
+        """
+        Reserve the first `n` slots holding `label` and mark them with `replacement`
+        (free space by default). Raises ValueError when fewer than `n` are left.
+        """
+        slots = self.slots(label, n)
+        if len(slots) < n:
+            raise ValueError(f"Only {len(slots)} slots hold {label!r}, {n} needed")
+        self.set(slots, replacement)
+        return slots
+
+    def to_dataframe(self) -> pd.DataFrame:
+        values = np.empty(len(self.values), dtype=object)
+        values[:] = self.values
+        return pd.DataFrame(values[self.codes].reshape(self.shape))
+
+
+class Inventory:
+    # the labels the racks of rack_status use for unused items
+    NEW_SUBSTRATE = 'new'
+    USED_SUBSTRATE = 'used'
+    UNUSED_PIPETTE = 1
+    USED_PIPETTE = 0
+
+    def __init__(self, racks: dict):
+        """
+        All racks of a rack_status dict, e.g. Inventory.from_rack_status(ro.runtime['rack_status']).
+
+        Args:
+            racks (dict): rack name -> RackInventory
+        """
+        self.racks = racks
+
+    @classmethod
+    def from_rack_status(cls, rack_status: dict) -> 'Inventory':
+        return cls({name: RackInventory.from_dataframe(df) for name, df in rack_status.items()})
+
+    def __getitem__(self, rack: str) -> RackInventory:
+        return self.racks[rack]
+
+    def find_rack_index(self, rack: str, label) -> tuple:
+        """Same result as proc.find_rack_index, without scanning the rack."""
+        index = self.racks[rack].find(label)
+        if index is None:
+            raise ValueError(f"'{label}' is not in the {rack} rack")
+        return index
+
+    def find_many(self, rack: str, labels) -> dict:
+        """label -> (row, col) of its first slot, None when missing."""
+        return {label: self.racks[rack].find(label) for label in labels}
+
+    def new_substrates(self, n: int) -> np.ndarray:
+        return self.racks['substrate'].slots(self.NEW_SUBSTRATE, n)
+
+    def free_vial_slots(self, n: int = None) -> np.ndarray:
+        return self.racks['vial'].free_slots(n)
+
+    def next_pipettes(self, n: int) -> np.ndarray:
+        return self.racks['pipette'].slots(self.UNUSED_PIPETTE, n)
+
+    def to_rack_status(self) -> dict:
+        """DataFrames in the rack_status layout, e.g. to write back to ro.runtime['rack_status']."""
+        return {name: rack.to_dataframe() for name, rack in self.racks.items()}
+
+
+def _plan_with_dataframes(rack_status: dict, labels: list, n: int):
+    """Reference: the per-call scans of proc.find_rack_index and proc.new_pipette."""
+    vials, substrates, pipettes = [], [], []
+    for i in range(n):
+        status = rack_status['vial']
+        label = labels[i % len(labels)]
+        matches = np.argwhere(status.map(lambda cell: isinstance(cell, type(label)) and cell == label).to_numpy())
+        vials.append(tuple(matches[0]))
+        substrate = np.argwhere(rack_status['substrate'].to_numpy() == 'new')[0]
+        rack_status['substrate'].iat[tuple(substrate)] = 'used'
+        substrates.append(tuple(substrate))
+        pipette = np.argwhere(rack_status['pipette'].to_numpy() == 1)[0]
+        rack_status['pipette'].iat[tuple(pipette)] = 0
+        pipettes.append(tuple(pipette))
+    return vials, substrates, pipettes
+
+
+def _plan_with_inventory(rack_status: dict, labels: list, n: int):
+    inventory = Inventory.from_rack_status(rack_status)
+    found = inventory.find_many('vial', labels)
+    vials = [found[labels[i % len(labels)]] for i in range(n)]
+    substrates = inventory['substrate'].take(Inventory.NEW_SUBSTRATE, n, replacement='used')
+    pipettes = inventory['pipette'].take(Inventory.UNUSED_PIPETTE, n, replacement=Inventory.USED_PIPETTE)
+    return vials, [tuple(s) for s in substrates.tolist()], [tuple(p) for p in pipettes.tolist()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--experiments", type=int, default=48, help="Experiments planned per batch")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    from n9_sim import activate
+    ro = activate()  # rack_status.py imports robotics
+    import rack_status  # noqa: F401
+
+    def fresh():
+        return {name: df.copy() for name, df in ro.runtime['rack_status'].items()}
+
+    vial_labels = [cell for cell in ro.runtime['rack_status']['vial'].to_numpy().ravel().tolist()
+                   if isinstance(cell, str)]
+    n = min(args.experiments, 48, Inventory.from_rack_status(fresh())['substrate'].count('new'))
+
+    expected = _plan_with_dataframes(fresh(), vial_labels, n)
+    actual = _plan_with_inventory(fresh(), vial_labels, n)
+    assert [tuple(map(int, v)) for v in expected[0]] == actual[0], "vial slots differ"
+    assert [tuple(map(int, s)) for s in expected[1]] == actual[1], "substrate slots differ"
+    assert [tuple(map(int, p)) for p in expected[2]] == actual[2], "pipette slots differ"
+
+    for name, plan in (("DataFrame scans", _plan_with_dataframes), ("inventory arrays", _plan_with_inventory)):
+        states = [fresh() for _ in range(args.repeat)]
+        start = time.perf_counter()
+        for state in states:
+            plan(state, vial_labels, n)
+        elapsed = (time.perf_counter() - start) / args.repeat
+        print(f"{name:>16}: {1000 * elapsed:8.3f} ms per batch of {n} experiments")
@@ -0,0 +1,304 @@
+import json
+import os
+import pickle
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from utils.inventory import Inventory, RackInventory
+
+
+# What a used slot holds afterwards, per rack; racks not listed keep their value (a vial goes back to its slot)
+CONSUMED = {'substrate': Inventory.USED_SUBSTRATE, 'pipette': Inventory.USED_PIPETTE}
+
+
+def _encode(value) -> str:
+    """JSON keeps None, False, 0/1 and labels apart."""
+    if isinstance(value, float) and np.isnan(value):
+        value = None
+    if isinstance(value, np.generic):
+        value = value.item()
+    return json.dumps(value)
+
+
+class InventoryStore:
+    def __init__(self, db_path: str, reservation_ttl_s: float = 3600.0):
+        """
+        Persistent rack_status shared by the agents, planning sessions and runs. Slots are
+        reserved by an owner (a chat or a batch plan) before they are used and consumed once
+        the robot has used them, so concurrent sessions never get the same slot.
+
+        Args:
+            db_path (str): SQLite file, created if missing
+            reservation_ttl_s (float): Reservations older than this are given back
+        """
+        self.db_path = db_path
+        self.reservation_ttl_s = reservation_ttl_s
+        self._lock = threading.Lock()
+        # autocommit, transactions are opened explicitly with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._writes = 0  # own commits, PRAGMA data_version only counts other connections'
+        self._cache = {}  # (rack_status|inventory, owner) -> (version, value)
+        self._subscribers = []
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS slots ("
+                               "rack TEXT NOT NULL, row INTEGER NOT NULL, col INTEGER NOT NULL, value TEXT NOT NULL, "
+                               "reserved_by TEXT, reserved_at REAL, PRIMARY KEY (rack, row, col))")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS changes ("
+                               "id INTEGER PRIMARY KEY AUTOINCREMENT, rack TEXT NOT NULL, row INTEGER NOT NULL, "
+                               "col INTEGER NOT NULL, kind TEXT NOT NULL, value TEXT, owner TEXT, at REAL NOT NULL)")
+
+    # -- change notifications
+
+    def subscribe(self, callback):
+        """`callback(changes)` is called after every commit of this store with the new change rows."""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+
+    def changes_since(self, change_id: int = 0) -> list:
+        """Changes committed by any process after `change_id`, e.g. to poll from another process."""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, rack, row, col, kind, value, owner, at FROM changes WHERE id > ? "
+                                      "ORDER BY id", (change_id,)).fetchall()
+        return [self._change(row) for row in rows]
+
+    @staticmethod
+    def _change(row) -> dict:
+        change_id, rack, r, c, kind, value, owner, at = row
+        return {'id': change_id, 'rack': rack, 'slot': (r, c), 'kind': kind,
+                'value': None if value is None else json.loads(value), 'owner': owner, 'at': at}
+
+    # -- writes
+
+    def _transaction(self, work):
+        """Run `work(conn) -> (result, [(rack, row, col, kind, value, owner), ...])` in one write transaction."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")  # takes the write lock before reading, across processes
+            try:
+                result, changes = work(self._conn)
+                now = time.time()
+                first_id = None
+                for rack, r, c, kind, value, owner in changes:
+                    cursor = self._conn.execute("INSERT INTO changes (rack, row, col, kind, value, owner, at) "
+                                                "VALUES (?, ?, ?, ?, ?, ?, ?)", (rack, r, c, kind, value, owner, now))
+                    first_id = first_id or cursor.lastrowid
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            if changes:
+                self._writes += 1
+        if changes and self._subscribers:
+            committed = self.changes_since(first_id - 1)
+            for callback in list(self._subscribers):
+                callback(committed)
+        return result
+
+    def seed(self, rack_status: dict, replace: bool = False) -> list:
+        """
+        Store the racks of a rack_status dict. Racks already in the store keep their
+        persisted state unless `replace` is set. Returns the racks written.
+        """
+        def work(conn):
+            known = {rack for rack, in conn.execute("SELECT DISTINCT rack FROM slots")}
+            written, changes = [], []
+            for rack, df in rack_status.items():
+                if rack in known and not replace:
+                    continue
+                conn.execute("DELETE FROM slots WHERE rack = ?", (rack,))
+                cells = df.to_numpy(dtype=object)
+                rows = [(rack, r, c, _encode(cells[r, c])) for r, c in np.ndindex(cells.shape)]
+                conn.executemany("INSERT INTO slots (rack, row, col, value) VALUES (?, ?, ?, ?)", rows)
+                changes += [(rack, r, c, 'seed', value, None) for rack, r, c, value in rows]
+                written.append(rack)
+            return written, changes
+        return self._transaction(work)
+
+    def reserve(self, owner: str, rack: str, label, n: int = 1) -> list:
+        """
+        Atomically reserve the first `n` free-to-take slots holding `label` for `owner`.
+        Raises ValueError, reserving nothing, when fewer than `n` are left.
+        """
+        def work(conn):
+            expired = time.time() - self.reservation_ttl_s
+            rows = conn.execute("SELECT row, col FROM slots WHERE rack = ? AND value = ? "
+                                "AND (reserved_by IS NULL OR reserved_at < ?) ORDER BY row, col LIMIT ?",
+                                (rack, _encode(label), expired, n)).fetchall()
+            if len(rows) < n:
+                held = conn.execute("SELECT COUNT(*) FROM slots WHERE rack = ? AND value = ?",
+                                    (rack, _encode(label))).fetchone()[0]
+                taken = f", {held - len(rows)} more are reserved by other plans or chats" if held > len(rows) else ""
+                raise ValueError(f"Only {len(rows)} free slots of the {rack} rack hold {label!r}, {n} needed{taken}")
+            now = time.time()
+            conn.executemany("UPDATE slots SET reserved_by = ?, reserved_at = ? WHERE rack = ? AND row = ? AND col = ?",
+                             [(owner, now, rack, r, c) for r, c in rows])
+            return [(r, c) for r, c in rows], [(rack, r, c, 'reserve', None, owner) for r, c in rows]
+        return self._transaction(work)
+
+    def consume(self, owner: str, rack: str, slots, value=None):
+        """
+        Record that the robot used reserved `slots`: their cell becomes `value` (free space by
+        default, e.g. 'used' for a substrate or 0 for a pipette tip) and the reservation ends.
+        """
+        slots = [tuple(int(i) for i in slot) for slot in slots]
+
+        def work(conn):
+            expired = time.time() - self.reservation_ttl_s
+            for r, c in slots:
+                row = conn.execute("SELECT reserved_by, reserved_at FROM slots WHERE rack = ? AND row = ? AND col = ?",
+                                   (rack, r, c)).fetchone()
+                if row is None:
+                    raise KeyError(f"The {rack} rack has no slot {(r, c)}")
+                if row[0] not in (None, owner) and row[1] >= expired:
+                    raise ValueError(f"Slot {(r, c)} of the {rack} rack is reserved by {row[0]}")
+            encoded = _encode(value)
+            conn.executemany("UPDATE slots SET value = ?, reserved_by = NULL, reserved_at = NULL "
+                             "WHERE rack = ? AND row = ? AND col = ?", [(encoded, rack, r, c) for r, c in slots])
+            return None, [(rack, r, c, 'consume', encoded, owner) for r, c in slots]
+        self._transaction(work)
+
+    def put(self, rack: str, slot, value, owner: str = None):
+        """Set a slot directly, e.g. a vial returned to the rack."""
+        self.consume(owner, rack, [slot], value)
+
+    def release(self, owner: str, rack: str = None) -> int:
+        """Give back the slots `owner` reserved but did not consume."""
+        def work(conn):
+            query, params = "SELECT rack, row, col FROM slots WHERE reserved_by = ?", [owner]
+            if rack is not None:
+                query, params = query + " AND rack = ?", params + [rack]
+            rows = conn.execute(query, params).fetchall()
+            conn.executemany("UPDATE slots SET reserved_by = NULL, reserved_at = NULL "
+                             "WHERE rack = ? AND row = ? AND col = ?", rows)
+            return len(rows), [(rk, r, c, 'release', None, owner) for rk, r, c in rows]
+        return self._transaction(work)
+
+    def settle(self, owner: str, used: bool) -> int:
+        """
+        End `owner`'s reservations in one transaction: with `used`, its slots are consumed (substrates
+        become 'used', pipette tips 0, vials keep their solution), otherwise they are given back.
+        """
+        def work(conn):
+            rows = conn.execute("SELECT rack, row, col, value FROM slots WHERE reserved_by = ?", (owner,)).fetchall()
+            if not used:
+                conn.executemany("UPDATE slots SET reserved_by = NULL, reserved_at = NULL "
+                                 "WHERE rack = ? AND row = ? AND col = ?", [(rk, r, c) for rk, r, c, _ in rows])
+                return len(rows), [(rk, r, c, 'release', None, owner) for rk, r, c, _ in rows]
+            consumed = [(rk, r, c, _encode(CONSUMED[rk]) if rk in CONSUMED else value) for rk, r, c, value in rows]
+            conn.executemany("UPDATE slots SET value = ?, reserved_by = NULL, reserved_at = NULL "
+                             "WHERE rack = ? AND row = ? AND col = ?", [(v, rk, r, c) for rk, r, c, v in consumed])
+            return len(rows), [(rk, r, c, 'consume', v, owner) for rk, r, c, v in consumed]
+        return self._transaction(work)
+
+    # -- cached reads
+
+    def _version(self) -> tuple:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0], self._writes
+
+    def _cached(self, key, build):
+        with self._lock:
+            version = self._version()
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            rows = self._conn.execute("SELECT rack, row, col, value, reserved_by, reserved_at FROM slots "
+                                      "ORDER BY rack, row, col").fetchall()
+        value = build(rows)
+        with self._lock:
+            self._cache[key] = (version, value)
+        return value
+
+    def rack_status(self, owner: str = None) -> dict:
+        """The stored racks as rack_status DataFrames, e.g. for ro.runtime['rack_status'], as seen by `owner`."""
+        return {rack: cells.to_dataframe() for rack, cells in self._racks(owner).items()}
+
+    def inventory(self, owner: str = None) -> Inventory:
+        """
+        Inventory as seen by `owner`: slots reserved by other owners show as do-not-use (False),
+        so planning never offers them. Cached until the store changes; treat it as read-only.
+        """
+        return Inventory(self._racks(owner))
+
+    def _racks(self, owner) -> dict:
+        def build(rows):
+            expired = time.time() - self.reservation_ttl_s
+            shapes, cells = {}, {}
+            for rack, r, c, value, reserved_by, reserved_at in rows:
+                shapes[rack] = (max(shapes.get(rack, (0, 0))[0], r + 1), max(shapes.get(rack, (0, 0))[1], c + 1))
+                taken = reserved_by is not None and reserved_by != owner and reserved_at >= expired
+                cells.setdefault(rack, []).append((r, c, False if taken else json.loads(value)))
+            racks = {}
+            for rack, shape in shapes.items():
+                grid = np.full(shape, None, dtype=object)
+                for r, c, value in cells[rack]:
+                    grid[r, c] = value
+                racks[rack] = RackInventory(grid)
+            return racks
+        return self._cached(('racks', owner), build)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_stores = {}  # abspath of the db -> InventoryStore
+
+
+def get_inventory_store(db_path: str, seed: dict = None) -> InventoryStore:
+    """Process wide store per database file, seeded with the racks it does not have yet."""
+    key = os.path.abspath(db_path)
+    if key not in _stores:
+        _stores[key] = InventoryStore(db_path)
+    if seed:
+        _stores[key].seed(seed)
+    return _stores[key]
+
+
+_rack_status = {}  # (abspath, mtime) of a rack_status.py -> its racks
+
+
+def load_rack_status(rack_status_fp: str = 'rack_status.py') -> dict:
+    """
+    The rack_status dict a rack_status.py file declares. The file is run in a separate
+    interpreter, against the offline simulator's `robotics` package without the robot's,
+    so this process's modules are left alone. Treat the result as read-only.
+    """
+    key = (os.path.abspath(rack_status_fp), os.stat(rack_status_fp).st_mtime_ns)
+    if key not in _rack_status:
+        repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            out_fp = os.path.join(tmp_dir, 'rack_status.pickle')
+            result = subprocess.run([sys.executable, '-m', 'utils.inventory_store', key[0], out_fp],
+                                    cwd=repo_root, capture_output=True, text=True)
+            if result.returncode != 0:
+                raise RuntimeError(f"Could not load {rack_status_fp}:\n{result.stderr}")
+            with open(out_fp, 'rb') as out_f:
+                _rack_status[key] = pickle.load(out_f)
+    return _rack_status[key]
+
+
+def _run_rack_status(rack_status_fp: str) -> dict:
+    import importlib
+    import importlib.util
+    try:
+        ro = importlib.import_module('robotics')
+    except ImportError:
+        from n9_sim import activate
+        ro = activate()
+    spec = importlib.util.spec_from_file_location('_rack_status_seed', rack_status_fp)
+    spec.loader.exec_module(importlib.util.module_from_spec(spec))
+    return ro.runtime['rack_status']
+
+
+if __name__ == "__main__":
+    # Runs a rack_status.py for load_rack_status in its own interpreter: python -m utils.inventory_store <rack_status.py> <out.pickle>
+    with open(sys.argv[2], 'wb') as out_f:
+        pickle.dump(_run_rack_status(sys.argv[1]), out_f)
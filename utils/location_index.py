@@ -0,0 +1,257 @@
+import argparse
+import hashlib
+import importlib
+import importlib.util
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+FORMAT_VERSION = 1
+DEFAULT_CACHE_DIR = '.loca_index'
+
+# One row per named position and per rack slot. Rows of a name are contiguous and in
+# slot order, points have nrow = ncol = 0.
+LOCATION_DTYPE = np.dtype([
+    ('name', 'U48'),
+    ('kind', 'U8'),  # 'point', 'rack' or 'sequence' (final step of a proc.SequenceArray)
+    ('row', 'i2'),
+    ('col', 'i2'),
+    ('nrow', 'i2'),
+    ('ncol', 'i2'),
+    ('position', 'f8', (4,)),
+])
+
+
+def _positions(value):
+    """(kind, array) of a loca attribute holding positions, or None."""
+    kind = 'rack'
+    if hasattr(value, 'steps') and hasattr(value, 'final'):  # proc.SequenceArray
+        value, kind = value.final, 'sequence'
+    if isinstance(value, (list, tuple)) and len(value) == 4 and all(isinstance(v, (int, float)) for v in value):
+        value = np.asarray(value, dtype=float)
+    if not isinstance(value, np.ndarray) or value.ndim not in (1, 3) or value.shape[-1] != 4:
+        return None
+    if value.ndim == 1:
+        return ('point' if kind == 'rack' else kind), value
+    return kind, value
+
+
+def build_records(loca) -> np.ndarray:
+    """
+    Structured array of every position in a loaded loca module. Public names come first and
+    larger racks before the racks they are concatenated from, so that reverse lookups of a
+    position resolve to `vial_rack` rather than `vial_rack_left` or a private approach point.
+    """
+    entries = []
+    for name, value in vars(loca).items():
+        found = _positions(value)
+        if found is not None:
+            entries.append((name, *found))
+    entries.sort(key=lambda entry: (entry[0].startswith('_'), -entry[2][..., 0].size, entry[0]))
+
+    records = np.zeros(sum(array[..., 0].size for _, _, array in entries), dtype=LOCATION_DTYPE)
+    start = 0
+    for name, kind, array in entries:
+        nrow, ncol = array.shape[:2] if array.ndim == 3 else (0, 0)
+        stop = start + max(nrow * ncol, 1)
+        rows = records[start:stop]
+        rows['name'], rows['kind'], rows['nrow'], rows['ncol'] = name, kind, nrow, ncol
+        if nrow:
+            rows['row'], rows['col'] = np.divmod(np.arange(nrow * ncol), ncol)
+        rows['position'] = array.reshape(-1, 4)
+        start = stop
+    return records
+
+
+def _cache_key(loca_fp: str, procedure_fp: str = None) -> str:
+    """Hash of loca.py and of the rack_locator implementation (robotics.procedure) that computed its positions."""
+    digest = hashlib.sha256(f"v{FORMAT_VERSION}".encode())
+    with open(loca_fp, 'rb') as loca_f:
+        digest.update(loca_f.read())
+    if procedure_fp is not None and os.path.exists(procedure_fp):
+        digest.update(os.path.abspath(procedure_fp).encode())
+        with open(procedure_fp, 'rb') as procedure_f:
+            digest.update(procedure_f.read())
+    return digest.hexdigest()[:16]
+
+
+def _cache_fp(loca_fp: str, cache_dir: str, procedure_fp: str = None) -> str:
+    stem = os.path.splitext(os.path.basename(loca_fp))[0]
+    return os.path.join(cache_dir, f"{stem}_{_cache_key(loca_fp, procedure_fp)}.npy")
+
+
+def _loaded_procedure_fp():
+    procedure = sys.modules.get('robotics.procedure')
+    return getattr(procedure, '__file__', None) if procedure is not None else None
+
+
+def _procedure_fp() -> str:
+    """The robotics/procedure.py loca.py would import, found without importing anything."""
+    loaded = _loaded_procedure_fp()
+    if loaded is not None:
+        return loaded
+    spec = importlib.util.find_spec('robotics')
+    if spec is not None and spec.submodule_search_locations:
+        return os.path.join(list(spec.submodule_search_locations)[0], 'procedure.py')
+    from n9_sim import SIM_PATH  # without the robot's package loca.py is built against the simulator
+    return os.path.join(SIM_PATH, 'robotics', 'procedure.py')
+
+
+def _build_cache(loca, cache_dir: str) -> str:
+    """Cache file of an imported loca module, written if it does not exist yet."""
+    cache_fp = _cache_fp(loca.__file__, cache_dir, _loaded_procedure_fp())
+    if not os.path.exists(cache_fp):
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_fp = f"{cache_fp}.{os.getpid()}.tmp"
+        with open(tmp_fp, 'wb') as tmp_f:
+            np.save(tmp_f, build_records(loca))
+        os.replace(tmp_fp, cache_fp)  # concurrent builders write the same content
+    return cache_fp
+
+
+def _build_in_subprocess(loca_fp: str, cache_dir: str) -> str:
+    """Import loca.py in a separate interpreter to build its cache, so this process keeps its modules."""
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, '-m', 'utils.location_index', os.path.abspath(loca_fp),
+                             '--cache-dir', os.path.abspath(cache_dir)],
+                            cwd=repo_root, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Could not index {loca_fp}:\n{result.stderr}")
+    return result.stdout.strip().splitlines()[-1]
+
+
+class LocationIndex:
+    def __init__(self, records: np.ndarray):
+        """
+        O(1) lookups over the positions of loca.py:
+
+            index.position('vial_rack', (1, 2))   # slot position, no DataFrame or rack_locator call
+            index.rack('pipette_rack')            # (nrow, ncol, 4) view of the rack
+            index.locate(c9.position)             # ('vial_rack', (1, 2))
+
+        Args:
+            records (np.ndarray): LOCATION_DTYPE rows, usually memory-mapped from the cache
+        """
+        self.records = records
+        names, starts, counts = np.unique(records['name'], return_index=True, return_counts=True)
+        self._spans = {name: (int(start), int(count)) for name, start, count in zip(names.tolist(), starts, counts)}
+        self._by_position = {}
+        keys = np.rint(records['position']).astype(np.int64).tolist()
+        for i, key in enumerate(keys):
+            self._by_position.setdefault(tuple(key), i)
+
+    @classmethod
+    def from_module(cls, loca, cache_dir: str = DEFAULT_CACHE_DIR) -> 'LocationIndex':
+        """Index of an imported loca module, built once per version of its file and then memory-mapped."""
+        if getattr(loca, '__file__', None) is None:
+            return cls(build_records(loca))
+        return cls(np.load(_build_cache(loca, cache_dir), mmap_mode='r'))
+
+    @classmethod
+    def load(cls, loca_fp: str = 'loca.py', cache_dir: str = DEFAULT_CACHE_DIR) -> 'LocationIndex':
+        """
+        Index of the loca.py file at `loca_fp`, memory-mapped from the cache. A missing cache is
+        built by importing loca.py in a separate interpreter (against the offline simulator
+        without the robot's `robotics` package), this process's modules are left alone.
+        """
+        loca = sys.modules.get('loca')
+        if loca is not None and os.path.abspath(getattr(loca, '__file__', None) or '') == os.path.abspath(loca_fp):
+            return cls.from_module(loca, cache_dir)
+        cache_fp = _cache_fp(loca_fp, cache_dir, _procedure_fp())
+        if not os.path.exists(cache_fp):
+            cache_fp = _build_in_subprocess(loca_fp, cache_dir)
+        return cls(np.load(cache_fp, mmap_mode='r'))
+
+    @property
+    def names(self) -> list:
+        return list(self._spans)
+
+    def __contains__(self, name) -> bool:
+        return name in self._spans
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def shape(self, name: str) -> tuple:
+        """(nrow, ncol) of a rack, () for a single position."""
+        start, _ = self._span(name)
+        record = self.records[start]
+        return (int(record['nrow']), int(record['ncol'])) if record['nrow'] else ()
+
+    def position(self, name: str, index=()) -> np.ndarray:
+        """Position of `name`, or of slot `index` (row, col) when it is a rack."""
+        start, count = self._span(name)
+        shape = self.shape(name)
+        index = tuple(index)
+        if len(index) != len(shape) or any(not 0 <= i < n for i, n in zip(index, shape)):
+            raise IndexError(f"'{name}' has shape {shape}, no slot {index}")
+        offset = index[0] * shape[1] + index[1] if shape else 0
+        return np.array(self.records['position'][start + offset])
+
+    def rack(self, name: str) -> np.ndarray:
+        """All slot positions of a rack, shape (nrow, ncol, 4)."""
+        start, count = self._span(name)
+        return self.records['position'][start:start + count].reshape(self.shape(name) + (4,))
+
+    def locate(self, position):
+        """(name, slot index) of a position, or None when it is not a named location."""
+        key = tuple(np.rint(np.asarray(position, dtype=float)).astype(np.int64).tolist())
+        i = self._by_position.get(key)
+        if i is None:
+            return None
+        record = self.records[i]
+        return str(record['name']), ((int(record['row']), int(record['col'])) if record['nrow'] else ())
+
+    def describe(self, name: str, row: int = None, col: int = None) -> str:
+        """Text answer for the agents' location lookups."""
+        if name not in self:
+            return f"Unknown location '{name}'"
+        shape = self.shape(name)
+        if shape and (row is None or col is None):
+            return f"loca.{name} is a rack of {shape[0]} rows x {shape[1]} columns, index a slot with loca.{name}[row, col]"
+        index = (row, col) if shape else ()
+        try:
+            position = self.position(name, index)
+        except IndexError as e:
+            return str(e)
+        slot = f"[{row}, {col}]" if shape else ""
+        return f"loca.{name}{slot} = {[round(v, 1) for v in position.tolist()]}"
+
+    def _span(self, name: str):
+        try:
+            return self._spans[name]
+        except KeyError:
+            raise KeyError(f"Unknown location '{name}'") from None
+
+
+_indexes = {}  # (abspath, mtime) of loca.py -> LocationIndex
+
+
+def get_location_index(loca_fp: str = 'loca.py', cache_dir: str = DEFAULT_CACHE_DIR) -> LocationIndex:
+    """Process wide index per version of a loca.py file."""
+    key = (os.path.abspath(loca_fp), os.stat(loca_fp).st_mtime_ns)
+    if key not in _indexes:
+        _indexes[key] = LocationIndex.load(loca_fp, cache_dir)
+    return _indexes[key]
+
+
+if __name__ == "__main__":
+    # Builds the cache of a loca.py, run by LocationIndex.load in its own interpreter
+    parser = argparse.ArgumentParser()
+    parser.add_argument("loca_fp")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.loca_fp)))  # as `import loca` next to it would
+    try:
+        importlib.import_module('robotics')
+    except ImportError:
+        from n9_sim import activate
+        activate()
+    spec = importlib.util.spec_from_file_location('loca', args.loca_fp)
+    loca = importlib.util.module_from_spec(spec)
+    sys.modules['loca'] = loca
+    spec.loader.exec_module(loca)
+    print(_build_cache(loca, args.cache_dir))
@@ -0,0 +1,96 @@
+import itertools
+import time
+from types import SimpleNamespace
+
+import autogen
+
+from utils.capture_manager import CaptureGroupChatManager
+
+MOCK_CODE_REPLY = """```python
+# filename: mock_script.py
+print("mock robot script")
+```"""
+
+
+class MockModelClient:
+    """
+    Offline stand-in for the LLM, follows the same custom client protocol as
+    autogen_llm.ArgoModelClient. Sleeps `latency` seconds per call to mimic a
+    remote model and cycles through canned `responses`.
+    """
+    def __init__(self, config, **kwargs):
+        self.model = config['model']
+        self.latency = config.get('latency', 0.5)
+        self._responses = itertools.cycle(config.get('responses', [MOCK_CODE_REPLY, "TERMINATE"]))
+
+    def create(self, params):
+        time.sleep(self.latency)
+
+        response = SimpleNamespace()
+        response.model = self.model
+        response.choices = []
+        for _ in range(params.get("n", 1)):
+            choice = SimpleNamespace()
+            choice.message = SimpleNamespace()
+            choice.message.content = next(self._responses)
+            choice.message.function_call = None
+            response.choices.append(choice)
+        return response
+
+    def message_retrieval(self, response):
+        return [choice.message.content for choice in response.choices]
+
+    def cost(self, response) -> float:
+        response.cost = 0
+        return 0
+
+    @staticmethod
+    def get_usage(response):
+        return {}
+
+
+def get_mock_llm_config(latency: float = 0.5, responses=None):
+    config = {"model": "mock", "model_client_cls": "MockModelClient", "latency": latency, "cache_seed": None}
+    if responses is not None:
+        config["responses"] = responses
+    return {"config_list": [config], "cache_seed": None}
+
+
+class MockAutoGenSystem:
+    """
+    Minimal AutoGenSystem look-alike (admin + code writer in a round robin group
+    chat) backed by MockModelClient, for exercising the app plumbing without API keys.
+    """
+    def __init__(self, latency: float = 0.5, max_round: int = 4, human_input_mode: str = "NEVER", responses=None):
+        self.llm_config = get_mock_llm_config(latency, responses)
+
+        self.code_writer_agent = autogen.ConversableAgent(
+            name="code_writer_agent",
+            llm_config=self.llm_config,
+            human_input_mode="NEVER",
+        )
+        self.code_writer_agent.register_model_client(MockModelClient)
+
+        self.polybot_admin = autogen.UserProxyAgent(
+            name="admin",
+            human_input_mode=human_input_mode,
+            code_execution_config=False,
+        )
+
+        self.groupchat = autogen.GroupChat(
+            agents=[self.polybot_admin, self.code_writer_agent],
+            messages=[],
+            max_round=max_round,
+            speaker_selection_method="round_robin",
+        )
+        self.manager = CaptureGroupChatManager(
+            groupchat=self.groupchat,
+            llm_config=False,
+            is_termination_msg=lambda msg: msg.get("content") is not None and "TERMINATE" in msg["content"],
+        )
+
+    def initiate_chat(self, prompt: str):
+        return self.polybot_admin.initiate_chat(self.manager, message=prompt)
+
+    async def a_initiate_chat(self, message: str):
+        await self.polybot_admin.a_initiate_chat(recipient=self.manager, message=message, clear_history=True)
@@ -0,0 +1,90 @@
+import threading
+import uuid
+
+import autogen.runtime_logging
+from autogen.logger.base_logger import BaseLogger
+
+
+class PromptCacheLogger(BaseLogger):
+    """
+    autogen runtime logger that only counts prompt tokens and provider-cached prompt
+    tokens per agent, to verify that the static system message prefix is served from
+    the provider's prompt cache.
+
+    OpenAI reports cached tokens in `usage.prompt_tokens_details.cached_tokens`,
+    Anthropic in `usage.cache_read_input_tokens`.
+    """
+    def __init__(self):
+        self.session_id = None
+        self._lock = threading.Lock()
+        self.stats = {}  # agent name -> {"calls", "prompt_tokens", "cached_tokens", "local_cache_hits"}
+
+    def start(self) -> str:
+        self.session_id = str(uuid.uuid4())
+        return self.session_id
+
+    def stop(self) -> None:
+        pass
+
+    def get_connection(self):
+        return None
+
+    def log_chat_completion(self, invocation_id, client_id, wrapper_id, source, request, response, is_cached, cost,
+                            start_time) -> None:
+        name = source if isinstance(source, str) else getattr(source, "name", str(source))
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = (getattr(details, "cached_tokens", 0) or 0) + (getattr(usage, "cache_read_input_tokens", 0) or 0)
+
+        with self._lock:
+            stats = self.stats.setdefault(name, {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "local_cache_hits": 0})
+            stats["calls"] += 1
+            if is_cached:
+                # Answered from autogen's local disk cache (cache_seed), the provider was not called
+                stats["local_cache_hits"] += 1
+            else:
+                stats["prompt_tokens"] += prompt_tokens
+                stats["cached_tokens"] += cached_tokens
+
+    def log_new_agent(self, agent, init_args) -> None:
+        pass
+
+    def log_event(self, source, name, **kwargs) -> None:
+        pass
+
+    def log_new_wrapper(self, wrapper, init_args) -> None:
+        pass
+
+    def log_new_client(self, client, wrapper, init_args) -> None:
+        pass
+
+    def log_function_use(self, source, function, args, returns) -> None:
+        pass
+
+    def report(self) -> str:
+        with self._lock:
+            stats = {name: dict(agent_stats) for name, agent_stats in self.stats.items()}
+        prompt_tokens = sum(agent_stats["prompt_tokens"] for agent_stats in stats.values())
+        cached_tokens = sum(agent_stats["cached_tokens"] for agent_stats in stats.values())
+        share = 100 * cached_tokens / prompt_tokens if prompt_tokens else 0
+        lines = [f"Prompt cache: {cached_tokens} of {prompt_tokens} prompt tokens served from the provider cache ({share:.0f}%)"]
+        for name, agent_stats in sorted(stats.items()):
+            lines.append(f"  {name}: {agent_stats['calls']} calls, {agent_stats['cached_tokens']}/{agent_stats['prompt_tokens']} "
+                         f"cached tokens, {agent_stats['local_cache_hits']} local cache hits")
+        return "\n".join(lines)
+
+
+_prompt_cache_logger = None
+
+
+def get_prompt_cache_logger():
+    """
+    Start autogen runtime logging with the process wide PromptCacheLogger. If runtime
+    logging was already started with another logger, that logger is kept and None is returned.
+    """
+    global _prompt_cache_logger
+    if _prompt_cache_logger is None and not autogen.runtime_logging.logging_enabled():
+        _prompt_cache_logger = PromptCacheLogger()
+        autogen.runtime_logging.start(logger=_prompt_cache_logger)
+    return _prompt_cache_logger
@@ -0,0 +1,520 @@
+"""
+Rule engine for the physical rules the operations file only states in comments. A generated
+script is turned into a trace of robot operations without running it. The trace is then
+replayed through a declarative state machine of the tool, gripper, clamp, vial, pipette and
+substrate, which takes milliseconds, so the check can gate every execution.
+
+    checker = SafetyChecker('loca.py')
+    checker.check(code).report()
+
+From the repository root:
+    python -m utils.safety_rules polybot_screenshots_run/*.py
+"""
+import argparse
+import ast
+import builtins
+import hashlib
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+from utils.script_validator import _attribute_chain, _hardware_kind, _import_names
+
+
+class _Unknown:
+    def __repr__(self):
+        return '?'
+
+
+UNKNOWN = _Unknown()  # a value the static trace cannot know, e.g. a computed position
+VALUE = object()  # in Transition.sets: the operation's value
+TARGET = object()  # in Transition.sets: the operation's target
+
+# Named loca locations the rules care about, as in the simulator
+VIAL_RACK = ('vial_rack',)
+CLAMP = ('clamp',)
+PIPETTE_CLAMP = ('p_clamp', 'p_clamp_20ul')
+COATER_STAGE = ('s_coater',)
+PIPETTE_COATER = ('p_coater', 'pipette_coater', 'pipette_coater_one', 'pipette_coater_20uL')
+SUBSTRATE_RACKS = ('substrate_rack_seq', 'substrate_rack_PDMS_seq')
+TOOLS = ('substrate_tool',)
+
+# Controller methods the trace records, a call of one on an object it cannot resolve may drive the robot unchecked
+ROBOT_METHODS = ('set_output', 'aspirate_ml', 'dispense_ml', 'uncap', 'cap', 'move_axis', 'new_pipette', 'remove_pipette')
+
+# The robot at rest, as the simulator starts: nothing held, no tool or pipette, empty clamp
+INITIAL_STATE = {
+    'at': None,  # loca name of the arm's position, None when it is not a named location
+    'tool': None,
+    'holding': None,  # what the gripper holds: None, 'vial', 'clamped' (vial also held by the clamp) or 'cap'
+    'clamp': False,  # closed
+    'clamp_vial': False,  # a vial is in the clamp
+    'capped': True,  # the vial being worked on
+    'pipette': False,
+    'bernoulli': False,
+    'substrate': False,  # on the substrate tool
+    'coater_substrate': False,
+    'coater_vacuum': False,
+}
+
+
+@dataclass
+class Operation:
+    op: str  # move, tool, output, aspirate, dispense, uncap, cap, new_pipette or remove_pipette
+    target: Any = None  # move: loca name, output: output name
+    value: Any = None  # tool: tool name, output: on/off, aspirate/dispense: mL
+    source: str = None  # move: 'loca', 'coordinates', 'rack_status' or 'unknown'
+    line: int = None
+
+
+@dataclass(frozen=True)
+class Rule:
+    op: str
+    message: str
+    when: dict = field(default_factory=dict)  # operation field (target/value/source) or state -> allowed values
+    requires: dict = field(default_factory=dict)  # state -> allowed values, empty: the operation is never allowed
+
+
+@dataclass(frozen=True)
+class Transition:
+    op: str
+    sets: dict  # state -> new value, VALUE/TARGET take the operation's
+    when: dict = field(default_factory=dict)
+
+
+RULES = [
+    Rule('move', "c9.position is given a rack_status cell, which only says what is in a slot; "
+                 "take positions from loca, e.g. loca.vial_rack[vial_index]",
+         when={'source': 'rack_status'}),
+    Rule('move', "The arm moves while the gripper holds the vial in the closed clamp; open the gripper first",
+         requires={'holding': (None, 'vial', 'cap')}),
+    Rule('tool', "A tool is picked up while the gripper holds something; release it first",
+         when={'value': TOOLS}, requires={'holding': None}),
+    Rule('tool', "The substrate tool is dropped off while it holds a substrate; "
+                 "release it first with c9.set_output('substrate_tool', False)",
+         when={'value': None}, requires={'substrate': False}),
+    Rule('output', "The substrate vacuum is switched without the substrate tool; "
+                   "pick it up first with c9.tool = 'substrate_tool'",
+         when={'target': 'bernoulli'}, requires={'tool': 'substrate_tool'}),
+    Rule('output', "The substrate is picked up from the coater stage while its vacuum holds it; "
+                   "switch off coater_stage_vacuum first",
+         when={'target': 'bernoulli', 'value': True, 'at': COATER_STAGE, 'coater_substrate': True},
+         requires={'coater_vacuum': False}),
+    Rule('output', "The gripper opens before the clamp is closed and the vial would drop; "
+                   "close the clamp first with c9.set_output('clamp', True), then open the gripper",
+         when={'target': 'gripper', 'value': False, 'holding': 'vial', 'at': CLAMP}, requires={'clamp': True}),
+    Rule('output', "The gripper releases the vial away from the clamp and the vial rack",
+         when={'target': 'gripper', 'value': False, 'holding': 'vial'}, requires={'at': CLAMP + VIAL_RACK}),
+    Rule('output', "The gripper opens while it holds the vial's cap; put the cap back with c9.cap() first",
+         when={'target': 'gripper', 'value': False, 'holding': 'cap'}),
+    Rule('uncap', "c9.uncap() needs the gripper closed on a vial held by the closed clamp",
+         requires={'holding': 'clamped'}),
+    Rule('cap', "c9.cap() needs the vial's cap in the gripper, from c9.uncap()",
+         requires={'holding': 'cap'}),
+    Rule('aspirate', "Aspirating without a pipette; call proc.new_pipette(c9) first",
+         requires={'pipette': True}),
+    Rule('aspirate', "Aspirating away from the clamped vial; move there with c9.position = loca.p_clamp",
+         when={'pipette': True}, requires={'at': PIPETTE_CLAMP, 'clamp_vial': True}),
+    Rule('aspirate', "Aspirating from a capped vial; uncap it first with c9.uncap()",
+         when={'pipette': True, 'at': PIPETTE_CLAMP}, requires={'capped': False}),
+    Rule('dispense', "Dispensing without a pipette", requires={'pipette': True}),
+    Rule('dispense', "Dispensing onto the empty coater stage; place a substrate there first",
+         when={'at': PIPETTE_COATER}, requires={'coater_substrate': True}),
+    Rule('new_pipette', "proc.new_pipette(c9) with a pipette already attached; call proc.remove_pipette(c9) first",
+         requires={'pipette': False}),
+    Rule('remove_pipette', "proc.remove_pipette(c9) without a pipette attached", requires={'pipette': True}),
+]
+
+# First matching transition of an operation wins
+TRANSITIONS = [
+    Transition('move', {'at': TARGET, 'substrate': True},
+               when={'target': SUBSTRATE_RACKS, 'tool': 'substrate_tool', 'bernoulli': True, 'substrate': False}),
+    Transition('move', {'at': TARGET}),
+    Transition('tool', {'tool': VALUE, 'substrate': False, 'bernoulli': False}, when={'value': None}),
+    Transition('tool', {'tool': VALUE}),
+
+    Transition('output', {'holding': 'vial', 'capped': True},
+               when={'target': 'gripper', 'value': True, 'holding': None, 'at': VIAL_RACK}),
+    Transition('output', {'holding': 'clamped'},
+               when={'target': 'gripper', 'value': True, 'holding': None, 'at': CLAMP, 'clamp_vial': True, 'clamp': True}),
+    Transition('output', {'holding': 'vial', 'clamp_vial': False},
+               when={'target': 'gripper', 'value': True, 'holding': None, 'at': CLAMP, 'clamp_vial': True, 'clamp': False}),
+    Transition('output', {'holding': None, 'clamp_vial': True},
+               when={'target': 'gripper', 'value': False, 'holding': 'vial', 'at': CLAMP, 'clamp': True}),
+    Transition('output', {'holding': None}, when={'target': 'gripper', 'value': False}),
+    Transition('output', {'holding': UNKNOWN}, when={'target': 'gripper', 'value': UNKNOWN}),
+
+    Transition('output', {'clamp': True, 'clamp_vial': True, 'holding': 'clamped'},
+               when={'target': 'clamp', 'value': True, 'holding': 'vial', 'at': CLAMP}),
+    Transition('output', {'clamp': False, 'clamp_vial': False, 'holding': 'vial'},
+               when={'target': 'clamp', 'value': False, 'holding': 'clamped'}),
+    Transition('output', {'clamp': VALUE}, when={'target': 'clamp'}),
+
+    Transition('output', {'bernoulli': True, 'substrate': True},
+               when={'target': 'bernoulli', 'value': True, 'tool': 'substrate_tool', 'substrate': False, 'at': SUBSTRATE_RACKS}),
+    Transition('output', {'bernoulli': True, 'substrate': True, 'coater_substrate': False},
+               when={'target': 'bernoulli', 'value': True, 'tool': 'substrate_tool', 'substrate': False,
+                     'at': COATER_STAGE, 'coater_substrate': True}),
+    Transition('output', {'bernoulli': False, 'substrate': False, 'coater_substrate': True},
+               when={'target': 'bernoulli', 'value': False, 'substrate': True, 'at': COATER_STAGE}),
+    Transition('output', {'bernoulli': False, 'substrate': False}, when={'target': 'bernoulli', 'value': False}),
+    Transition('output', {'bernoulli': VALUE}, when={'target': 'bernoulli'}),
+    Transition('output', {'coater_vacuum': VALUE}, when={'target': 'coater_stage_vacuum'}),
+
+    Transition('uncap', {'holding': 'cap', 'capped': False}, when={'holding': 'clamped'}),
+    Transition('cap', {'holding': 'clamped', 'capped': True}, when={'holding': 'cap'}),
+    Transition('new_pipette', {'pipette': True}),
+    Transition('remove_pipette', {'pipette': False}),
+]
+
+
+@dataclass
+class SafetyResult:
+    ok: bool
+    violations: List[str] = field(default_factory=list)
+    operations: int = 0
+    unchecked: List[str] = field(default_factory=list)  # robot calls the trace could not follow
+
+    def report(self) -> str:
+        if self.ok:
+            report = f"Safety check passed: {self.operations} robot operations follow the tool, gripper, clamp and vial rules."
+            return report + "".join(f"\n- not checked: {problem}" for problem in self.unchecked)
+        return "Safety check failed:\n" + "\n".join(f"- {violation}" for violation in self.violations)
+
+
+def _allowed(values) -> tuple:
+    return values if isinstance(values, tuple) else (values,)
+
+
+def _matches(conditions: dict, operation: Operation, state: dict) -> bool:
+    for key, values in conditions.items():
+        if key in ('target', 'value', 'source'):
+            actual = getattr(operation, key)
+        else:
+            actual = state[key]
+            if actual is UNKNOWN:
+                return False
+        if not any(actual is value or (actual is not UNKNOWN and actual == value and type(actual) is type(value))
+                   for value in _allowed(values)):
+            return False
+    return True
+
+
+def _meets(requires: dict, state: dict) -> bool:
+    """Unknown state passes, the static trace only flags what it can show."""
+    if not requires:
+        return False
+    return all(state[key] is UNKNOWN or any(state[key] == value and type(state[key]) is type(value)
+                                            for value in _allowed(values))
+               for key, values in requires.items())
+
+
+def _read_alias(loca_fp: str) -> Dict[str, str]:
+    """The `alias` dict of loca.py: set_output names -> air output, e.g. substrate_tool -> bernoulli."""
+    with open(loca_fp, 'r') as loca_f:
+        tree = ast.parse(loca_f.read())
+    for node in tree.body:
+        if (isinstance(node, ast.Assign) and isinstance(node.value, ast.Dict)
+                and any(isinstance(target, ast.Name) and target.id == 'alias' for target in node.targets)):
+            return ast.literal_eval(node.value)
+    return {}
+
+
+class _TraceExtractor:
+    def __init__(self, alias: Dict[str, str], max_paths: int = 64):
+        """
+        Statements in program order, as every path the script may take: both branches of an
+        if, loop bodies twice (so the state one iteration leaves meets the next one), helper
+        functions with the controller bound to their parameters.
+        """
+        self.alias = alias
+        self.max_paths = max_paths
+        self.kinds = {}  # local name -> imported module or hardware kind
+        self.sources = {}  # variable -> (source, loca name) of the position it may hold
+        self.functions = {}
+        self.calling = set()
+        self.paths: List[List[Operation]] = [[]]
+        self.unresolved: List[str] = []  # robot calls the trace cannot follow
+
+    def extract(self, tree) -> List[List[Operation]]:
+        for module, local_name in _import_names(tree):
+            self.kinds[local_name] = module
+        self._statements(tree.body)
+        return self.paths
+
+    def _kind(self, node):
+        """Imported module or hardware kind an expression refers to, None if it is neither."""
+        return _hardware_kind(node) or (self.kinds.get(node.id) if isinstance(node, ast.Name) else None)
+
+    def _statements(self, body):
+        for node in body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                self.functions[node.name] = node
+            elif isinstance(node, ast.If):
+                before = self.paths
+                self.paths = [list(path) for path in before]
+                self._statements(node.body)
+                taken, self.paths = self.paths, [list(path) for path in before]
+                self._statements(node.orelse)
+                self._merge(taken + self.paths, node)
+            elif isinstance(node, (ast.For, ast.AsyncFor, ast.While)):
+                self._statements(node.body)
+                self._statements(node.body)
+            elif isinstance(node, (ast.With, ast.AsyncWith)):
+                self._statements(node.body)
+            elif isinstance(node, ast.Try):
+                self._statements(node.body + node.finalbody)
+            else:
+                self._statement(node)
+
+    def _merge(self, paths, node):
+        """Distinct paths after a branch; branches that do not drive the robot add none."""
+        distinct = {tuple(map(id, path)): path for path in paths}
+        self.paths = list(distinct.values())
+        if len(self.paths) > self.max_paths:
+            self._unresolved(node, f"more than {self.max_paths} paths drive the robot, only the first ones are checked")
+            self.paths = self.paths[:self.max_paths]
+
+    def _statement(self, node):
+        calls = sorted((call for call in ast.walk(node) if isinstance(call, ast.Call)),
+                       key=lambda call: (call.lineno, call.col_offset))
+        for call in calls:
+            self._call(call)
+        if not isinstance(node, ast.Assign):
+            return
+        kind = self._kind(node.value)
+        source = None if kind else self._source(node.value)
+        for target in node.targets:
+            if isinstance(target, ast.Name):
+                self.kinds.pop(target.id, None)
+                if kind:
+                    self.kinds[target.id] = kind
+                else:
+                    self.sources[target.id] = source
+            elif isinstance(target, ast.Attribute) and target.attr in ('position', 'tool'):
+                if self.kinds.get(getattr(target.value, 'id', None)) != 'controller':
+                    if self._kind(target.value) is None:
+                        self._unresolved(node, f"`.{target.attr} = ...` is set on an object the check cannot follow")
+                elif target.attr == 'position':
+                    source, location = self._source(node.value)
+                    self._add('move', node, target=location, source=source)
+                else:
+                    self._add('tool', node, value=self._constant(node.value))
+            elif kind == 'controller':
+                self._unresolved(node, "the controller is stored where the check cannot follow it")
+
+    def _call(self, call: ast.Call):
+        chain = _attribute_chain(call.func) or []
+        if isinstance(call.func, ast.Name) and call.func.id in self.functions:
+            if call.func.id not in self.calling:
+                self._call_function(self.functions[call.func.id], call)
+            return
+        kind = self.kinds.get(chain[0]) if len(chain) == 2 else None
+        if kind == 'controller':
+            self._controller_call(call, chain[1])
+            return
+        if kind == 'robotics.procedure' and chain[1] in ('new_pipette', 'remove_pipette'):
+            self._add(chain[1], call)
+            return
+        if isinstance(call.func, ast.Attribute) and call.func.attr in ROBOT_METHODS and self._kind(call.func.value) is None:
+            self._unresolved(call, f"`.{call.func.attr}()` is called on an object the check cannot follow")
+        elif kind != 'robotics.procedure' and not (isinstance(call.func, ast.Name) and hasattr(builtins, call.func.id)) and \
+                any(self._kind(arg) == 'controller' for arg in call.args + [keyword.value for keyword in call.keywords]):
+            self._unresolved(call, "the controller is passed to code the check cannot read")
+
+    def _call_function(self, function, call: ast.Call):
+        """Trace a helper defined in the script, its parameters bound to the modules and controller it is given."""
+        arguments = function.args.posonlyargs + function.args.args
+        given = dict(zip([argument.arg for argument in arguments], call.args))
+        given.update({keyword.arg: keyword.value for keyword in call.keywords if keyword.arg})
+        defaults = dict(zip([argument.arg for argument in arguments][len(arguments) - len(function.args.defaults):],
+                            function.args.defaults))
+        names = [argument.arg for argument in arguments + function.args.kwonlyargs]
+        outer = {name: self.kinds[name] for name in names if name in self.kinds}
+        for name in names:
+            kind = self._kind(given.get(name, defaults.get(name)))
+            if kind:
+                self.kinds[name] = kind
+            else:
+                self.kinds.pop(name, None)
+        self.calling.add(function.name)
+        self._statements(function.body)
+        self.calling.discard(function.name)
+        for name in names:
+            self.kinds.pop(name, None)
+        self.kinds.update(outer)
+
+    def _controller_call(self, call: ast.Call, method: str):
+        if method == 'set_output' and call.args:
+            name = self._constant(call.args[0])
+            value = self._constant(call.args[1]) if len(call.args) > 1 else UNKNOWN
+            target = self.alias.get(name, name) if isinstance(name, str) else UNKNOWN
+            self._add('output', call, target=target, value=bool(value) if value is not UNKNOWN else UNKNOWN)
+        elif method in ('aspirate_ml', 'dispense_ml'):
+            ml = self._constant(call.args[1]) if len(call.args) > 1 else UNKNOWN
+            self._add(method[:-len('_ml')], call, value=ml)
+        elif method in ('uncap', 'cap'):
+            self._add(method, call)
+        elif method == 'move_axis':
+            self._add('move', call, target=None, source='coordinates')
+
+    def _add(self, op: str, node, **fields):
+        operation = Operation(op, line=node.lineno, **fields)
+        for path in self.paths:
+            path.append(operation)
+
+    def _unresolved(self, node, problem: str):
+        message = f"Line {node.lineno}: {problem}; drive the robot through the controller from ro.system.init"
+        if message not in self.unresolved:
+            self.unresolved.append(message)
+
+    @staticmethod
+    def _constant(node):
+        try:
+            return ast.literal_eval(node)
+        except ValueError:
+            return UNKNOWN
+
+    def _source(self, node) -> tuple:
+        """(source, loca name) of a position expression."""
+        if isinstance(node, (ast.List, ast.Tuple)):
+            return 'coordinates', None
+        if isinstance(node, ast.Call):
+            chain = _attribute_chain(node.func) or []
+            if len(chain) == 2 and self.kinds.get(chain[0]) == 'controller' and chain[1] == 'uncap':
+                return 'coordinates', None  # the position uncap returns
+            return 'unknown', UNKNOWN
+        attributes, rack_status_key = [], False
+        while isinstance(node, (ast.Attribute, ast.Subscript)):
+            if isinstance(node, ast.Attribute):
+                attributes.append(node.attr)
+            elif isinstance(node.slice, ast.Constant) and node.slice.value == 'rack_status':
+                rack_status_key = True
+            node = node.value
+        if not isinstance(node, ast.Name):
+            return 'unknown', UNKNOWN
+        kind = self.kinds.get(node.id)
+        if kind == 'loca' and attributes:
+            return 'loca', attributes[-1]
+        if kind == 'rack_status' or (kind == 'robotics' and rack_status_key):
+            return 'rack_status', UNKNOWN
+        source, location = self.sources.get(node.id, ('unknown', UNKNOWN))
+        if source == 'rack_status' or (source == 'loca' and not attributes):
+            return source, location
+        return 'unknown', UNKNOWN
+
+
+OUTPUT = re.compile(r"set_output\('(\w+)', (True|False)\)")
+PUMP = re.compile(r"(aspirate|dispense)_ml\(.*, ([-+\d.eE]+)\)")
+
+
+def trace_from_steps(steps: List[dict], alias: Dict[str, str]) -> List[Operation]:
+    """Operations of a trace the simulator recorded (n9_sim SimResult.steps), e.g. for scripts with data-dependent loops."""
+    operations = []
+    for step in steps:
+        if step['kind'] == 'move':
+            location = step['location']
+            operations.append(Operation('move', target=location[0] if location else None,
+                                        source='loca' if location else 'coordinates'))
+            continue
+        name = step['name']
+        output, pump = OUTPUT.fullmatch(name), PUMP.fullmatch(name)
+        if output:
+            operations.append(Operation('output', target=alias.get(output.group(1), output.group(1)),
+                                        value=output.group(2) == 'True'))
+        elif pump:
+            operations.append(Operation(pump.group(1), value=float(pump.group(2))))
+        elif name.startswith('tool = '):
+            operations.append(Operation('tool', value=ast.literal_eval(name[len('tool = '):])))
+        elif name in ('uncap', 'cap'):
+            operations.append(Operation(name))
+        elif name in ('proc.new_pipette(c9)', 'proc.remove_pipette(c9)'):
+            operations.append(Operation(name[len('proc.'):-len('(c9)')]))
+    return operations
+
+
+class SafetyChecker:
+    def __init__(self, loca_fp: str = 'loca.py', rules: List[Rule] = None, transitions: List[Transition] = None,
+                 initial_state: dict = None, strict: bool = False):
+        """
+        Checks robot scripts against the physical rules of the N9 station.
+
+        Args:
+            loca_fp (str): Location definitions, for the set_output aliases
+            rules (List[Rule]): Preconditions, RULES by default
+            transitions (List[Transition]): State machine, TRANSITIONS by default
+            initial_state (dict): State before the script, INITIAL_STATE (the robot at rest) by default
+            strict (bool): Fail scripts that drive the robot in ways the trace cannot follow, e.g. through
+                           objects it cannot resolve; use it when the check gates execution
+        """
+        self.alias = _read_alias(loca_fp)
+        self.strict = strict
+        self.initial_state = dict(INITIAL_STATE, **(initial_state or {}))
+        self._rules, self._transitions = {}, {}
+        for rule in RULES if rules is None else rules:
+            self._rules.setdefault(rule.op, []).append(rule)
+        for transition in TRANSITIONS if transitions is None else transitions:
+            self._transitions.setdefault(transition.op, []).append(transition)
+        self._cache = {}  # code sha1 -> SafetyResult
+
+    def trace(self, code: str) -> List[Operation]:
+        """Robot operations of a script, in program order, without running it; the first path through its branches."""
+        return _TraceExtractor(self.alias).extract(ast.parse(code))[0]
+
+    def check(self, code: str) -> SafetyResult:
+        """Every path through the script's branches must follow the rules."""
+        key = hashlib.sha1(code.encode()).hexdigest()
+        if key not in self._cache:
+            extractor = _TraceExtractor(self.alias)
+            try:
+                paths = extractor.extract(ast.parse(code))
+            except SyntaxError as e:
+                return SafetyResult(False, [f"Syntax error on line {e.lineno}: {e.msg}"])
+            violations = []
+            for path in paths:
+                violations += [violation for violation in self.check_trace(path).violations if violation not in violations]
+            unchecked = extractor.unresolved
+            if self.strict:
+                violations += unchecked
+                unchecked = []
+            self._cache[key] = SafetyResult(not violations, violations, max(map(len, paths)), unchecked)
+        return self._cache[key]
+
+    def check_trace(self, operations: List[Operation]) -> SafetyResult:
+        state = dict(self.initial_state)
+        violations = []
+        for operation in operations:
+            for rule in self._rules.get(operation.op, ()):
+                if _matches(rule.when, operation, state) and not _meets(rule.requires, state):
+                    where = f"Line {operation.line}: " if operation.line else ""
+                    if f"{where}{rule.message}" not in violations:  # a loop body is traced twice
+                        violations.append(f"{where}{rule.message}")
+            for transition in self._transitions.get(operation.op, ()):
+                if _matches(transition.when, operation, state):
+                    for key, value in transition.sets.items():
+                        state[key] = operation.value if value is VALUE else operation.target if value is TARGET else value
+                    break
+        return SafetyResult(not violations, violations, len(operations))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("scripts", nargs="+")
+    parser.add_argument("--loca", default="loca.py")
+    parser.add_argument("--simulate", action="store_true", help="Also check the trace the simulator records")
+    args = parser.parse_args()
+
+    checker = SafetyChecker(args.loca)
+    for script in args.scripts:
+        with open(script, 'r') as script_f:
+            code = script_f.read()
+        start = time.perf_counter()
+        result = checker.check(code)
+        elapsed = time.perf_counter() - start
+        print(f"== {script} ({1000 * elapsed:.2f} ms)")
+        print(result.report())
+        if args.simulate:
+            from n9_sim import run_script
+            simulated = run_script(script)
+            print(f"simulated trace: {checker.check_trace(trace_from_steps(simulated.steps, checker.alias)).report()}")
@@ -0,0 +1,219 @@
+import ast
+import hashlib
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Set
+
+CODE_BLOCK = re.compile(r"```(\w*)\n(.*?)```", re.DOTALL)
+
+# Standard library modules the generated scripts may use besides the ones the operations file imports
+SAFE_MODULES = {"time", "math"}
+FORBIDDEN_CALLS = {"exec", "eval", "compile", "__import__", "open", "input"}
+HARDWARE_INIT = ("ro", "system", "init")
+
+
+@dataclass
+class AllowList:
+    modules: Set[str] = field(default_factory=set)
+    attributes: Dict[str, Set[str]] = field(default_factory=dict)  # object kind -> allowed attributes
+    hardware: Dict[str, str] = field(default_factory=dict)  # variable name -> hardware module, e.g. c9 -> controller
+    outputs: Set[str] = field(default_factory=set)  # valid names for c9.set_output
+
+
+@dataclass
+class ValidationResult:
+    ok: bool
+    errors: List[str] = field(default_factory=list)
+
+    def report(self) -> str:
+        if self.ok:
+            return "Static validation passed: imports and robot calls match the operations file."
+        return "Static validation failed:\n" + "\n".join(f"- {error}" for error in self.errors)
+
+
+def _attribute_chain(node):
+    """['ro', 'system', 'init'] for ro.system.init, None if the chain does not start at a name."""
+    chain = []
+    while isinstance(node, ast.Attribute):
+        chain.append(node.attr)
+        node = node.value
+    if isinstance(node, ast.Name):
+        chain.append(node.id)
+        return chain[::-1]
+    return None
+
+
+def _hardware_kind(value):
+    """'controller' for ro.system.init('controller'), else None."""
+    if (isinstance(value, ast.Call) and tuple(_attribute_chain(value.func) or ()) == HARDWARE_INIT
+            and value.args and isinstance(value.args[0], ast.Constant)):
+        return value.args[0].value
+    return None
+
+
+def _import_names(tree):
+    """Module names and the local names they are bound to."""
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                yield alias.name, alias.asname or alias.name.split('.')[0]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            for alias in node.names:
+                yield f"{node.module}.{alias.name}", alias.asname or alias.name
+
+
+def build_allow_list(operations_fp: str = 'n9_robot_operation_commands.py', loca_fp: str = 'loca.py') -> AllowList:
+    """
+    Extract what generated scripts may use from the operations file: its imports, the
+    attributes it uses on each module and hardware object, plus the public names in loca.py
+    and the air outputs (and their aliases) c9.set_output accepts.
+    """
+    with open(operations_fp, 'r') as operations_f:
+        operations = ast.parse(operations_f.read())
+    with open(loca_fp, 'r') as loca_f:
+        loca_tree = ast.parse(loca_f.read())
+
+    allow = AllowList(modules=set(SAFE_MODULES))
+    kinds = {}  # local name -> object kind
+    for module, local_name in _import_names(operations):
+        allow.modules.add(module)
+        kinds[local_name] = module
+    for node in ast.walk(operations):
+        if isinstance(node, ast.Assign) and _hardware_kind(node.value):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    allow.hardware[target.id] = _hardware_kind(node.value)
+                    kinds[target.id] = _hardware_kind(node.value)
+
+    for node in ast.walk(operations):
+        if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id in kinds:
+            allow.attributes.setdefault(kinds[node.value.id], set()).add(node.attr)
+    allow.attributes.setdefault("robotics", set()).update({"system", "runtime"})
+
+    loca_names = allow.attributes.setdefault("loca", set())
+    for node in loca_tree.body:
+        if isinstance(node, ast.Assign):
+            loca_names.update(target.id for target in node.targets if isinstance(target, ast.Name))
+        elif isinstance(node, ast.FunctionDef):
+            loca_names.add(node.name)
+        # air_output and alias are dict literals of the valid set_output names
+        if (isinstance(node, ast.Assign) and isinstance(node.value, ast.Dict)
+                and any(isinstance(target, ast.Name) and target.id in ("air_output", "alias") for target in node.targets)):
+            allow.outputs.update(key.value for key in node.value.keys if isinstance(key, ast.Constant))
+    allow.attributes["loca"] = {name for name in loca_names if not name.startswith('_')}
+    return allow
+
+
+class ScriptValidator:
+    def __init__(self, operations_fp: str = 'n9_robot_operation_commands.py', loca_fp: str = 'loca.py',
+                 location_index=None, safety_checker=None):
+        """
+        Fast local check of generated robot scripts against the operations file and loca.py.
+
+        Args:
+            operations_fp (str): The robot operations file given to the agents
+            loca_fp (str): Location definitions module
+            location_index (LocationIndex): Optional, also checks constant rack slots such as loca.vial_rack[1, 2]
+            safety_checker (SafetyChecker): Optional, also checks the script's operations against the physical rules
+        """
+        self.allow = build_allow_list(operations_fp, loca_fp)
+        self.location_index = location_index
+        self.safety_checker = safety_checker
+        self._cache = {}  # code sha1 -> ValidationResult, the selector and the reviewer check the same code
+
+    def validate_message(self, content: str) -> ValidationResult:
+        """Validate the single python code block in an agent message."""
+        blocks = [code for lang, code in CODE_BLOCK.findall(content or "") if lang.lower() in ("python", "py", "")]
+        if len(blocks) != 1:
+            return ValidationResult(False, [f"Expected exactly one python code block, found {len(blocks)}"])
+        return self.validate(blocks[0])
+
+    def validate(self, code: str) -> ValidationResult:
+        key = hashlib.sha1(code.encode()).hexdigest()
+        if key not in self._cache:
+            self._cache[key] = self._validate(code)
+        return self._cache[key]
+
+    def _validate(self, code: str) -> ValidationResult:
+        try:
+            tree = ast.parse(code)
+        except SyntaxError as e:
+            return ValidationResult(False, [f"Syntax error on line {e.lineno}: {e.msg}"])
+
+        errors = []
+        kinds = {}  # local name -> object kind, from the script's own imports and ro.system.init calls
+        for module, local_name in _import_names(tree):
+            if module not in self.allow.modules and module.split('.')[0] not in self.allow.modules:
+                errors.append(f"Import of '{module}' is not allowed")
+            kinds[local_name] = module
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Assign) and _hardware_kind(node.value):
+                kind = _hardware_kind(node.value)
+                if kind not in self.allow.hardware.values():
+                    errors.append(f"Line {node.lineno}: unknown hardware module '{kind}'")
+                for target in node.targets:
+                    if isinstance(target, ast.Name):
+                        kinds[target.id] = kind
+
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id in kinds:
+                kind = kinds[node.value.id]
+                allowed = self.allow.attributes.get(kind)
+                if allowed is not None and node.attr not in allowed:
+                    errors.append(f"Line {node.lineno}: '{node.value.id}.{node.attr}' is not an approved {kind} operation")
+            elif isinstance(node, ast.Call):
+                chain = _attribute_chain(node.func) or []
+                if isinstance(node.func, ast.Name) and node.func.id in FORBIDDEN_CALLS:
+                    errors.append(f"Line {node.lineno}: call to '{node.func.id}' is not allowed")
+                elif (len(chain) == 2 and chain[1] == "set_output" and kinds.get(chain[0]) == "controller"
+                      and node.args and isinstance(node.args[0], ast.Constant)
+                      and node.args[0].value not in self.allow.outputs):
+                    errors.append(f"Line {node.lineno}: unknown output '{node.args[0].value}' for set_output")
+            elif isinstance(node, ast.Subscript) and self.location_index is not None:
+                error = self._check_slot(node, kinds)
+                if error:
+                    errors.append(f"Line {node.lineno}: {error}")
+
+        for name, kind in self.allow.hardware.items():
+            if name not in kinds and any(isinstance(node, ast.Name) and node.id == name for node in ast.walk(tree)):
+                errors.append(f"'{name}' is used but never initialised with ro.system.init('{kind}')")
+
+        if self.safety_checker is not None:
+            errors += self.safety_checker.check(code).violations
+
+        return ValidationResult(not errors, errors)
+
+    def _check_slot(self, node: ast.Subscript, kinds: dict):
+        """Error for a constant rack slot outside the rack, e.g. loca.vial_rack[20, 0]."""
+        target = node.value
+        if not (isinstance(target, ast.Attribute) and isinstance(target.value, ast.Name)
+                and kinds.get(target.value.id) == "loca" and target.attr in self.location_index):
+            return None
+        index = node.slice.elts if isinstance(node.slice, ast.Tuple) else [node.slice]
+        if not all(isinstance(i, ast.Constant) and isinstance(i.value, int) for i in index):
+            return None
+        shape = self.location_index.shape(target.attr)
+        index = tuple(i.value for i in index)
+        if len(index) != len(shape) or any(not 0 <= i < n for i, n in zip(index, shape)):
+            return f"loca.{target.attr}{list(index)} is outside the rack, its shape is {shape}"
+        return None
+
+
+class StaticReview:
+    def __init__(self, validator: ScriptValidator):
+        """
+        Adds the static validation findings for the latest code block to an agent's
+        context, so the LLM reviewer sees them next to the code.
+        """
+        self.validator = validator
+
+    def add_to_agent(self, agent):
+        agent.register_hook(hookable_method="process_all_messages_before_reply", hook=self._add_findings)
+
+    def _add_findings(self, messages: list[dict]) -> list[dict]:
+        for message in reversed(messages):
+            content = message.get("content")
+            if isinstance(content, str) and "```" in content:
+                result = self.validator.validate_message(content)
+                return messages + [{"role": "user", "name": "static_validator", "content": result.report()}]
+        return messages
@@ -0,0 +1,126 @@
+import re
+
+PDF_REFERENCE = re.compile(r"\.pdf\b|\bpdf\b|\bmanuscript\b|\bpaper\b|\bpublication\b", re.IGNORECASE)
+CODE_BLOCK = re.compile(r"```")
+APPROVAL = re.compile(r"\b(looks good|lgtm|approved?|no (further )?(changes|corrections|issues)( are)?( needed| required)?|"
+                      r"is correct|ready (to|for) (run|execut))", re.IGNORECASE)
+CORRECTION = re.compile(r"\b(should|must|incorrect|missing|replace|instead|error|fix|not (allowed|approved|defined|exist))",
+                        re.IGNORECASE)
+
+
+class RuleBasedSpeakerSelector:
+    def __init__(self, admin, writer, reviewer, scraper=None, fallback: str = "auto", code_check=None):
+        """
+        Deterministic speaker transitions for the SDL group chat, used as the GroupChat
+        `speaker_selection_method`:
+
+            admin -> scraper (only when the task references a PDF) -> writer
+            writer (code) -> reviewer -> writer (corrections) | admin (approved)
+            writer (code passing `code_check`) -> admin
+            tool call -> the agent that executes it -> back to the caller
+
+        Whenever no rule applies the `fallback` method (the LLM based 'auto') picks the speaker.
+
+        Args:
+            admin, writer, reviewer, scraper: The group chat agents, scraper is optional
+            fallback (str): Speaker selection method used when the rules are ambiguous
+            code_check: Optional `callable(content) -> bool`. When it passes the writer's code,
+                        the reviewer's turn is skipped and the admin speaks next
+        """
+        self.admin = admin
+        self.writer = writer
+        self.reviewer = reviewer
+        self.scraper = scraper
+        self.fallback = fallback
+        self.code_check = code_check
+        self.rule_selections = 0
+        self.fallback_selections = 0
+        self.reviews_skipped = 0
+
+    @property
+    def avoided_llm_calls(self) -> int:
+        """Selections made by the rules, i.e. LLM selection calls not made."""
+        return self.rule_selections if self.fallback == "auto" else 0
+
+    def report(self) -> str:
+        return (f"Speaker selection: {self.rule_selections} by rules, {self.fallback_selections} by '{self.fallback}', "
+                f"{self.avoided_llm_calls} LLM selection calls avoided, {self.reviews_skipped} reviews skipped")
+
+    def reset_stats(self):
+        self.rule_selections = 0
+        self.fallback_selections = 0
+        self.reviews_skipped = 0
+
+    def __call__(self, last_speaker, groupchat):
+        speaker = self.select(last_speaker, groupchat)
+        if speaker is None:
+            self.fallback_selections += 1
+            return self.fallback
+        self.rule_selections += 1
+        return speaker
+
+    def select(self, last_speaker, groupchat):
+        """The next speaker according to the rules, or None when they do not decide."""
+        if not groupchat.messages:
+            return None
+        last_message = groupchat.messages[-1]
+        content = last_message.get("content") or ""
+        if not isinstance(content, str):
+            content = str(content)
+
+        # Tool calls go to the one agent that can execute them, results go back to the caller
+        if last_message.get("tool_calls") or last_message.get("function_call"):
+            return self._executor(last_message, groupchat)
+        if last_message.get("tool_responses") or last_message.get("role") == "tool":
+            return self._tool_caller(groupchat)
+
+        if last_speaker is self.admin:
+            if self._needs_scraper(groupchat):
+                return self.scraper
+            return self.writer
+        if self.scraper is not None and last_speaker is self.scraper:
+            return self.writer
+        if last_speaker is self.writer:
+            if CODE_BLOCK.search(content):
+                if self.code_check is not None and self.code_check(content):
+                    self.reviews_skipped += 1
+                    return self.admin
+                return self.reviewer
+            if content.rstrip().endswith("?"):
+                return self.admin  # the writer needs information from the user
+            return None
+        if last_speaker is self.reviewer:
+            approved = APPROVAL.search(content) is not None
+            corrections = CORRECTION.search(content) is not None or CODE_BLOCK.search(content) is not None
+            if approved and not corrections:
+                return self.admin
+            if corrections and not approved:
+                return self.writer
+            return None
+        return None
+
+    def _executor(self, message, groupchat):
+        funcs = []
+        if message.get("function_call"):
+            funcs.append(message["function_call"]["name"])
+        funcs += [tool["function"]["name"] for tool in message.get("tool_calls") or [] if tool.get("type") == "function"]
+        agents = [agent for agent in groupchat.agents if agent.can_execute_function(funcs)]
+        return agents[0] if len(agents) == 1 else None
+
+    def _tool_caller(self, groupchat):
+        for message in reversed(groupchat.messages[:-1]):
+            if message.get("tool_calls") or message.get("function_call"):
+                name = message.get("name")
+                return groupchat.agent_by_name(name) if name in groupchat.agent_names else None
+        return None
+
+    def _needs_scraper(self, groupchat) -> bool:
+        """The latest admin message references a PDF and the scraper has not answered it yet."""
+        if self.scraper is None:
+            return False
+        for message in reversed(groupchat.messages):
+            if message.get("name") == self.scraper.name:
+                return False
+            if message.get("name") == self.admin.name:
+                return PDF_REFERENCE.search(message.get("content") or "") is not None
+        return False
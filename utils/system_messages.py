@@ -8,4 +8,15 @@ When using code, you must indicate the script type in the code block. The user c
 If you want the user to save the code in a file before executing it, put # filename: <filename> inside the code block as the first line. Don't include multiple code blocks in one response. Do not ask users to copy and paste the result. Instead, use 'print' function for the output when relevant. Check the execution result returned by the user.
 If the result indicates there is an error, fix the error and output the code again. Suggest the full code instead of partial code or code changes. If the error can't be fixed or if the task is not solved even after the code is executed successfully, analyze the problem, revisit your assumption, collect additional info you need, and think of a different approach to try.
 When you find an answer, verify the answer carefully. Include verifiable evidence in your response if possible.
-Reply "TERMINATE" in the end when everything is done."""
\ No newline at end of file
+Reply "TERMINATE" in the end when everything is done."""
+
+code_reviewer_system_message = """Your task is to review the code provided by the code writer agent and provide feedback on necessary corrections. Ensure that all required libraries are imported, and only the existing, approved operation functions are used.The only allowed libraries and operating functions are provided in the reference above."""
+
+
+def polybot_reference(polybot_file: str) -> str:
+    """
+    Static prefix shared by the writer and reviewer system messages. It must come first and
+    be byte-identical for both agents so the provider can serve it from its prompt cache.
+    """
+    return ("Reference: the only allowed libraries and robot operation functions, as defined in the robot operations file:\n"
+            f"```python\n{polybot_file}\n```\n\n")
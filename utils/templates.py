@@ -0,0 +1,338 @@
+"""
+Library of parameterized robot scripts from successful chats. A prompt that matches a
+known intent is answered locally: the template is filled with the prompt's solution
+labels and rack indices, validated and returned without any LLM call.
+
+From the repository root:
+    python -m utils.templates --add polybot_screenshots_run/move_vial_to_clamp.py \
+        --prompt "Write the code to move the vial with polymer A to the clamp."
+    python -m utils.templates --match "Move the vial with NaCl to the clamp"
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import string
+import threading
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+INDEX_PAIR = re.compile(r"\[\s*(\d+)\s*,\s*(\d+)\s*\]")
+
+
+def _display(label: str) -> str:
+    """How a label is written in prompts and comments: 'polymer_A' -> 'polymer a'."""
+    return re.sub(r"[\s_]+", " ", label).strip().lower()
+
+
+def _mentions(text: str, vocabulary) -> List[str]:
+    """Vocabulary labels mentioned in `text`, in order of appearance, longest match first."""
+    normalized = " " + re.sub(r"[\s_]+", " ", text).lower() + " "
+    found = []
+    for label in sorted(vocabulary, key=len, reverse=True):
+        for match in re.finditer(r"(?<![\w/])" + re.escape(_display(label)) + r"(?![\w/])", normalized):
+            if not any(start <= match.start() < end for _, start, end in found):
+                found.append((label, match.start(), match.end()))
+    return [label for label, _, _ in sorted(found, key=lambda item: item[1])]
+
+
+# Prompt phrases of the loca locations tasks move things between; the longest phrase wins
+PLACES = {
+    'clamp': ('clamp', 'clamp holder', 'vial clamp'),
+    'vial_rack': ('vial rack', 'vial holder', 'vial tray', 'holder', 'rack of vials'),
+    's_coater': ('coater', 'coating station', 'coating stage', 'coater stage', 'spin coater'),
+    'substrate_rack_seq': ('substrate rack', 'substrate holder', 'substrate tray'),
+    'substrate_rack_PDMS_seq': ('pdms rack', 'pdms substrate rack'),
+    'pipette_rack': ('pipette rack', 'tip rack'),
+    'cooking_rack': ('cooking rack',),
+    'annealing_block_seq': ('annealing block', 'annealing station'),
+    'probe_seq': ('probe', 'probe station'),
+    'spect_tower_seq': ('spectrometer', 'spect tower'),
+    'camera_actuator': ('camera',),
+}
+VERBS = {
+    'move': ('move', 'bring', 'transfer', 'take', 'put', 'place', 'carry', 'transport', 'load', 'pick up'),
+    'return': ('return', 'put back', 'bring back', 'place back', 'move back', 'take back'),
+    'uncap': ('uncap', 'decap', 'open the vial'),
+    'cap': ('recap', 'close the vial'),
+    'coat': ('coat', 'spin coat', 'blade coat'),
+    'dispense': ('dispense', 'pipette onto'),
+    'aspirate': ('aspirate', 'draw'),
+}
+OBJECTS = {
+    'vial': ('vial', 'vials', 'bottle'),
+    'substrate': ('substrate', 'substrates', 'slide', 'wafer'),
+    'film': ('film', 'films'),
+    'pipette': ('pipette', 'pipettes', 'tip', 'tips'),
+    'gripper': ('gripper', 'arm', 'robot'),
+}
+FROM = ('from', 'off', 'of')  # 'of' as in 'out of'
+TO = ('to', 'onto', 'into', 'in', 'on', 'at', 'towards', 'toward', 'inside')
+SKIP = ('the', 'a', 'an', 'its', 'their', 'back')
+NEGATIONS = ('not', 'no', 'never', 'without', 'except', 'instead', 'dont', 'avoid', 'unless')
+
+
+def _phrases(table: dict) -> list:
+    """(words, canonical name) of a synonym table, longest phrase first."""
+    return sorted(((tuple(phrase.split()), name) for name, phrases in table.items() for phrase in phrases),
+                  key=lambda item: len(item[0]), reverse=True)
+
+
+def _find(words: list, table: dict, taken: set) -> list:
+    """(position, length, name) of the table's phrases in `words`, skipping positions in `taken`."""
+    found = []
+    for phrase, name in _phrases(table):
+        for i in range(len(words) - len(phrase) + 1):
+            span = set(range(i, i + len(phrase)))
+            if tuple(words[i:i + len(phrase)]) == phrase and not span & taken:
+                found.append((i, len(phrase), name))
+                taken |= span
+    return sorted(found)
+
+
+def task_action(intent: str, locations=()) -> Optional[dict]:
+    """
+    The structured task of a prompt's intent (see TemplateLibrary._intent): its verbs in order, the
+    object moved and the loca names it moves from and to. `locations` are further loca names a prompt
+    may use as is. None when the prompt is negated or its places are missing or ambiguous; such
+    prompts are never answered from a template.
+    """
+    words = re.findall(r"\{\w+\}|[a-z0-9]+", intent.lower().replace("n't", " not").replace("_", " "))
+    if any(word in NEGATIONS for word in words):
+        return None
+    taken = set()
+    # multi-word loca names only, single words like 'substrate' are what prompts move around
+    named = {name: (name.replace("_", " ").lower(),) for name in locations if "_" in name and not name.startswith("_")}
+    places = _find(words, {**named, **PLACES}, taken)
+    verbs = _find(words, VERBS, taken)
+    objects = _find(words, OBJECTS, taken)
+    action = {'verbs': [name for _, _, name in verbs], 'object': objects[0][2] if objects else None,
+              'source': None, 'destination': None}
+    for i, _, name in places:
+        j = i - 1
+        while j >= 0 and words[j] in SKIP:
+            j -= 1
+        role = 'source' if j >= 0 and words[j] in FROM else 'destination' if j >= 0 and words[j] in TO else None
+        if role is None or action[role] is not None:
+            return None
+        action[role] = name
+    if not action['verbs'] or not places:
+        return None
+    return action
+
+
+class HashingEmbeddings:
+    """
+    Local embeddings of word and character 3-gram counts hashed into a fixed size vector, for
+    matching prompts offline. Any langchain `Embeddings` (e.g. llms.ANLEmbeddingModel) can be
+    used instead.
+    """
+    name = "hashing-512"
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim)
+        words = re.findall(r"[a-z0-9{}]+", text.lower())
+        grams = words + [word[i:i + 3] for word in words for i in range(max(len(word) - 2, 1))]
+        for gram in grams:
+            digest = hashlib.md5(gram.encode()).digest()
+            vector[int.from_bytes(digest[:4], 'little') % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+@dataclass
+class ScriptTemplate:
+    intent: str  # prompt with its slot values replaced by {slot} markers
+    code: str  # string.Template source, ${slot} is the value, ${slot__text} its display form
+    slots: Dict[str, str]  # slot name -> 'label' or 'index'
+    examples: List[str] = field(default_factory=list)  # prompts the template was learned from
+    uses: int = 0
+    action: Optional[dict] = None  # task_action of the intent, prompts must have exactly this one
+
+
+@dataclass
+class TemplateMatch:
+    template: ScriptTemplate
+    score: float
+    values: dict
+    code: str
+
+
+class TemplateLibrary:
+    def __init__(self, path: str, vocabulary=None, embeddings=None, threshold: float = 0.9, validator=None,
+                 locations=()):
+        """
+        Templates are keyed on the task a prompt states (task_action: verbs, object, source and
+        destination), which must match exactly; the embedding similarity only ranks the templates
+        of that task.
+
+        Args:
+            path (str): JSON file the templates are kept in, created on the first save
+            vocabulary: Callable returning the solution labels prompts may mention (rack_status labels)
+            embeddings: langchain style embeddings, HashingEmbeddings() by default
+            threshold (float): Minimum cosine similarity between the prompt's intent and a template's
+            validator (ScriptValidator): Instantiated scripts must pass it, templates are only learned from passing code
+            locations: loca names prompts may mention as is, e.g. LocationIndex.names, besides PLACES
+        """
+        self.path = path
+        self.vocabulary = vocabulary or (lambda: [])
+        self.locations = list(locations)
+        self.embeddings = embeddings or HashingEmbeddings()
+        self.threshold = threshold
+        self.validator = validator
+        self._lock = threading.Lock()
+        self.templates: Dict[str, ScriptTemplate] = {}
+        self._vectors = None  # (n_templates, dim), rows in self.templates order
+        if os.path.exists(path):
+            with open(path, 'r') as library_f:
+                stored = json.load(library_f)
+            self.templates = {item['intent']: ScriptTemplate(**item) for item in stored.get('templates', [])}
+        for template in self.templates.values():
+            if template.action is None:  # learned before templates were keyed on the task
+                template.action = task_action(template.intent, self.locations)
+
+    def _intent(self, prompt: str, labels: List[str]) -> str:
+        """The prompt with labels and rack indices replaced by slot markers."""
+        intent = re.sub(r"[\s_]+", " ", prompt).strip().lower()
+        for label in labels:
+            intent = re.sub(r"(?<![\w/])" + re.escape(_display(label)) + r"(?![\w/])", "{label}", intent)
+        return INDEX_PAIR.sub("{index}", intent)
+
+    def _index_vectors(self) -> np.ndarray:
+        if self._vectors is None:
+            intents = list(self.templates)
+            self._vectors = np.asarray(self.embeddings.embed_documents(intents)) if intents else np.zeros((0, 1))
+        return self._vectors
+
+    def add(self, prompt: str, code: str) -> Optional[ScriptTemplate]:
+        """
+        Learn a template from a prompt and the script that solved it. The solution labels and
+        rack indices the prompt mentions become slots. Returns None when the code does not
+        pass the validator or the prompt states no clear task (see task_action).
+        """
+        labels = _mentions(prompt, self.vocabulary())
+        intent = self._intent(prompt, labels)
+        action = task_action(intent, self.locations)
+        if action is None:
+            return None
+        if self.validator is not None and not self.validator.validate(code).ok:
+            return None
+        source = code.replace("$", "$$")
+        slots = {}
+        for i, label in enumerate(dict.fromkeys(labels)):
+            name = f"label{i}"
+            quoted = re.compile(r"(['\"])" + re.escape(label) + r"\1")
+            if not quoted.search(source):
+                continue  # mentioned, but the script finds it another way
+            source = quoted.sub(f"${{{name}}}", source)
+            source = re.sub(r"(?i)(?<![\w/])" + re.escape(label.replace("_", " ")) + r"(?![\w/])",
+                            f"${{{name}__text}}", source)
+            slots[name] = 'label'
+        for i, (row, col) in enumerate(dict.fromkeys(INDEX_PAIR.findall(prompt))):
+            pair = re.compile(r"\[\s*" + row + r"\s*,\s*" + col + r"\s*\]")
+            if pair.search(source):
+                source = pair.sub(f"[${{index{i}}}]", source)
+                slots[f"index{i}"] = 'index'
+
+        with self._lock:
+            previous = self.templates.get(intent)
+            examples = (previous.examples if previous else [])[-4:] + [prompt]
+            template = self.templates[intent] = ScriptTemplate(intent, source, slots, examples, action=action)
+            self._vectors = None
+            self._save()
+        return template
+
+    def match(self, prompt: str) -> Optional[TemplateMatch]:
+        """The best template for the prompt, filled and validated, or None to fall back to the agents."""
+        if not self.templates:
+            return None
+        labels = _mentions(prompt, self.vocabulary())
+        intent = self._intent(prompt, labels)
+        action = task_action(intent, self.locations)
+        if action is None:
+            return None
+        with self._lock:
+            templates = list(self.templates.values())
+            same_task = [i for i, template in enumerate(templates) if template.action == action]
+            if not same_task:
+                return None
+            vectors = self._index_vectors()[same_task]
+        templates = [templates[i] for i in same_task]
+        query = np.asarray(self.embeddings.embed_query(intent))
+        scores = vectors @ query / (np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query) or 1.0) + 1e-12)
+        for i in np.argsort(-scores):
+            if scores[i] < self.threshold:
+                break
+            filled = self._fill(templates[i], prompt, labels)
+            if filled is not None:
+                templates[i].uses += 1
+                return TemplateMatch(templates[i], float(scores[i]), *filled)
+        return None
+
+    def _fill(self, template: ScriptTemplate, prompt: str, labels: List[str]):
+        label_slots = [name for name, kind in template.slots.items() if kind == 'label']
+        index_slots = [name for name, kind in template.slots.items() if kind == 'index']
+        labels = list(dict.fromkeys(labels))
+        indices = list(dict.fromkeys(INDEX_PAIR.findall(prompt)))
+        if len(labels) != len(label_slots) or len(indices) != len(index_slots):
+            return None  # the prompt does not say exactly what the slots need
+        values = dict(zip(label_slots, labels))
+        values.update({name: f"{row}, {col}" for name, (row, col) in zip(index_slots, indices)})
+        substitutions = {name: (repr(value) if template.slots[name] == 'label' else value)
+                         for name, value in values.items()}
+        substitutions.update({f"{name}__text": labels[i].replace("_", " ") for i, name in enumerate(label_slots)})
+        try:
+            code = string.Template(template.code).substitute(substitutions)
+        except (KeyError, ValueError):
+            return None
+        if self.validator is not None and not self.validator.validate(code).ok:
+            return None
+        return values, code
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as library_f:
+            json.dump({'templates': [asdict(template) for template in self.templates.values()]}, library_f, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+def rack_status_vocabulary(rack_status_fp: str = 'rack_status.py'):
+    """Labels of the vial and cooking racks, e.g. TemplateLibrary(path, vocabulary=rack_status_vocabulary())."""
+    def vocabulary():
+        from utils.inventory_store import load_rack_status
+        racks = load_rack_status(rack_status_fp)
+        return sorted({cell for rack in ('vial', 'cooking') if rack in racks
+                       for cell in racks[rack].to_numpy().ravel().tolist() if isinstance(cell, str)})
+    return vocabulary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--library", default="script_templates.json")
+    parser.add_argument("--add", help="Script to learn a template from, with --prompt")
+    parser.add_argument("--prompt")
+    parser.add_argument("--match", help="Prompt to answer from the library")
+    args = parser.parse_args()
+
+    from utils.script_validator import ScriptValidator
+    library = TemplateLibrary(args.library, vocabulary=rack_status_vocabulary(), validator=ScriptValidator())
+    if args.add:
+        with open(args.add, 'r') as script_f:
+            template = library.add(args.prompt, script_f.read())
+        print(f"learned '{template.intent}' with slots {template.slots}" if template else "script failed validation")
+    if args.match:
+        found = library.match(args.match)
+        if found is None:
+            print("no template, the agents would write this one")
+        else:
+            print(f"# '{found.template.intent}' (similarity {found.score:.2f}), slots {found.values}")
+            print(found.code)
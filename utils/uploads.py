@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+CHUNK_SIZE = 1024 * 1024  # 1 MiB
+
+
+class UploadStore:
+    def __init__(self, workdir: str, on_new_file=None):
+        """
+        Copies uploaded files into `workdir` without loading them into memory and
+        deduplicates them by SHA-256 content hash.
+
+        Args:
+            workdir (str): Folder the agents read uploaded files from
+            on_new_file: Optional `callback(path)` run on a background thread for every
+                         new content, e.g. to extract and index its text ahead of the first use
+        """
+        self.workdir = workdir
+        self.on_new_file = on_new_file
+        self.index_fp = os.path.join(workdir, '.uploads.json')
+        self._lock = threading.Lock()
+        self._background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="upload-indexer")
+
+        self.by_hash = {}  # sha256 -> filename in workdir
+        if os.path.exists(self.index_fp):
+            with open(self.index_fp, 'r') as index_f:
+                self.by_hash = json.load(index_f)
+
+    def _save_index(self):
+        tmp_fp = self.index_fp + '.tmp'
+        with open(tmp_fp, 'w') as index_f:
+            json.dump(self.by_hash, index_f, indent=1)
+        os.replace(tmp_fp, self.index_fp)
+
+    @staticmethod
+    def _hash_file(path: str) -> str:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    @staticmethod
+    def _copy_hashing(src: str, dest: str) -> str:
+        """Chunked copy that computes the content hash in the same pass."""
+        sha = hashlib.sha256()
+        with open(src, 'rb') as src_f, open(dest, 'wb') as dest_f:
+            for chunk in iter(lambda: src_f.read(CHUNK_SIZE), b''):
+                sha.update(chunk)
+                dest_f.write(chunk)
+        return sha.hexdigest()
+
+    def _forget(self, filename: str):
+        """Drop the index entries of `filename`, whose content is about to be replaced."""
+        for sha in [sha for sha, known in self.by_hash.items() if known == filename]:
+            del self.by_hash[sha]
+
+    def _stored_copy(self, sha: str):
+        """Filename holding content `sha` in workdir, None if it was removed or overwritten since."""
+        known = self.by_hash.get(sha)
+        if known is None:
+            return None
+        known_fp = os.path.join(self.workdir, known)
+        if os.path.exists(known_fp) and self._hash_file(known_fp) == sha:
+            return known
+        del self.by_hash[sha]
+        return None
+
+    def save(self, src_path: str, filename: str = None):
+        """
+        Store an uploaded file.
+
+        Args:
+            src_path (str): Path of the uploaded (temporary) file
+            filename (str): Name to store it under, defaults to the basename of `src_path`
+
+        Returns:
+            tuple: (path in workdir, sha256, True if the content was already uploaded)
+        """
+        filename = os.path.basename(filename or src_path)
+        dest = os.path.join(self.workdir, filename)
+        # A temp file of its own, concurrent uploads of the same name must not share one
+        fd, tmp_dest = tempfile.mkstemp(dir=self.workdir, prefix='.upload-', suffix='.part')
+        os.close(fd)
+        try:
+            # Always a copy: the caller's temp file may still change, e.g. be reused by Gradio
+            sha = self._copy_hashing(src_path, tmp_dest)
+            with self._lock:
+                known = self._stored_copy(sha)
+                duplicate = known is not None
+                if known == filename:
+                    return dest, sha, True
+
+                self._forget(filename)
+                if duplicate:
+                    # Same content under a new name: link to the stored copy so cached text is reused.
+                    # Stored copies are only ever replaced, never written in place, so the link stays valid
+                    if os.path.exists(dest):
+                        os.remove(dest)
+                    try:
+                        os.link(os.path.join(self.workdir, known), dest)
+                    except OSError:
+                        shutil.copyfile(os.path.join(self.workdir, known), dest)
+                else:
+                    os.replace(tmp_dest, dest)
+                    self.by_hash[sha] = filename
+                self._save_index()
+        finally:
+            if os.path.exists(tmp_dest):
+                os.remove(tmp_dest)
+
+        if self.on_new_file is not None and not duplicate:
+            self._background.submit(self._warm, dest)
+        return dest, sha, duplicate
+
+    def _warm(self, path: str):
+        try:
+            self.on_new_file(path)
+        except Exception as e:
+            print(f"Background processing of {path} failed: {e}")
+
@@ -0,0 +1,461 @@
+"""
+Code executor backed by warm Python workers. Each worker imports numpy, pandas, robotics
+and loca once; a run only forks it (POSIX) and executes the script in a fresh namespace,
+instead of starting an interpreter and importing everything again as
+LocalCommandLineCodeExecutor does for every code block.
+
+Latency of one execution round, from the repository root:
+    python -m utils.warm_executor --scripts polybot_screenshots_run --repeat 5
+"""
+import argparse
+import builtins
+import glob
+import hashlib
+import importlib
+import multiprocessing
+import os
+import queue
+import random
+import select
+import shutil
+import signal
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import List
+
+from autogen.code_utils import PYTHON_VARIANTS, TIMEOUT_MSG
+from autogen.coding import CodeBlock, LocalCommandLineCodeExecutor, MarkdownCodeExtractor
+from autogen.coding.base import CommandLineCodeResult
+from autogen.coding.utils import _get_file_name_from_content
+
+# Imported by every worker before its first run, in this order. Missing ones are skipped,
+# the script then fails on its own import as it would in a fresh interpreter.
+DEFAULT_PRELOAD = ('numpy', 'pandas', 'robotics', 'robotics.procedure', 'loca', 'rack_status')
+TIMEOUT_EXIT_CODE = 124  # same as LocalCommandLineCodeExecutor and the timeout command
+
+
+# -- worker process
+
+def _preload(modules, work_dir: str) -> dict:
+    """Import `modules`, returns the ones loaded from `work_dir` -> mtime of their file."""
+    local = {}
+    for name in modules:
+        try:
+            module = importlib.import_module(name)
+        except Exception:
+            continue
+        module_fp = getattr(module, '__file__', None) or ''
+        if os.path.dirname(os.path.abspath(module_fp)) == work_dir:
+            local[name] = os.stat(module_fp).st_mtime_ns
+    return local
+
+
+def _refresh(local: dict, modules, work_dir: str) -> dict:
+    """Import loca.py and rack_status.py again when they changed in the work dir since the last run."""
+    changed = False
+    for name, mtime in local.items():
+        module_fp = getattr(sys.modules.get(name), '__file__', None)
+        changed |= module_fp is None or not os.path.exists(module_fp) or os.stat(module_fp).st_mtime_ns != mtime
+    if not changed:
+        return local
+    for name in local:
+        sys.modules.pop(name, None)
+    importlib.invalidate_caches()
+    return _preload([name for name in modules if name in local], work_dir)
+
+
+def _execute(script_fp: str) -> int:
+    """Run a script file as __main__ in a fresh namespace, returns its exit code."""
+    with open(script_fp, 'r', encoding='utf-8') as script_f:
+        source = script_f.read()
+    namespace = {'__name__': '__main__', '__file__': script_fp, '__builtins__': builtins}
+    sys.argv = [script_fp]
+    try:
+        exec(compile(source, script_fp, 'exec'), namespace)
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code, file=sys.stderr)
+        return 1
+    except BaseException:
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+def _apply_limits(limits: dict):
+    import resource
+    if limits.get('memory_mb'):
+        size = int(limits['memory_mb']) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (size, size))
+    if limits.get('cpu_s'):
+        cpu_s = int(limits['cpu_s']) + 1
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_s, cpu_s + 1))
+    if limits.get('file_mb'):
+        size = int(limits['file_mb']) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_FSIZE, (size, size))
+
+
+def _run_forked(runner, script_fp: str, timeout: float, limits: dict, max_output: int):
+    """Run the script in a fork of this worker, so the worker's modules stay untouched."""
+    read_fd, write_fd = os.pipe()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        exit_code = 1
+        try:
+            os.close(read_fd)
+            os.setpgid(0, 0)  # the timeout kills whatever the script started too
+            os.dup2(write_fd, 1)
+            os.dup2(write_fd, 2)
+            random.seed()
+            if 'numpy' in sys.modules:
+                sys.modules['numpy'].random.seed()
+            _apply_limits(limits)
+            exit_code = runner(script_fp)
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)
+
+    os.close(write_fd)
+    chunks, size, timed_out = [], 0, False
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([read_fd], [], [], remaining)[0]:
+                timed_out = True
+                break
+            chunk = os.read(read_fd, 65536)
+            if not chunk:
+                break
+            if size < max_output:
+                chunks.append(chunk)
+            size += len(chunk)
+    finally:
+        os.close(read_fd)
+    if timed_out:
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    _, status = os.waitpid(pid, 0)
+    output = b''.join(chunks)[:max_output].decode('utf-8', errors='replace')
+    if size > max_output:
+        output += f"\n... {size - max_output} more bytes of output dropped"
+    if timed_out:
+        return TIMEOUT_EXIT_CODE, output + "\n" + TIMEOUT_MSG
+    return os.waitstatus_to_exitcode(status), output
+
+
+def _run_inline(runner, script_fp: str, max_output: int):
+    """Without fork (Windows) the run happens in the worker itself, which is retired afterwards."""
+    import contextlib
+    import io
+    captured = io.StringIO()
+    with contextlib.redirect_stdout(captured), contextlib.redirect_stderr(captured):
+        exit_code = runner(script_fp)
+    return exit_code, captured.getvalue()[:max_output]
+
+
+def _worker_main(conn, work_dir: str, preload, limits: dict, max_output: int, initializer, runner):
+    os.chdir(work_dir)
+    sys.path.insert(0, work_dir)  # where `python script.py` would look for loca and rack_status first
+    if initializer is not None:
+        initializer()
+    runner = runner or _execute
+    local = _preload(preload, work_dir)
+    conn.send('ready')
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        script_fp, timeout = request
+        if hasattr(os, 'fork'):
+            local = _refresh(local, preload, work_dir)
+            conn.send(_run_forked(runner, script_fp, timeout, limits, max_output))
+        else:
+            conn.send(_run_inline(runner, script_fp, max_output))
+            return
+
+
+# -- pool
+
+class _Worker:
+    def __init__(self, context, work_dir: str, preload, limits: dict, max_output: int, initializer=None, runner=None):
+        self.conn, worker_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, name='warm-executor', daemon=True,
+                                       args=(worker_conn, work_dir, tuple(preload), limits, max_output, initializer, runner))
+        self.process.start()
+        worker_conn.close()
+        self.ready = False
+        self.runs = 0
+
+    def wait_ready(self, timeout: float) -> bool:
+        if not self.ready and self.conn.poll(timeout):
+            try:
+                self.ready = self.conn.recv() == 'ready'
+            except EOFError:
+                pass
+        return self.ready
+
+    def run(self, script_fp: str, timeout: float):
+        """(exit_code, output), raises TimeoutError or EOFError when the worker itself hangs or dies."""
+        self.conn.send((script_fp, timeout))
+        if not self.conn.poll(timeout + 5):
+            raise TimeoutError
+        self.runs += 1
+        return self.conn.recv()
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(timeout=1)
+        self.conn.close()
+
+
+class WarmPoolCodeExecutor:
+    def __init__(self, timeout: int = 120, work_dir='.', pool_size: int = 1, preload=DEFAULT_PRELOAD,
+                 memory_limit_mb: int = 4096, file_limit_mb: int = 256, max_output_chars: int = 200000,
+                 startup_timeout: float = 120.0, initializer=None, runner=None, gate=None):
+        """
+        Drop-in replacement for LocalCommandLineCodeExecutor(timeout, work_dir). Python blocks
+        run on `pool_size` warm workers, other languages on a LocalCommandLineCodeExecutor.
+        The workers start with the first code block, or ahead of it with start().
+
+        Every run gets a fresh namespace and, on POSIX, its own forked process with the
+        memory, CPU time and file size limits, killed with everything it started after
+        `timeout` seconds. This isolates runs from each other; it is not a security sandbox.
+
+        Args:
+            timeout (int): Seconds a code block may run
+            work_dir: Where the code blocks are written and run, as for LocalCommandLineCodeExecutor
+            pool_size (int): Code blocks that can run at the same time
+            preload: Modules the workers import before their first run
+            memory_limit_mb (int): Address space limit of a run, None for no limit
+            file_limit_mb (int): Largest file a run may write, None for no limit
+            max_output_chars (int): Output of a run beyond this is dropped
+            startup_timeout (float): Seconds a worker may take to import `preload`
+            initializer: Module level function the workers call before importing `preload`
+            runner: Module level `runner(script_fp) -> exit code` that runs a script, by default
+                    as __main__; what it prints is the output of the run
+            gate: `gate(code)` returning a result with `ok` and `report()`, e.g. SafetyChecker.check;
+                  Python blocks it rejects are not run, nor are blocks in other languages
+        """
+        self._timeout = timeout
+        self._work_dir = Path(work_dir).resolve()
+        self._work_dir.mkdir(parents=True, exist_ok=True)
+        self._preload = tuple(preload)
+        self._limits = {'memory_mb': memory_limit_mb, 'cpu_s': timeout, 'file_mb': file_limit_mb}
+        self._max_output = max_output_chars
+        self._startup_timeout = startup_timeout
+        self._pool_size = pool_size
+        self._initializer = initializer
+        self._runner = runner
+        self._gate = gate
+        # spawn: workers must not inherit the app's threads and open connections
+        self._context = multiprocessing.get_context('spawn')
+        self._fallback = LocalCommandLineCodeExecutor(timeout=timeout, work_dir=self._work_dir)
+        self._lock = threading.Lock()
+        self._workers: List[_Worker] = []
+        self._idle = queue.Queue()
+        self._start_lock = threading.Lock()
+        self._started = False
+
+    @property
+    def timeout(self) -> int:
+        return self._timeout
+
+    @property
+    def work_dir(self) -> Path:
+        return self._work_dir
+
+    @property
+    def code_extractor(self) -> MarkdownCodeExtractor:
+        return MarkdownCodeExtractor()
+
+    def start(self):
+        """Start the workers, e.g. while the agents are still writing the first code block."""
+        with self._start_lock:
+            if not self._started:
+                self._started = True
+                for _ in range(self._pool_size):
+                    self._idle.put(self._new_worker())
+
+    def _new_worker(self) -> _Worker:
+        worker = _Worker(self._context, str(self._work_dir), self._preload, self._limits, self._max_output,
+                         self._initializer, self._runner)
+        with self._lock:
+            self._workers.append(worker)
+        return worker
+
+    def _retire(self, worker: _Worker):
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+        worker.close()
+
+    def wait_ready(self, timeout: float = None) -> bool:
+        """Block until all workers have imported their modules, e.g. before timing runs."""
+        timeout = self._startup_timeout if timeout is None else timeout
+        self.start()
+        with self._lock:
+            workers = list(self._workers)
+        return all(worker.wait_ready(timeout) for worker in workers)
+
+    def _run_python(self, script_fp: Path):
+        self.start()
+        worker = self._idle.get()
+        replace = not hasattr(os, 'fork')  # inline runs leave their state in the worker
+        try:
+            if not worker.wait_ready(self._startup_timeout):
+                replace = True
+                return 1, "The code executor worker did not start"
+            return worker.run(str(script_fp), float(self._timeout))
+        except TimeoutError:
+            replace = True
+            return TIMEOUT_EXIT_CODE, TIMEOUT_MSG
+        except (EOFError, OSError):
+            replace = True
+            return 1, "The code executor worker died while running the code"
+        finally:
+            if replace:
+                self._retire(worker)
+                worker = self._new_worker()
+            self._idle.put(worker)
+
+    def execute_code_blocks(self, code_blocks: List[CodeBlock]) -> CommandLineCodeResult:
+        logs_all = ""
+        file_names = []
+        exitcode = 0
+        for code_block in code_blocks:
+            lang, code = code_block.language.lower(), code_block.code
+            if lang not in PYTHON_VARIANTS and self._gate is not None:
+                # the gate only reads Python, a shell block could run any script unchecked
+                logs_all += f"Not run: {lang} code cannot pass the safety check, write the task as one Python script\n"
+                exitcode = 1
+                break
+            if lang not in PYTHON_VARIANTS:
+                result = self._fallback.execute_code_blocks([code_block])
+                logs_all += result.output
+                exitcode = result.exit_code
+                if result.code_file:
+                    file_names.append(Path(result.code_file))
+                if exitcode != 0:
+                    break
+                continue
+            if self._gate is not None:
+                verdict = self._gate(code)
+                if not verdict.ok:
+                    logs_all += f"Not run: {verdict.report()}\n"
+                    exitcode = 1
+                    break
+            try:
+                filename = _get_file_name_from_content(code, self._work_dir)
+            except ValueError:
+                return CommandLineCodeResult(exit_code=1, output="Filename is not in the workspace")
+            if filename is None:
+                filename = f"tmp_code_{hashlib.md5(code.encode()).hexdigest()}.py"
+            written_file = (self._work_dir / filename).resolve()
+            with written_file.open("w", encoding="utf-8") as code_f:
+                code_f.write(code)
+            file_names.append(written_file)
+
+            exitcode, output = self._run_python(written_file)
+            logs_all += output
+            if exitcode != 0:
+                break
+
+        code_file = str(file_names[0]) if file_names else None
+        return CommandLineCodeResult(exit_code=exitcode, output=logs_all, code_file=code_file)
+
+    def restart(self):
+        """New workers, e.g. after the robotics package or another preloaded module changed."""
+        self.close()
+        self.start()
+
+    def close(self):
+        """Stop the workers; a later code block starts new ones."""
+        with self._start_lock:
+            with self._lock:
+                workers, self._workers = self._workers, []
+            self._idle = queue.Queue()
+            self._started = False
+        for worker in workers:
+            worker.close()
+
+
+def _time_rounds(executor, blocks, repeat: int):
+    """Seconds per execute_code_blocks call for each block, and the exit codes of the last round."""
+    times, exit_codes = [], []
+    for _ in range(repeat):
+        exit_codes = []
+        for block in blocks:
+            start = time.perf_counter()
+            exit_codes.append(executor.execute_code_blocks([block]).exit_code)
+            times.append(time.perf_counter() - start)
+    return times, exit_codes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scripts", default="polybot_screenshots_run", help="Folder of generated scripts")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    try:
+        importlib.import_module('robotics')
+    except ImportError:
+        from n9_sim import SIM_PATH
+        # the simulator and the repository (its location index) for the interpreters of both executors
+        python_path = [SIM_PATH, os.path.dirname(SIM_PATH)]
+        os.environ['PYTHONPATH'] = os.pathsep.join(python_path + [os.environ.get('PYTHONPATH', '')]).rstrip(os.pathsep)
+        sys.path[:0] = python_path  # spawned workers take the parent's sys.path
+        print("robotics is not installed, the scripts run on the offline simulator")
+
+    support = ('loca.py', 'rack_status.py')
+    scripts = sorted(fp for fp in glob.glob(os.path.join(args.scripts, '*.py')) if os.path.basename(fp) not in support)
+    blocks = []
+    for script_fp in scripts:
+        with open(script_fp, 'r') as script_f:
+            blocks.append(CodeBlock(code=script_f.read(), language='python'))
+
+    work_dir = tempfile.mkdtemp(prefix='warm_executor_')
+    try:
+        for name in support:
+            source = os.path.join(args.scripts, name) if os.path.exists(os.path.join(args.scripts, name)) else name
+            shutil.copy(source, work_dir)
+
+        cold = LocalCommandLineCodeExecutor(timeout=120, work_dir=work_dir)
+        cold_times, cold_codes = _time_rounds(cold, blocks, args.repeat)
+
+        start = time.perf_counter()
+        warm = WarmPoolCodeExecutor(timeout=120, work_dir=work_dir)
+        warm.wait_ready()
+        startup = time.perf_counter() - start
+        warm_times, warm_codes = _time_rounds(warm, blocks, args.repeat)
+        warm.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    assert cold_codes == warm_codes, f"exit codes differ: {cold_codes} vs {warm_codes}"
+    print(f"{len(blocks)} scripts x {args.repeat}, exit codes {warm_codes}")
+    for name, times in (("LocalCommandLineCodeExecutor", cold_times), ("WarmPoolCodeExecutor", warm_times)):
+        print(f"{name:>28}: median {1000 * statistics.median(times):7.1f} ms, "
+              f"mean {1000 * statistics.mean(times):7.1f} ms per execution round")
+    print(f"{'':>28}  (one-off worker startup {1000 * startup:.0f} ms, while the agents are still writing)")
@@ -0,0 +1,123 @@
+"""
+Load check for ws_server.py with the mock LLM (no API keys needed). Starts the server in
+process, runs concurrent client sessions through a full chat including the human input
+round trip, ping, malformed messages and PDF uploads (valid and duplicate), and exits
+non-zero if any session saw the wrong protocol.
+
+Run from the repository root:
+    python -m utils.ws_load_test --sessions 8 --pool-size 2
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import socket
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+from websockets.asyncio.client import connect
+
+import params
+import ws_server
+from utils.agent_pool import AutoGenSystemPool
+from utils.mock_llm import MOCK_CODE_REPLY, MockAutoGenSystem
+from utils.uploads import UploadStore
+
+PDF = b"%PDF-1.4\n% mock upload\n%%EOF\n"
+
+
+async def _receive(ws, message_type: str, timeout: float, seen: list) -> dict:
+    """Next message of `message_type`, answering human input requests on the way."""
+    deadline = time.monotonic() + timeout
+    while True:
+        message = json.loads(await asyncio.wait_for(ws.recv(), deadline - time.monotonic()))
+        seen.append(message['type'])
+        if message['type'] == message_type:
+            return message
+        if message['type'] == 'human_input_request':
+            await ws.send(json.dumps({'type': 'human_input_response', 'response': 'exit'}))
+        elif message['type'] == 'status' and message['status'] == 'error':
+            raise AssertionError(f"unexpected error: {message['message']}")
+
+
+async def run_session(url: str, i: int, timeout: float) -> list:
+    """One client session, returns the problems it found."""
+    problems, seen = [], []
+
+    def expect(condition: bool, problem: str):
+        if not condition:
+            problems.append(f"session {i}: {problem}")
+
+    async with connect(url) as ws:
+        await _receive(ws, 'init', timeout, seen)
+        await ws.send(json.dumps({'type': 'ping'}))
+        await _receive(ws, 'pong', timeout, seen)
+
+        # Malformed messages get an error and leave the connection open
+        for bad in ([], "x", {'type': 'user_message', 'content': None}, {'type': 'human_input_response', 'response': 1},
+                    {'type': 'get_history', 'page': 'a'}, {'type': 'get_history', 'page_size': None},
+                    {'type': 'upload_pdf'}, {'type': 'upload_pdf', 'filename': 'a.pdf', 'data': '%%%'},
+                    {'type': 'upload_pdf', 'filename': ['a.pdf'], 'data': 'AA=='}):
+            await ws.send(json.dumps(bad))
+            message = json.loads(await asyncio.wait_for(ws.recv(), timeout))
+            expect(message['type'] == 'status' and message['status'] == 'error', f"no error for {bad}")
+
+        payload = base64.b64encode(PDF + f"{i}\n".encode()).decode()
+        for duplicate in (False, True):
+            await ws.send(json.dumps({'type': 'upload_pdf', 'filename': f'session_{i}.pdf', 'data': payload}))
+            message = await _receive(ws, 'file_uploaded', timeout, seen)
+            expect(message['duplicate'] == duplicate, f"upload reported duplicate={message['duplicate']}")
+
+        await ws.send(json.dumps({'type': 'user_message', 'content': f"Move the vial with polymer A to the clamp ({i})"}))
+        await _receive(ws, 'chat_update', timeout, seen)
+        await _receive(ws, 'status', timeout, seen)
+    for message_type in ('agent_message', 'human_input_request'):
+        expect(message_type in seen, f"no {message_type}")
+    return problems
+
+
+async def run_load(n_sessions: int, pool_size: int, latency: float, timeout: float) -> list:
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        port = sock.getsockname()[1]
+    # Only code replies, so every chat reaches the admin's human input request whatever the pooled system ran before
+    pool = AutoGenSystemPool(lambda: MockAutoGenSystem(latency=latency, human_input_mode="ALWAYS",
+                                                       responses=[MOCK_CODE_REPLY]), size=pool_size)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        params.transcript_db = os.path.join(work_dir, 'transcripts.sqlite')
+        ready = asyncio.Event()
+        server = asyncio.create_task(ws_server.main('localhost', port, pool, UploadStore(work_dir), ready))
+        await asyncio.wait_for(ready.wait(), timeout)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*[run_session(f"ws://localhost:{port}", i, timeout) for i in range(n_sessions)],
+                                       return_exceptions=True)
+        elapsed = time.perf_counter() - start
+        server.cancel()
+
+    problems = []
+    for i, result in enumerate(results):
+        problems += [f"session {i}: {result!r}"] if isinstance(result, BaseException) else result
+    print(f"{n_sessions} sessions on {pool_size} systems in {elapsed:.1f}s ({n_sessions / elapsed:.2f} chats/s)",
+          file=sys.stderr)
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock LLM latency per call (s)")
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds to wait for any one message")
+    args = parser.parse_args()
+
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):  # silence the agents' console output
+        problems = asyncio.run(run_load(args.sessions, args.pool_size, args.latency, args.timeout))
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    print("FAILED" if problems else "OK", file=sys.stderr)
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,250 @@
+"""
+WebSocket backend for static/websocket-client.js (SDLAgentChatClient).
+
+Every browser connection is a session. Chats run as coroutines through
+AutoGenSystem.a_initiate_chat on systems checked out of a shared pool, so
+many sessions are served by one process. Agent messages are pushed as they
+are produced and human input requests from the agents are routed to the
+browser.
+
+    python ws_server.py           # real agents
+    python ws_server.py --mock    # offline, MockModelClient instead of an LLM
+"""
+import argparse
+import asyncio
+import base64
+import binascii
+import json
+import os
+import tempfile
+import uuid
+
+from websockets.asyncio.server import serve
+
+import params
+from utils.agent_pool import AutoGenSystemPool
+from utils.history import BoundedHistory, TranscriptStore
+from utils.human_input import HumanInputBridge
+from utils.uploads import UploadStore
+
+workdir = "polybot_screenshots_run"
+polybot_file_path = 'n9_robot_operation_commands.py'
+llm_type = "gpt4o"
+
+
+def build_autogen_system():
+    """Create one fully configured AutoGen system for the pool"""
+    from sdl_agents import AutoGenSystem
+    autogen_system = AutoGenSystem(
+        llm_type=llm_type,
+        workdir=workdir,
+        polybot_file_path=polybot_file_path,
+        inventory_db_path=params.inventory_db,
+        template_library_path=params.template_library,
+        template_threshold=params.template_threshold,
+        executor_pool_size=params.executor_pool_size
+    )
+    autogen_system.code_writer_agent.human_input_mode = "ALWAYS"
+    autogen_system.code_review_agent.human_input_mode = "NEVER"
+    autogen_system.scraper_agent.human_input_mode = "NEVER"
+    autogen_system.polybot_admin.human_input_mode = "ALWAYS"
+    return autogen_system
+
+
+def warm_pdf(path):
+    """Extract and index an uploaded PDF in the background so the first scrape_pdf call is a cache hit"""
+    import keyword_index
+    from llms import init_text_splitter
+    from sdl_agents import pdf_to_text
+    chunks = init_text_splitter().split_text(pdf_to_text(path))
+    keyword_index.get_index().update(chunks, source=os.path.basename(path))
+    print(f"Indexed {os.path.basename(path)}: {len(chunks)} chunks")
+
+
+def store_upload(uploads: UploadStore, filename: str, payload: str):
+    """Decode a base64 upload to a temp file in the workdir and save it through the upload store"""
+    content = base64.b64decode(payload, validate=True)
+    fd, tmp_fp = tempfile.mkstemp(dir=uploads.workdir, suffix='.upload')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_f:
+            tmp_f.write(content)
+        return uploads.save(tmp_fp, filename)
+    finally:
+        os.remove(tmp_fp)
+
+
+class ChatSession:
+    def __init__(self, websocket, pool: AutoGenSystemPool, chat_slots: asyncio.Semaphore, transcript: TranscriptStore,
+                 uploads: UploadStore):
+        self.id = uuid.uuid4().hex
+        self.ws = websocket
+        self.pool = pool
+        self.chat_slots = chat_slots
+        self.uploads = uploads
+        # [user message, agent messages] pairs, as rendered by chat_update. Older pairs are spilled to the transcript
+        self.history = BoundedHistory(max_items=params.history_max_rows, max_chars=params.history_max_chars,
+                                      store=transcript, key=self.id)
+        self.chat_task = None
+        self.loop = asyncio.get_running_loop()
+        self.human_input = HumanInputBridge(
+            on_request=lambda agent_name, prompt: self.send('human_input_request', agent=agent_name, prompt=prompt),
+            on_response=lambda agent_name, response, timed_out: self.send(
+                'human_input_received', agent=agent_name, response=response, timed_out=timed_out),
+            timeout=params.human_input_timeout_s,
+            defaults=params.human_input_defaults,
+        )
+
+    async def send(self, message_type: str, **data):
+        await self.ws.send(json.dumps({'type': message_type, **data}))
+
+    def recent_history(self):
+        return list(self.history)[-params.history_display_rows:]
+
+    async def run(self):
+        await self.send('init', session_id=self.id, history=self.recent_history())
+        try:
+            async for raw in self.ws:
+                try:
+                    data = json.loads(raw)
+                except json.JSONDecodeError:
+                    await self.send('status', status='error', message='Invalid JSON')
+                    continue
+                if not isinstance(data, dict):
+                    await self.send('status', status='error', message='Messages must be JSON objects')
+                    continue
+                await self.dispatch(data)
+        finally:
+            if self.chat_task is not None:
+                self.chat_task.cancel()
+            self.history.spill_all()
+
+    async def dispatch(self, data: dict):
+        message_type = data.get('type')
+        if message_type == 'ping':
+            await self.send('pong')
+        elif message_type == 'human_input_response':
+            response = data.get('response', '')
+            if not isinstance(response, str):
+                await self.send('status', status='error', message='human_input_response needs a string response')
+                return
+            await self.resolve_human_input(response)
+        elif message_type == 'user_message':
+            content = data.get('content', '')
+            if not isinstance(content, str):
+                await self.send('status', status='error', message='user_message needs a string content')
+                return
+            content = content.strip()
+            if self.human_input.pending:
+                # The client UI sends replies to human_input_request as plain user messages
+                await self.resolve_human_input(content)
+            elif self.chat_task is not None and not self.chat_task.done():
+                await self.send('status', status='busy', message='A chat is already running in this session')
+            elif content:
+                self.chat_task = asyncio.create_task(self.run_chat(content))
+        elif message_type == 'get_history':
+            try:
+                page = max(int(data.get('page', 1)), 1)
+                page_size = max(int(data.get('page_size', params.history_page_size)), 1)
+            except (TypeError, ValueError, OverflowError):
+                await self.send('status', status='error', message='get_history needs integer page and page_size')
+                return
+            await self.send('history_page', page=page, pages=self.history.pages(page_size),
+                            total=self.history.total, history=self.history.page(page, page_size))
+        elif message_type == 'upload_pdf':
+            await self.upload_pdf(data.get('filename'), data.get('data'))
+        else:
+            await self.send('status', status='error', message=f'Unknown message type: {message_type}')
+
+    async def upload_pdf(self, filename, payload):
+        filename = os.path.basename(filename) if isinstance(filename, str) else ''
+        if not filename.lower().endswith('.pdf') or not isinstance(payload, str) or not payload:
+            await self.send('status', status='error', message='upload_pdf needs a .pdf filename and base64 data')
+            return
+        if len(payload) * 3 // 4 > params.ws_max_upload_mb * 1024 * 1024:
+            await self.send('status', status='error', message=f'PDF is larger than {params.ws_max_upload_mb} MB')
+            return
+        try:
+            save_path, sha, duplicate = await asyncio.to_thread(store_upload, self.uploads, filename, payload)
+        except (binascii.Error, ValueError):
+            await self.send('status', status='error', message='upload_pdf data is not valid base64')
+            return
+        await self.send('file_uploaded', filename=os.path.basename(save_path), duplicate=duplicate)
+
+    def on_agent_message(self, agent_name: str, content: str):
+        """Called by the capture manager, possibly from an executor thread."""
+        user_message, agent_messages = self.history[-1]
+        agent_messages += ("\n\n" if agent_messages else "") + f"{agent_name}: {content}"
+        self.history.replace_last([user_message, agent_messages])
+        asyncio.run_coroutine_threadsafe(self.send('agent_message', agent=agent_name, content=content), self.loop)
+
+    async def resolve_human_input(self, response: str):
+        if not self.human_input.resolve(response):
+            await self.send('status', status='error', message='No human input was requested')
+
+    async def run_chat(self, content: str):
+        self.history.append([content, ""])
+        if self.chat_slots.locked():
+            await self.send('status', status='queued')
+
+        # Only sessions holding a slot wait on the pool, waiting sessions cost no threads
+        async with self.chat_slots:
+            system = await asyncio.to_thread(self.pool.checkout, self.id)
+            detach_human_input = self.human_input.attach([system.polybot_admin, system.code_writer_agent])
+            unsubscribe = system.manager.subscribe(self.on_agent_message)
+            try:
+                await self.send('status', status='processing')
+                await system.a_initiate_chat(content)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Exception during chat: {e}")
+                await self.send('status', status='error', message=str(e))
+            finally:
+                unsubscribe()
+                detach_human_input()
+                await asyncio.to_thread(self.pool.release, self.id)
+
+        await self.send('chat_update', history=self.recent_history())
+        await self.send('status', status='idle')
+
+
+async def main(host: str, port: int, pool: AutoGenSystemPool, uploads: UploadStore, ready: asyncio.Event = None):
+    await asyncio.to_thread(pool.warm)
+    chat_slots = asyncio.Semaphore(pool.size)
+    transcript = TranscriptStore(params.transcript_db)
+
+    async def handler(websocket):
+        session = ChatSession(websocket, pool, chat_slots, transcript, uploads)
+        print(f"Session {session.id} connected")
+        try:
+            await session.run()
+        finally:
+            print(f"Session {session.id} disconnected")
+
+    # Uploads arrive base64 encoded in a single message
+    max_message = params.ws_max_upload_mb * 1024 * 1024 * 4 // 3 + 64 * 1024
+    async with serve(handler, host, port, max_size=max_message) as server:
+        print(f"SDL agents WebSocket server on ws://{host}:{port}")
+        if ready is not None:
+            ready.set()
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default=params.ws_host)
+    parser.add_argument("--port", type=int, default=params.ws_port)
+    parser.add_argument("--pool-size", type=int, default=params.app_pool_size)
+    parser.add_argument("--mock", action="store_true", help="Use the offline mock LLM instead of the real agents")
+    args = parser.parse_args()
+
+    os.makedirs(workdir, exist_ok=True)
+    if args.mock:
+        from utils.mock_llm import MockAutoGenSystem
+        factory = lambda: MockAutoGenSystem(latency=0.2, human_input_mode="ALWAYS")
+        uploads = UploadStore(workdir)
+    else:
+        factory = build_autogen_system
+        uploads = UploadStore(workdir, on_new_file=warm_pdf)
+
+    asyncio.run(main(args.host, args.port, AutoGenSystemPool(factory, size=args.pool_size), uploads))